@@ -0,0 +1,65 @@
+"""Derived series (SMA, EMA, rolling return, volatility) recomputed from raw bars vs. served by analytics.py.
+
+For each ticker: the full computation, a memo hit (same last bar) and an append of one new bar,
+which must give the same columns as recomputing everything. Exits non-zero if it doesn't.
+
+    python benchmarks/analytics_memo.py [--tickers 100] [--bars 2608]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import src_path  # noqa: F401  puts src/ on the path
+
+from analytics import Analytics, Derived
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--bars", type=int, default=2608)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2013-01-01", periods=args.bars + 1)
+    series = {
+        f"T{i:03d}": pd.Series(100 * np.exp(rng.normal(0, 0.01, len(dates)).cumsum()), index=dates)
+        for i in range(args.tickers)
+    }
+    analytics = Analytics()
+    for ticker, prices in series.items():
+        analytics.get(ticker, "1d", prices[:-1])
+
+    results = {
+        "tickers": args.tickers,
+        "bars": args.bars,
+        "recompute_ms": timed(lambda: [Derived.compute(prices, "1d") for prices in series.values()]),
+        "memo_hit_ms": timed(lambda: [analytics.get(t, "1d", prices[:-1]) for t, prices in series.items()]),
+        "append_one_bar_ms": timed(lambda: [analytics.get(t, "1d", prices) for t, prices in series.items()]),
+    }
+
+    same = True
+    for ticker, prices in series.items():
+        full, appended = Derived.compute(prices, "1d"), analytics.get(ticker, "1d", prices)
+        same = same and all(
+            np.allclose(full.columns[name], appended.columns[name], rtol=1e-9, equal_nan=True) for name in full.columns
+        )
+    results["append_matches_recompute"] = same
+    results["stats"] = analytics.stats
+
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Latency of light requests while explore charts wait on slow price downloads, with and without background callbacks.
+
+Runs gunicorn with the settings from render.yaml on an offline price store whose every download
+sleeps for --delay seconds. --slow clients each ask for the chart of a symbol nobody fetched
+before (polling for the result like the browser does for a background callback), while --rate
+light requests a second alternate between the goal page's settings toggle and the page layout.
+
+    python benchmarks/background_load.py [--slow 24] [--delay 3] [--rate 10] [--workers 2] [--threads 8]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# the app with a price store whose downloads are all slow
+WRAPPER = """
+import functools
+import os
+import time
+
+import price_store
+from price_store import FakeDownloader, PriceStore
+
+
+class SlowDownloader(FakeDownloader):
+    def __call__(self, *args, **kwargs):
+        time.sleep(float(os.environ["LOAD_FETCH_DELAY"]))
+        return super().__call__(*args, **kwargs)
+
+
+price_store.get_store = functools.lru_cache(maxsize=None)(lambda: PriceStore(downloader=SlowDownloader()))
+
+from app import server  # noqa: E402
+"""
+
+PRICES_OUTPUT = "chart-prices.data"
+CHART_OUTPUT = "..ticker-chart.figure...alert-auto.is_open...alert-auto.target...alert-auto.children...live-cursor.data.."
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(base, body, query=""):
+    request = urllib.request.Request(
+        f"{base}/_dash-update-component{query}", json.dumps(body).encode(), {"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.status, response.read()
+
+
+def prices_body(ticker):
+    properties = {"ticker-select": "value", "comparison-input": "value", "time-line": "value"}
+    inputs = {"ticker-select": ticker, "comparison-input": [], "time-line": "1y"}
+    return {
+        "output": PRICES_OUTPUT,
+        "outputs": {"id": "chart-prices", "property": "data"},
+        "inputs": [dict(id=key, property=properties[key], value=value) for key, value in inputs.items()],
+        "changedPropIds": ["ticker-select.value"],
+    }
+
+
+def chart_body(prices):
+    outputs = [dict(id=key.split(".")[0], property=key.split(".")[1]) for key in CHART_OUTPUT.strip(".").split("...")]
+    inputs = {"chart-prices": prices, "chart-width": 800, "ticker-chart": None}
+    properties = {"chart-prices": "data", "chart-width": "data", "ticker-chart": "relayoutData"}
+    return {
+        "output": CHART_OUTPUT,
+        "outputs": outputs,
+        "inputs": [dict(id=key, property=properties[key], value=value) for key, value in inputs.items()],
+        "state": [dict(id="overlay-select", property="value", value=[])],
+        "changedPropIds": ["chart-prices.data"],
+    }
+
+
+# one chart, start to finish: the fetch (a background callback) answers with a job to poll, and
+# every poll before it is done with an empty response; the chart is then drawn from the store
+def fetch_chart(base, ticker):
+    body = prices_body(ticker)
+    status, data = post(base, body)
+    answer = json.loads(data)
+    while "cacheKey" in answer:
+        time.sleep(0.3)  # the interval the callbacks are registered with
+        status, data = post(base, body, f"?cacheKey={answer['cacheKey']}&job={answer['job']}")
+        if status == 204:
+            return
+        answer = json.loads(data)
+        if "response" in answer:
+            break
+    post(base, chart_body(answer["response"]["chart-prices"]["data"]))
+
+
+def light_request(base, which):
+    started = time.perf_counter()
+    if which % 2:
+        with urllib.request.urlopen(f"{base}/_dash-layout", timeout=120) as response:
+            response.read()
+    else:
+        post(base, {
+            "output": "simulation-settings.is_open",
+            "outputs": {"id": "simulation-settings", "property": "is_open"},
+            "inputs": [{"id": "goal-mode", "property": "value", "value": "simulation"}],
+            "changedPropIds": ["goal-mode.value"],
+        })
+    return (time.perf_counter() - started) * 1000
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_ms": ordered[-1],
+    }
+
+
+def run(background, args, scratch):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([scratch, SRC]),
+        INVESTING_APP_OFFLINE="1",
+        BACKGROUND_CALLBACKS="1" if background else "0",
+        JOB_CACHE_DIR=os.path.join(scratch, f"jobs-{background}"),
+        PRICE_STORE_PATH=os.path.join(scratch, f"prices-{background}.sqlite"),
+        DATA_SNAPSHOT_DIR=os.path.join(scratch, "snapshots"),
+        LOAD_FETCH_DELAY=str(args.delay),
+        JOB_PRELOAD="load_app",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "--chdir", SRC, "load_app:server", "--bind", f"127.0.0.1:{port}",
+            "--worker-class", "gthread", "--workers", str(args.workers), "--threads", str(args.threads),
+            "--timeout", "60", "--preload", "--log-level", "warning",
+        ],
+        env=env,
+    )
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(f"{base}/_dash-layout", timeout=5).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        for which in range(2 * args.workers):  # every worker has loaded its pages
+            light_request(base, which)
+        # and has started the fork server its jobs come from, which imports the app once
+        warmup = [threading.Thread(target=fetch_chart, args=(base, f"WARM{i:03d}")) for i in range(2 * args.workers)]
+        for thread in warmup:
+            thread.start()
+        for thread in warmup:
+            thread.join()
+
+        started = time.perf_counter()
+        charts = [
+            threading.Thread(target=fetch_chart, args=(base, f"SLOW{background:d}{i:03d}")) for i in range(args.slow)
+        ]
+        for chart in charts:
+            chart.start()
+        # light requests go out on a schedule rather than one after the other, so a stuck one
+        # doesn't hide how long the ones behind it would have waited
+        light, senders, which = [], [], 0
+        while any(chart.is_alive() for chart in charts):
+            senders.append(threading.Thread(target=lambda which=which: light.append(light_request(base, which))))
+            senders[-1].start()
+            which += 1
+            time.sleep(1 / args.rate)
+        for thread in charts + senders:
+            thread.join()
+        return {
+            "background_callbacks": background,
+            "slow_charts_done_s": time.perf_counter() - started,
+            "light_requests": percentiles(light),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slow", type=int, default=24, help="concurrent explore charts on slow symbols")
+    parser.add_argument("--delay", type=float, default=3.0, help="seconds every price download takes")
+    parser.add_argument("--rate", type=float, default=10.0, help="light requests per second")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, "load_app.py"), "w") as wrapper:
+            wrapper.write(WRAPPER)
+        runs = [run(background, args, scratch) for background in (False, True)]
+    print(json.dumps({"slow": args.slow, "delay_s": args.delay, "workers": args.workers, "threads": args.threads, "runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Backtests of many allocations over the same price history: day-by-day loop vs. vectorized vs. process pool.
+
+Loads --years of daily bars of --tickers symbols from an in-memory price store filled by
+FakeDownloader and backtests --variants random allocations of them, with monthly contributions
+and quarterly rebalancing. The loop replays every bar of one allocation at a time, as a
+spreadsheet would; it is timed on a few allocations and scaled up. backtest.run_variants is timed
+in this process and on a pool of each --workers count. Values of the loop and the vectorized
+version are checked against each other. Times are seconds, the best of --repeat.
+
+    python benchmarks/backtest.py [--tickers 30] [--variants 2000] [--years 10] [--workers 1 2 4] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import backtest
+import market_data
+from price_store import FakeDownloader, PriceStore
+
+INITIAL = 100000.0
+CONTRIBUTION = 500.0
+CONTRIBUTE_EVERY = backtest.BARS // 12
+REBALANCE_EVERY = backtest.REBALANCE_BARS["quarterly"]
+LOOPED = 5  # allocations the day-by-day loop is timed on
+
+
+# every bar in turn: pay in, rebalance, then mark the holdings to the day's prices
+def loop_backtest(prices, weights):
+    units = INITIAL * weights / prices[0]
+    values = np.empty(len(prices))
+    for t in range(len(prices)):
+        if t and t % CONTRIBUTE_EVERY == 0:
+            units = units + CONTRIBUTION * weights / prices[t]
+        if t and t % REBALANCE_EVERY == 0:
+            units = units @ prices[t] * weights / prices[t]
+        values[t] = units @ prices[t]
+    return values
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=30)
+    parser.add_argument("--variants", type=int, default=2000)
+    parser.add_argument("--years", type=int, choices=[1, 2, 5, 10], default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = PriceStore(":memory:", downloader=FakeDownloader())
+    market_data.get_store = lambda: store
+    prices = backtest.load_prices([f"T{i:03d}" for i in range(args.tickers)], f"{args.years}y")
+    rng = np.random.default_rng(0)
+    weights = backtest.normalized(rng.dirichlet(np.ones(len(prices.tickers)), args.variants))
+    schedule = (INITIAL, CONTRIBUTION, CONTRIBUTE_EVERY, REBALANCE_EVERY)
+
+    looped, loop_time = best(lambda: [loop_backtest(prices.values, w) for w in weights[:LOOPED]], 1)
+    values, _, _ = backtest.backtest(prices.values, weights[:LOOPED], *schedule)
+    error = float(np.max(np.abs(values - np.array(looped)) / np.array(looped)))
+
+    _, vectorized = best(lambda: backtest.run_variants(prices.values, weights, *schedule, workers=1), args.repeat)
+    pooled = {}
+    for workers in args.workers:
+        if workers > 1:
+            backtest.run_variants(prices.values, weights, *schedule, workers=workers)  # starts the pool
+            _, pooled[workers] = best(lambda: backtest.run_variants(prices.values, weights, *schedule, workers=workers), args.repeat)
+
+    results = {
+        "tickers": len(prices.tickers),
+        "bars": len(prices.dates),
+        "variants": args.variants,
+        "cpus": os.cpu_count(),
+        "loop_s": loop_time / LOOPED * args.variants,
+        "vectorized_s": vectorized,
+        "pool_s": pooled,
+        "max_relative_difference": error,
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""Latency and throughput of every page's server callbacks, replayed over HTTP at several concurrencies and worker counts.
+
+Runs gunicorn with the startCommand from render.yaml, once per --workers count, on the app with
+yf.download stubbed (synthetic bars, --fetch-delay seconds per download) and
+benchmarks/fixtures/portfolio.csv as the seed portfolio. At each --concurrency level that many
+virtual users, each with its own session, go round the explore, goal and portfolio pages for
+--seconds, sending the /_dash-update-component requests the browser would. The payloads are built
+from the server's /_dash-dependencies, and a background callback is polled until its result is
+ready, so it counts as one request timed from start to finish.
+
+Results are written to benchmarks/results/callback_load/<commit>.json. --compare takes an earlier
+results file or commit and lists the callbacks whose p95 grew by more than --tolerance, exiting
+with status 1 if there are any.
+
+    python benchmarks/callback_load.py [--workers 1 2] [--concurrency 1 4 16] [--seconds 10] [--compare HEAD~1]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import re
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "portfolio.csv")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results", "callback_load")
+
+# the app with yf.download answered by the offline bar generator
+WRAPPER = """
+import os
+import time
+
+import yfinance
+
+from price_store import FakeDownloader
+
+synthesise = FakeDownloader()
+
+
+def download(tickers, interval="1d", period=None, start=None, **kwargs):
+    time.sleep(float(os.environ["LOAD_FETCH_DELAY"]))
+    return synthesise(tickers, interval, period, start)
+
+
+yfinance.download = download
+
+from app import server  # noqa: E402
+"""
+
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "JPM", "VTI", "VOO", "BND", "GLD"]
+SEARCHES = ["a", "ap", "micro", "nv", "te", "vanguard", "s&p", "go"]
+PERIODS = ["1mo", "6mo", "1y", "5y"]
+COLUMNS = ["region", "market", "account", "platform", "owner"]
+# the sorts and filters the grid's row requests go round
+SORTS = [[], [{"colId": "balance_prct", "sort": "desc"}], [{"colId": "owner", "sort": "asc"}, {"colId": "ticker", "sort": "asc"}]]
+FILTERS = [{}, {"account": {"filterType": "text", "type": "contains", "filter": "ira"}}]
+ADDED = {"balance_prct": {"filterType": "number", "type": "equals", "filter": 0}}  # a new row has 0%
+NOISE_MS = 5  # p95 changes smaller than this are never reported as regressions
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_command():
+    with open(os.path.join(ROOT, "render.yaml")) as render:
+        line = next(line for line in render if line.strip().startswith("startCommand:"))
+    return shlex.split(line.split(":", 1)[1])
+
+
+def gunicorn_args(workers, port):
+    args = start_command()[1:]
+    args[args.index("app:server")] = "load_app:server"
+    args[args.index("--workers") + 1] = str(workers)
+    return [sys.executable, "-m", "gunicorn"] + args + ["--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+
+
+def clean(key):
+    return re.sub(r"@[0-9a-f]{32}", "", key)
+
+
+def split_output(key):
+    if key.startswith(".."):
+        return [dict(zip(("id", "property"), part.rsplit(".", 1))) for part in key[2:-2].split("...")]
+    return dict(zip(("id", "property"), key.rsplit(".", 1)))
+
+
+class Client:
+    """Sends callback requests the way the Dash renderer does, for the callbacks one server registered."""
+
+    def __init__(self, base):
+        self.base = base
+        with urllib.request.urlopen(f"{base}/_dash-dependencies", timeout=60) as response:
+            dependencies = json.loads(response.read())
+        # allow_duplicate outputs carry a per-process suffix, so callbacks are looked up without it,
+        # and those sharing an output by the input that changed
+        self.dependencies = {}
+        for dep in dependencies:
+            if not dep["clientside_function"]:
+                self.dependencies.setdefault(clean(dep["output"]), []).append(dep)
+
+    def post(self, body, query=""):
+        request = urllib.request.Request(
+            f"{self.base}/_dash-update-component{query}", json.dumps(body).encode(), {"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    # returns the status and, unless nothing was updated, the outputs by component id
+    def call(self, output, values, changed):
+        dep = next(
+            dep for dep in self.dependencies[output]
+            if changed[0] in [f"{item['id']}.{item['property']}" for item in dep["inputs"]]
+        )
+        body = {
+            "output": dep["output"],
+            "outputs": split_output(dep["output"]),
+            "inputs": [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dep["inputs"]],
+            "state": [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dep["state"]],
+            "changedPropIds": changed,
+        }
+        status, data = self.post(body)
+        if status == 200 and dep["long"]:
+            job = json.loads(data)
+            while "cacheKey" in job:
+                time.sleep(dep["long"]["interval"] / 1000)
+                status, data = self.post(body, f"?cacheKey={job['cacheKey']}&job={job['job']}")
+                if status != 200 or "response" in json.loads(data):
+                    break
+        if status != 200:
+            return status, None
+        return status, json.loads(data)["response"]
+
+
+class User:
+    """One browser tab going round the pages: the requests each step sends, and what it keeps from the answers."""
+
+    def __init__(self, client, number):
+        self.client = client
+        self.number = number
+        self.session = f"load-{number:04d}-{time.time_ns()}"
+        self.rows = []
+        self.prices = None
+        self.cursor = None
+        self.added = None
+        self.turn = 0
+
+    def steps(self):
+        return [
+            self.search_ticker, self.fetch_prices, self.create_graph, self.extend_live, self.toggle_simulation_settings,
+            self.update_simulation, self.toggle_backtest_settings, self.update_backtest, self.load_portfolio,
+            self.page_rows, self.switch_column, self.edit_cell, self.update_rebalance, self.add_row, self.find_added,
+            self.delete_row, self.revalue_portfolio,
+        ]
+
+    def pick(self, choices):
+        return choices[(self.number + self.turn) % len(choices)]
+
+    def search_ticker(self):
+        return "search_ticker", self.client.call(
+            "ticker-select.options",
+            {"ticker-select.search_value": self.pick(SEARCHES), "ticker-select.value": "AAPL", "comparison-input.value": []},
+            ["ticker-select.search_value"],
+        )
+
+    def fetch_prices(self):
+        ticker = self.pick(TICKERS)
+        compare = [t for t in TICKERS[self.turn % 3::5] if t != ticker][: self.turn % 3]
+        status, response = self.client.call(
+            "chart-prices.data",
+            {"ticker-select.value": ticker, "comparison-input.value": compare, "time-line.value": self.pick(PERIODS)},
+            ["ticker-select.value"],
+        )
+        if response:
+            self.prices = response["chart-prices"]["data"]
+        return "fetch_prices", (status, response)
+
+    def create_graph(self):
+        status, response = self.client.call(
+            "..ticker-chart.figure...alert-auto.is_open...alert-auto.target...alert-auto.children...live-cursor.data..",
+            {"chart-prices.data": self.prices, "chart-width.data": 1200, "overlay-select.value": []},
+            ["chart-prices.data"],
+        )
+        if response:
+            self.cursor = response.get("live-cursor", {}).get("data") or self.cursor
+        return "create_graph", (status, response)
+
+    def extend_live(self):
+        return "extend_live", self.client.call(
+            "..ticker-chart.extendData...live-cursor.data..",
+            {"live-interval.n_intervals": self.turn, "live-cursor.data": self.cursor},
+            ["live-interval.n_intervals"],
+        )
+
+    def toggle_simulation_settings(self):
+        return "toggle_simulation_settings", self.client.call(
+            "simulation-settings.is_open", {"goal-mode.value": "simulation"}, ["goal-mode.value"]
+        )
+
+    def toggle_backtest_settings(self):
+        return "toggle_backtest_settings", self.client.call(
+            "backtest-settings.is_open", {"goal-mode.value": "backtest"}, ["goal-mode.value"]
+        )
+
+    def update_simulation(self):
+        # a different start every time, so runs aren't answered from the background callback cache
+        request = dict(
+            years=30, invest=10000.0 + self.number * 1000 + self.turn, contribute=6000.0, interest=7.0,
+            growth=2.0, inflation=3.0, volatility=15.0, target=1000000.0, paths=1000,
+        )
+        return "update_simulation", self.client.call("goal-chart.figure", {"simulation-request.data": request}, ["simulation-request.data"])
+
+    def load_portfolio(self):
+        return "load_portfolio", self.client.call(
+            "..money-to-invest.value...total-percentage.value...changed_percent.value..",
+            {"session-id.data": self.session},
+            ["session-id.data"],
+        )
+
+    # a block of grid rows, as the grid asks for them when it scrolls, sorts or filters
+    def page_rows(self, sort_model=None, filter_model=None):
+        request = {
+            "startRow": 0, "endRow": 100,
+            "sortModel": self.pick(SORTS) if sort_model is None else sort_model,
+            "filterModel": self.pick(FILTERS) if filter_model is None else filter_model,
+        }
+        status, response = self.client.call(
+            "portfolio-table.getRowsResponse",
+            {"portfolio-table.getRowsRequest": request, "session-id.data": self.session},
+            ["portfolio-table.getRowsRequest"],
+        )
+        if response and filter_model is None:
+            self.rows = response["portfolio-table"]["getRowsResponse"]["rowData"]
+        return "page_rows", (status, response)
+
+    # the row just added, found the way the grid would with a filter
+    def find_added(self):
+        name, (status, response) = self.page_rows([], ADDED)
+        if response:
+            self.added = next(iter(response["portfolio-table"]["getRowsResponse"]["rowData"]), None)
+        return name, (status, response)
+
+    def update_portfolio_stats(self, values, changed):
+        values = {"col-name.value": self.pick(COLUMNS), "session-id.data": self.session, **values}
+        return "update_portfolio_stats", self.client.call("pie-breakdown.children", values, changed)
+
+    def switch_column(self):
+        return self.update_portfolio_stats({}, ["col-name.value"])
+
+    # an edit that leaves the row as it was, so the balances keep adding up to 100%
+    def edit_cell(self):
+        row = self.pick(self.rows) if self.rows else {}
+        value = row.get("balance_prct")
+        change = {"rowIndex": 0, "colId": "balance_prct", "oldValue": value, "newValue": value, "data": row}
+        return self.update_portfolio_stats({"portfolio-table.cellValueChanged": change}, ["portfolio-table.cellValueChanged"])
+
+    # what follows each stored edit: the trades for a different lot size or tolerance each turn
+    def update_rebalance(self):
+        return "update_rebalance", self.client.call(
+            "rebalance-trades.children",
+            {
+                "pie-breakdown.children": [], "lot-size.value": self.pick([0.001, 1, 100]),
+                "rebalance-tolerance.value": self.pick([0, 5]), "by-account.value": True,
+                "money-to-invest.value": 262000, "session-id.data": self.session,
+            },
+            ["pie-breakdown.children"],
+        )
+
+    def update_dash_table(self, button, selected):
+        return self.client.call(
+            "..portfolio-grid.children...total-percentage.value...changed_percent.value..",
+            {f"{button}.n_clicks": self.turn + 1, "portfolio-table.selectedRows": selected, "session-id.data": self.session},
+            [f"{button}.n_clicks"],
+        )
+
+    def add_row(self):
+        return "update_dash_table", self.update_dash_table("add-row-btn", [])
+
+    def delete_row(self):
+        return "update_dash_table", self.update_dash_table("delete-row-btn", [self.added] if self.added else [])
+
+    def revalue_portfolio(self):
+        return "revalue_portfolio", self.client.call(
+            "..portfolio-grid.children...money-to-invest.value...total-percentage.value...changed_percent.value...valuation-status.children..",
+            {"mark-to-market-btn.n_clicks": self.turn + 1, "session-id.data": self.session},
+            ["mark-to-market-btn.n_clicks"],
+        )
+
+    # the session's holdings over a different history or schedule each turn
+    def update_backtest(self):
+        request = dict(
+            invest=100000.0, contribute=5000.0 + self.turn, compounding=self.pick([1, 12]), period=self.pick(["1y", "5y"]),
+            rebalance=self.pick(["never", "quarterly", "yearly"]),
+        )
+        status, response = self.client.call(
+            "backtest-job.data", {"backtest-request.data": request, "session-id.data": self.session}, ["backtest-request.data"]
+        )
+        if not response:
+            return "update_backtest", (status, response)
+        job = response["backtest-job"]["data"]
+        return "update_backtest", self.client.call("goal-chart.figure", {"backtest-job.data": job}, ["backtest-job.data"])
+
+    # one step; returns the callback, whether it failed and how long it took in milliseconds
+    def step(self):
+        steps = self.steps()
+        started = time.perf_counter()
+        try:
+            name, (status, _) = steps[self.turn % len(steps)]()
+            failed = status >= 400
+        except (OSError, ValueError, KeyError, TypeError):  # refused or reset connections, broken responses
+            name, failed = steps[self.turn % len(steps)].__name__, True
+        self.turn += 1
+        return name, failed, (time.perf_counter() - started) * 1000
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def rank(q):  # nearest-rank percentile
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    return {"p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": ordered[-1]}
+
+
+def drive(client, users, seconds):
+    samples = []
+    deadline = time.perf_counter() + seconds
+
+    def browse(user):
+        while time.perf_counter() < deadline:
+            samples.append(user.step())
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=browse, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    errors = sum(failed for _, failed, _ in samples)
+    summary = {"requests": len(samples), "errors": errors, "throughput_rps": len(samples) / elapsed}
+    summary.update(percentiles([ms for _, failed, ms in samples if not failed]))
+    return summary
+
+
+def measure(workers, args, scratch):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    snapshots = os.path.join(scratch, "snapshots")
+    os.makedirs(snapshots, exist_ok=True)
+    shutil.copy(FIXTURE, os.path.join(snapshots, "my-portfolio.csv"))
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([scratch, SRC]),
+        INVESTING_APP_OFFLINE="1",
+        DATA_SNAPSHOT_DIR=snapshots,
+        PRICE_STORE_PATH=os.path.join(scratch, f"prices-{workers}.sqlite"),
+        HOLDINGS_STORE_PATH=os.path.join(scratch, f"holdings-{workers}.sqlite"),
+        JOB_CACHE_DIR=os.path.join(scratch, f"jobs-{workers}"),
+        JOB_PRELOAD="load_app",
+        LOAD_FETCH_DELAY=str(args.fetch_delay),
+    )
+    server = subprocess.Popen(gunicorn_args(workers, port), env=env)
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(f"{base}/_dash-layout", timeout=5).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        client = Client(base)
+        numbers = itertools.count()
+
+        # every worker has loaded the pages and started the fork server its background jobs come from
+        warmup = [User(client, next(numbers)) for _ in range(2 * workers)]
+        drive(client, warmup, args.warmup)
+
+        runs = []
+        for concurrency in args.concurrency:
+            samples, elapsed = drive(client, [User(client, next(numbers)) for _ in range(concurrency)], args.seconds)
+            callbacks = {}
+            for name in sorted({name for name, _, _ in samples}):
+                callbacks[name] = summarize([sample for sample in samples if sample[0] == name], elapsed)
+            runs.append({"workers": workers, "concurrency": concurrency, **summarize(samples, elapsed), "callbacks": callbacks})
+            print(f"workers={workers} concurrency={concurrency}: {runs[-1]['requests']} requests, "
+                  f"p95 {runs[-1].get('p95_ms', 0):.0f} ms, {runs[-1]['errors']} errors", file=sys.stderr)
+        return runs
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results_path(revision):
+    if os.path.exists(revision):
+        return revision
+    commit = git("rev-parse", "--verify", f"{revision}^{{commit}}")
+    return os.path.join(RESULTS_DIR, f"{commit or revision}.json")
+
+
+# callbacks (and the totals, under "all") whose p95 grew by more than the tolerance
+def regressions(old, new, tolerance):
+    before = {(run["workers"], run["concurrency"]): run for run in old["runs"]}
+    found = []
+    for run in new["runs"]:
+        previous = before.get((run["workers"], run["concurrency"]))
+        if previous is None:
+            continue
+        pairs = [("all", previous, run)] + [
+            (name, previous["callbacks"][name], stats) for name, stats in run["callbacks"].items() if name in previous["callbacks"]
+        ]
+        for name, was, now in pairs:
+            if "p95_ms" not in was or "p95_ms" not in now:
+                continue
+            if now["p95_ms"] > was["p95_ms"] * tolerance and now["p95_ms"] - was["p95_ms"] > NOISE_MS:
+                found.append({
+                    "workers": run["workers"], "concurrency": run["concurrency"], "callback": name,
+                    "p95_ms_before": was["p95_ms"], "p95_ms_after": now["p95_ms"],
+                })
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="virtual users at once")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured per concurrency level")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of traffic before measuring")
+    parser.add_argument("--fetch-delay", type=float, default=0.05, help="seconds every stubbed download takes")
+    parser.add_argument("--output", help="results file, by default named after the checked out commit")
+    parser.add_argument("--compare", help="an earlier results file, or the commit it was named after")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="p95 ratio above which a callback regressed")
+    args = parser.parse_args()
+
+    commit = git("rev-parse", "HEAD")
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, "load_app.py"), "w") as wrapper:
+            wrapper.write(WRAPPER)
+        runs = [run for workers in args.workers for run in measure(workers, args, scratch)]
+
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "start_command": " ".join(start_command()), "seconds": args.seconds,
+            "warmup": args.warmup, "fetch_delay_s": args.fetch_delay,
+        },
+        "runs": runs,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as out:
+        json.dump(results, out, indent=2)
+
+    summary = {"results": output, "runs": [{k: v for k, v in run.items() if k != "callbacks"} for run in runs]}
+    if args.compare:
+        with open(results_path(args.compare)) as earlier:
+            summary["regressions"] = regressions(json.load(earlier), results, args.tolerance)
+    print(json.dumps(summary, indent=2))
+    if summary.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Explore chart figure size and build time, every bar vs. LTTB downsampled to the chart width.
+
+    python benchmarks/chart_payload.py [--counts 1 10 100] [--period 10y] [--width 1200]
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+import downsample
+from pages.explore import line_figure, rebase
+from price_store import FakeDownloader, PriceStore
+
+
+def measure(build):
+    started = time.perf_counter()
+    encoded = to_json_plotly(build())
+    return {"bytes": len(encoded), "ms": (time.perf_counter() - started) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--width", type=int, default=1200)
+    args = parser.parse_args()
+
+    store = PriceStore(":memory:", downloader=FakeDownloader())
+    results = []
+    for count in args.counts:
+        tickers = [f"T{i:03d}" for i in range(count)]
+        frames, failed = store.get_many(tickers, args.period)
+        prices = pd.concat({ticker: frames[ticker]["Open"] for ticker in tickers}, axis=1)
+        start, deltas = rebase(prices.to_numpy(dtype=float))
+        dates = prices.index[start:]
+        names = [f"delta_{ticker}" for ticker in tickers]
+        points = downsample.points_for(args.width)
+
+        full = measure(lambda: line_figure(dates, deltas, names, len(dates), count > 1))
+        thinned = measure(lambda: line_figure(dates, deltas, names, points, count > 1))
+        results.append(
+            {
+                "tickers": count,
+                "bars": len(dates),
+                "points_per_series": min(points, len(dates)),
+                "full": full,
+                "lttb": thinned,
+                "bytes_saved": 1 - thinned["bytes"] / full["bytes"],
+            }
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
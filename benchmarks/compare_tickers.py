@@ -0,0 +1,95 @@
+"""Fetch and % change normalization for the explore page's compare chart at 2, 20 and 100 tickers.
+
+Prices come from an in-memory store filled by FakeDownloader, with `--latency` seconds added to
+every download to stand in for yahoo. Cold fetches compare one symbol at a time with
+PriceStore.get_many; normalization compares the old per-ticker pandas code with `rebase`.
+
+    python benchmarks/compare_tickers.py [--counts 2 20 100] [--period 10y] [--latency 0.3]
+"""
+import argparse
+import json
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+from pages.explore import rebase
+from price_store import FakeDownloader, PriceStore
+
+
+def slow_downloader(latency):
+    fake = FakeDownloader()
+
+    def download(*args, **kwargs):
+        time.sleep(latency)
+        return fake(*args, **kwargs)
+
+    return download
+
+
+# what create_graph did for two tickers, repeated for each one
+def old_normalize(data, tickers):
+    single_lvl_data = {idx: gp.xs(idx, level=1, axis=1) for idx, gp in data.groupby(level=1, axis=1)}
+    new_df = single_lvl_data["Open"]
+    first_valid_date = new_df.loc[:, new_df.isna().any()].first_valid_index()
+    df1 = new_df.loc[first_valid_date:, :].copy()
+    for ticker in tickers:
+        df1[f"delta_{ticker}"] = (df1[ticker] / df1[ticker].iloc[0] - 1) * 100
+    return df1
+
+
+def new_normalize(data, tickers):
+    prices = data["Open"].reindex(columns=tickers).to_numpy(dtype=float)
+    start, deltas = rebase(prices)
+    return pd.DataFrame(deltas, index=data.index[start:], columns=[f"delta_{ticker}" for ticker in tickers])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[2, 20, 100])
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.counts:
+        tickers = [f"T{i:03d}" for i in range(count)]
+
+        sequential = PriceStore(":memory:", downloader=slow_downloader(args.latency))
+        started = time.perf_counter()
+        for ticker in tickers:
+            sequential.get(ticker, args.period)
+        sequential_s = time.perf_counter() - started
+
+        store = PriceStore(":memory:", downloader=slow_downloader(args.latency))
+        started = time.perf_counter()
+        frames, failed = store.get_many(tickers, args.period)
+        batched_s = time.perf_counter() - started
+
+        by_ticker = pd.concat(frames, axis=1)
+        by_field = by_ticker.swaplevel(axis=1).sort_index(axis=1, level=0)
+        old, new = old_normalize(by_ticker, tickers), new_normalize(by_field, tickers)
+        assert np.allclose(old[new.columns].to_numpy(), new.to_numpy())
+
+        results.append(
+            {
+                "tickers": count,
+                "bars": len(by_ticker),
+                "cold_fetch_sequential_s": sequential_s,
+                "cold_fetch_get_many_s": batched_s,
+                "warm_fetch_get_many_s": min(timeit.repeat(lambda: store.get_many(tickers, args.period), number=1, repeat=args.repeat)),
+                "normalize_old_ms": min(timeit.repeat(lambda: old_normalize(by_ticker, tickers), number=1, repeat=args.repeat)) * 1000,
+                "normalize_new_ms": min(timeit.repeat(lambda: new_normalize(by_field, tickers), number=1, repeat=args.repeat)) * 1000,
+            }
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
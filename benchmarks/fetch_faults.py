@@ -0,0 +1,67 @@
+"""Run PriceStore.get_many against FakeDownloader with injected delays and failures.
+
+Each scenario prints how long the fetch took, which symbols came back and why the others
+didn't. Exits non-zero if a scenario doesn't end the way it should.
+
+    python benchmarks/fetch_faults.py [--timeout 0.5] [--budget 2]
+"""
+import argparse
+import json
+import sys
+import time
+
+import src_path  # noqa: F401  puts src/ on the path
+
+from fetch_executor import FetchExecutor
+from price_store import FakeDownloader, PriceStore
+
+TICKERS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+def scenarios(timeout, budget):
+    # name, downloader options, symbols expected back
+    return [
+        ("all healthy", {}, TICKERS),
+        ("one flaky symbol recovers on retry", {"failures": {"BBB": 2}}, TICKERS),
+        ("one symbol keeps failing", {"failures": {"BBB": 100}}, ["AAA", "CCC", "DDD"]),
+        ("one symbol slower than the timeout", {"delays": {"CCC": budget * 2}}, ["AAA", "BBB", "DDD"]),
+        ("one slow start, fast once retried", {"delays": {"DDD": timeout * 1.5}}, TICKERS),
+        ("delisted symbol", {"delisted": {"AAA"}}, TICKERS),
+    ]
+
+
+class FirstCallSlow(FakeDownloader):
+    # only the first call for a delayed symbol sleeps, like a connection that hangs once
+    def __call__(self, ticker, *args, **kwargs):
+        delay = self.delays.pop(ticker, 0)
+        time.sleep(delay)
+        return super().__call__(ticker, *args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--budget", type=float, default=2.0)
+    args = parser.parse_args()
+
+    results, ok = [], True
+    for name, options, expected in scenarios(args.timeout, args.budget):
+        downloader = FirstCallSlow(**options) if name.startswith("one slow start") else FakeDownloader(**options)
+        executor = FetchExecutor(timeout=args.timeout, retries=2, backoff=0.05, budget=args.budget)
+        store = PriceStore(":memory:", downloader=downloader, executor=executor)
+        started = time.perf_counter()
+        frames, failed = store.get_many(TICKERS, "1y")
+        elapsed = time.perf_counter() - started
+        passed = sorted(frames) == sorted(expected) and elapsed <= args.budget + args.timeout
+        ok = ok and passed
+        results.append(
+            {"scenario": name, "passed": passed, "elapsed_s": round(elapsed, 3), "fetched": sorted(frames), "failed": failed, "stats": executor.stats}
+        )
+        executor.pool.shutdown(wait=False)
+
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
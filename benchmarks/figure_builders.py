@@ -0,0 +1,175 @@
+"""CPU time per callback figure: plotly.express / graph_objects vs. the dict builders in figures.py.
+
+Each case builds the figure the way the callback used to and the way it does now, serializes it
+with the stdlib json and with orjson (which Dash uses when it is installed), and checks that
+everything the new dict sets matches the old figure (WebGL line traces count as the same as SVG
+ones). Exits non-zero if one doesn't.
+
+    python benchmarks/figure_builders.py [--repeat 20]
+"""
+import argparse
+import json
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import figures
+from montecarlo import simulate
+from projection import project_grid
+
+
+# what the callbacks did before
+def old_lines(dates, ys, names, legend):
+    df1 = pd.DataFrame(
+        {"Date": np.concatenate([dates] * len(names)), "value": np.concatenate(ys), "variable": np.repeat(names, len(dates))}
+    )
+    fig = px.line(
+        df1,
+        x="Date",
+        y="value",
+        color="variable" if legend else None,
+        color_discrete_sequence=px.colors.qualitative.Dark24,
+        template="plotly_dark",
+    )
+    return fig.update_layout(margin=dict(l=20, r=20, t=20, b=20), yaxis_title=None, yaxis_ticksuffix="%")
+
+
+def old_projection(x, result, low, high, title, band):
+    fig = px.line(x=x, y=result, template="plotly_dark", markers=True, title=title)
+    fig.add_traces(
+        [
+            go.Scatter(x=x, y=high, mode="lines", line_width=0, showlegend=False, hoverinfo="skip"),
+            go.Scatter(x=x, y=low, mode="lines", line_width=0, fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name=band),
+        ]
+    )
+    return fig.update_layout(xaxis_title="Years", yaxis_title="USD")
+
+
+def old_fan(x, p10, p50, p90, target, title):
+    fig = go.Figure(
+        [
+            go.Scatter(x=x, y=p90, mode="lines", line_width=0, showlegend=False, hoverinfo="skip"),
+            go.Scatter(x=x, y=p10, mode="lines", line_width=0, fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name="P10 - P90"),
+            go.Scatter(x=x, y=p50, mode="lines+markers", name="Median"),
+        ]
+    )
+    fig.add_hline(y=target, line_dash="dash", line_color="gray")
+    return fig.update_layout(template="plotly_dark", title=title, xaxis_title="Years", yaxis_title="USD")
+
+
+def old_pie(names, values, column):
+    fig = px.pie(
+        values=values,
+        names=names,
+        labels={"names": column, "values": "balance_prct"},
+        hole=0.3,
+        height=400,
+        template="plotly_dark",
+        color_discrete_sequence=px.colors.sequential.Jet,
+    )
+    return fig.update_layout(margin=dict(l=20, r=20, t=20, b=20))
+
+
+def plain(figure):
+    figure = json.loads(to_json_plotly(figure))
+    figure["layout"].pop("template", None)
+    return figure
+
+
+def same_value(old, new):
+    if isinstance(new, str) and isinstance(old, str):
+        if "+" in new:  # px joins trace modes in set order
+            return sorted(old.split("+")) == sorted(new.split("+"))
+        return old == new or old.replace("T00:00:00", "") == new or (old, new) == ("scatter", "scattergl")
+    if isinstance(new, float) or isinstance(old, float):
+        return bool(np.isclose(old, new))
+    return old == new
+
+
+# everything the new figure sets must be in the old one with the same value
+def covered(old, new, path="figure"):
+    if isinstance(new, dict):
+        if not isinstance(old, dict):
+            return f"{path}: {old!r} is not a dict"
+        for key, value in new.items():
+            outcome = covered(old.get(key), value, f"{path}.{key}")
+            if outcome is not True:
+                return outcome
+        return True
+    if isinstance(new, list):
+        if not isinstance(old, list) or len(old) != len(new):
+            return f"{path}: length {len(old or [])} != {len(new)}"
+        for i, (a, b) in enumerate(zip(old, new)):
+            outcome = covered(a, b, f"{path}[{i}]")
+            if outcome is not True:
+                return outcome
+        return True
+    return same_value(old, new) or f"{path}: {old!r} != {new!r}"
+
+
+def cases():
+    dates = pd.bdate_range("2013-01-01", periods=1200).values
+    rng = np.random.default_rng(0)
+    for count in (1, 10):
+        names = [f"delta_T{i}" for i in range(count)]
+        ys = [rng.normal(size=len(dates)).cumsum() for _ in names]
+        yield (
+            f"create_graph, {count} x {len(dates)} points",
+            lambda: old_lines(dates, ys, names, count > 1),
+            lambda: figures.line_figure([dates] * count, ys, names, count > 1),
+        )
+
+    x = list(range(26))
+    low, result, high = project_grid([0.07, 0.09, 0.11], 25, 100000, 5000)
+    yield (
+        "update_goal projection",
+        lambda: old_projection(x, result, low, high, "$1.2M after 25 years", "7% - 11%"),
+        lambda: figures.projection_figure(x, result, low, high, "$1.2M after 25 years", "7% - 11%"),
+    )
+
+    fan = simulate(25, 100000, 5000, 0.09, 0.15, 1e6)["percentiles"]
+    yield (
+        "update_simulation fan",
+        lambda: old_fan(x, *fan, 1e6, "55% chance"),
+        lambda: figures.fan_figure(x, *fan, 1e6, "55% chance"),
+    )
+
+    names, values = ["Cricket", "Ladybug", "Joint"], [33.1, 48.5, 18.4]
+    yield (
+        "update_portfolio_stats pie",
+        lambda: old_pie(names, values, "owner"),
+        lambda: figures.pie_figure(names, values, "owner", "balance_prct"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results, ok = [], True
+    for name, old, new in cases():
+        outcome = covered(plain(old()), plain(new()))
+        ok = ok and outcome is True
+        timings = {}
+        for label, build in (("px", old), ("builder", new)):
+            timings[f"{label}_build_ms"] = min(timeit.repeat(build, number=1, repeat=args.repeat)) * 1000
+            for engine in ("json", "orjson"):
+                timings[f"{label}_build_and_{engine}_ms"] = min(
+                    timeit.repeat(lambda: to_json_plotly(build(), engine=engine), number=1, repeat=args.repeat)
+                ) * 1000
+        results.append({"callback": name, "same_output": outcome, **timings})
+
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare the per-year `comound_interest` loop with the vectorized projection engine.
+
+    python benchmarks/goal_projection.py [--repeat 200]
+"""
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+import src_path  # noqa: F401  puts src/ on the path
+
+from projection import comound_interest, project, project_grid
+
+
+def loop(years, rate):
+    # what update_goal did before: one closed-form call per year, appended to a list
+    return [comound_interest(y, 100000, 5000, rate) for y in range(0, years + 1)]
+
+
+def loop_grid(years, rates):
+    return [loop(years, rate) for rate in rates]
+
+
+def best_of(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    results = []
+    for years in (25, 50, 100):
+        assert np.allclose(loop(years, 0.09), project(years, 100000, 5000, 0.09))
+        results.append(
+            {
+                "case": f"single rate, {years} years",
+                "loop_us": best_of(lambda: loop(years, 0.09), args.repeat) * 1e6,
+                "vectorized_us": best_of(lambda: project(years, 100000, 5000, 0.09), args.repeat) * 1e6,
+            }
+        )
+
+    rates = np.linspace(0.001, 0.15, 150)  # avoid 0, which the old formula divides by
+    for years in (25, 50):
+        results.append(
+            {
+                "case": f"{len(rates)} rates x {years} years",
+                "loop_us": best_of(lambda: loop_grid(years, rates), args.repeat // 10 or 1) * 1e6,
+                "vectorized_us": best_of(lambda: project_grid(rates, years, 100000, 5000), args.repeat) * 1e6,
+            }
+        )
+
+    for row in results:
+        row["speedup"] = row["loop_us"] / row["vectorized_us"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Time and peak memory of importing and exporting a large broker export, streamed vs. read whole.
+
+Builds --rows holdings with a few extra columns a broker would add, encodes them the way
+dcc.Upload hands a file to the callback (a base64 data URL) and reads them with holdings_io, a
+chunk at a time, and the whole-file way: the upload decoded, then parsed, in one go. Both end
+with the same Holdings. Exports write the holdings a chunk at a time against building the whole
+file first. Times are taken untraced; peak memory is what tracemalloc counts on a second run,
+on top of the upload's own contents.
+
+    python benchmarks/holdings_import.py [--rows 500000] [--formats csv parquet]
+"""
+import argparse
+import base64
+import io
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import holdings_io
+from holdings import Holdings
+
+HEADERS = {
+    "Region": "region", "Market": "market", "Balance $": "balance_dollar", "Balance %": "balance_prct",
+    "Ticker": "ticker", "Quantity": "quantity", "Investment": "investment", "Account": "account",
+    "Platform": "platform", "Owner": "owner",
+}
+
+
+def broker_export(rows):
+    rng = np.random.default_rng(0)
+    dollars = rng.uniform(100, 50000, rows).round(2)
+    return pd.DataFrame(
+        {
+            "Account": rng.choice(["401k", "403b", "Brokerage", "IRA", "Roth IRA"], rows),
+            "Ticker": np.array([f"T{i:04d}" for i in range(2000)])[rng.integers(0, 2000, rows)],
+            "Description": np.array([f"Security number {i}" for i in range(2000)])[rng.integers(0, 2000, rows)],
+            "Quantity": rng.integers(1, 1000, rows),
+            "Last Price": rng.uniform(5, 500, rows).round(2),
+            "Balance $": dollars,
+            "Region": rng.choice(["Domestic", "International", "Mix"], rows),
+            "Market": rng.choice(["Equities", "Bonds", "Annuities", "Commodities"], rows),
+            "Platform": rng.choice(["Vanguard", "Empower", "Fidelity", "Schwab"], rows),
+            "Owner": rng.choice(["Cricket", "Ladybug", "Joint"], rows),
+            "Cost Basis": (dollars * rng.uniform(0.5, 1.5, rows)).round(2),
+        }
+    )
+
+
+def data_url(frame, fmt):
+    if fmt == "csv":
+        data = frame.to_csv(index=False).encode()
+    else:
+        out = io.BytesIO()
+        frame.to_parquet(out, index=False)
+        data = out.getvalue()
+    return len(data), "data:application/octet-stream;base64," + base64.b64encode(data).decode("ascii")
+
+
+def read_whole(contents, fmt):
+    data = io.BytesIO(base64.b64decode(contents.split(",", 1)[1]))
+    frame = pd.read_csv(data) if fmt == "csv" else pd.read_parquet(data)
+    return Holdings.from_frame(frame.rename(columns=HEADERS))
+
+
+def measured(fn):
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"s": seconds, "peak_mb": peak / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "parquet"])
+    args = parser.parse_args()
+
+    frame = broker_export(args.rows)
+    results = {"rows": args.rows, "chunk_rows": holdings_io.CHUNK_ROWS, "imports": [], "exports": []}
+    holdings = None
+    for fmt in args.formats:
+        size, contents = data_url(frame, fmt)
+        holdings, streamed = measured(lambda: holdings_io.read_upload(contents, f"export.{fmt}", HEADERS))
+        _, whole = measured(lambda: read_whole(contents, fmt))
+        results["imports"].append(
+            {"format": fmt, "file_mb": size / 2**20, "upload_mb": len(contents) / 2**20, "streamed": streamed, "whole": whole}
+        )
+        del contents
+
+    for fmt in args.formats:
+        sent, streamed = measured(lambda: sum(len(chunk) for chunk in holdings_io.export(holdings, fmt)))
+        if fmt == "csv":
+            whole_file = lambda: len(holdings.frame.to_csv(index=False))  # noqa: E731
+        else:
+            whole_file = lambda: len(holdings.frame.to_parquet(index=False))  # noqa: E731
+        _, whole = measured(whole_file)
+        results["exports"].append({"format": fmt, "file_mb": sent / 2**20, "streamed": streamed, "whole": whole})
+
+    results["held_mb"] = int(holdings.frame.memory_usage(deep=True).sum()) / 2**20
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Memory and per-callback CPU of the portfolio state: typed columns vs. the list of row dicts they replaced.
+
+Both go through a HoldingsStore on the in-memory backend, so every callback pays for decoding and
+encoding the stored JSON, as it does with the sqlite store. Memory is what tracemalloc counts
+for the decoded holdings, plus the size of the stored JSON.
+
+    python benchmarks/holdings_model.py [--holdings 100000] [--repeat 5]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import aggregates
+import app  # noqa: F401  registers the pages
+from holdings import Holdings
+from holdings_store import HoldingsStore, MemoryBackend
+from pages import portfolio
+from pages.portfolio import balance_prct, new_holding, with_balance
+from valuation import PriceSnapshot
+
+TOTAL = 262000
+
+
+def holdings(count, rng):
+    tickers = [f"T{i:04d}" for i in range(500)]
+    prct = 100 / count
+    return [
+        {
+            "id": str(i),
+            "region": ["Domestic", "International", "Mix"][i % 3],
+            "market": ["Equities", "Bonds", "Annuities", "Commodities"][i % 4],
+            "balance_dollar": prct * TOTAL / 100,
+            "balance_prct": str(prct) if i % 10 == 0 else prct,  # edits arrive from the grid as text
+            "ticker": tickers[rng.integers(len(tickers))] if i % 5 else "",
+            "quantity": float(rng.integers(1, 500)) if i % 5 else None,
+            "investment": f"fund {i % 400}",
+            "account": ["401k", "403b", "Brokerage", "IRA", "Roth IRA"][i % 5],
+            "platform": ["Vanguard", "Empower", "Tiaa-Cref", "Fidelity"][i % 4],
+            "owner": ["Cricket", "Ladybug", "Joint"][i % 3],
+        }
+        for i in range(count)
+    ]
+
+
+# the row-dict state and callbacks as they were before holdings.py
+def previous_state(rows):
+    rows = [with_balance(row, TOTAL) for row in rows]
+    return {"rows": rows, "total": TOTAL, "groups": aggregates.build(rows, balance_prct)}
+
+
+def previous_load(state):
+    return state["rows"], sum(balance_prct(row) or 0 for row in state["rows"])
+
+
+def previous_edit(state, change):
+    row = with_balance(change["data"], state["total"])
+    old = next((old for old in state["rows"] if old.get("id") == row.get("id")), None)
+    rows = [row if existing is old else existing for existing in state["rows"]]
+    return {**state, "rows": rows, "groups": aggregates.replace(state["groups"], old, row, balance_prct)}
+
+
+def previous_total(state, total_investment):
+    return {**state, "rows": [with_balance(row, total_investment) for row in state["rows"]], "total": total_investment}
+
+
+def previous_add(state, rows):
+    for row in rows:
+        aggregates.add(state["groups"], row, balance_prct)
+    return {**state, "rows": state["rows"] + rows}
+
+
+def previous_delete(state, row_ids):
+    for row in state["rows"]:
+        if row.get("id") in row_ids:
+            aggregates.remove(state["groups"], row, balance_prct)
+    return {**state, "rows": [row for row in state["rows"] if row.get("id") not in row_ids]}
+
+
+def previous_revalue(state, prices):
+    def ticker_of(row):
+        ticker = row.get("ticker")
+        return ticker.strip().upper() if isinstance(ticker, str) and ticker.strip() else None
+
+    def numbers(field):
+        return pd.to_numeric(pd.Series([row.get(field) for row in state["rows"]], dtype=object), errors="coerce").to_numpy(dtype=float)
+
+    price = prices.reindex([ticker_of(row) for row in state["rows"]]).to_numpy(dtype=float)
+    value = numbers("quantity") * price
+    dollar = np.where(np.isnan(value), numbers("balance_dollar"), value)
+    prct = dollar / np.nansum(dollar) * 100
+    rows = [
+        {**row, "balance_dollar": None if d != d else d, "balance_prct": None if p != p else p}
+        for row, d, p in zip(state["rows"], dollar.tolist(), prct.tolist())
+    ]
+    return {**state, "rows": rows, "groups": aggregates.build(rows, balance_prct)}
+
+
+# the group sums kept up to date edit by edit agree with summing the columns afresh
+def matching_groups(state):
+    return all(
+        np.isclose(state["groups"][column][label][0], value[0]) and state["groups"][column][label][1] == value[1]
+        for column, labels in state["holdings"].group_sums(aggregates.GROUP_COLUMNS).items()
+        for label, value in labels.items()
+    )
+
+
+def cpu_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        times.append((time.process_time() - started) * 1000)
+    return statistics.median(times)
+
+
+def traced_bytes(fn):
+    tracemalloc.start()
+    value = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = holdings(args.holdings, rng)
+    prices = pd.Series(np.linspace(10, 500, 500), index=[f"T{i:04d}" for i in range(500)])
+    snapshot = PriceSnapshot(prices, pd.Timestamp("2023-03-31"), {}, time.time())
+
+    before = HoldingsStore(MemoryBackend())
+    before.put("s", previous_state(rows))
+    after = HoldingsStore(MemoryBackend())
+    portfolio.get_holdings_store = lambda: after
+    table = Holdings.from_records(rows).with_total(TOTAL)
+    after.put("s", {"holdings": table, "total": TOTAL, "groups": table.group_sums(aggregates.GROUP_COLUMNS)})
+
+    stored_before, stored_after = before.backend.load("s"), after.backend.load("s")
+    _, rows_bytes = traced_bytes(lambda: json.loads(stored_before)["rows"])
+    _, columns_bytes = traced_bytes(lambda: Holdings.from_json(json.loads(stored_after)["holdings"]))
+    ingest_ms = cpu_ms(lambda: Holdings.from_records(rows), 1)
+
+    edited = dict(rows[args.holdings // 2], balance_prct="0.5")
+    change = {"rowIndex": args.holdings // 2, "colId": "balance_prct", "data": edited}
+    added = []
+
+    def new_row():  # a new id every time, as ids must be unique
+        row = new_holding()
+        added.append(row["id"])
+        return row
+
+    callbacks = {
+        "load_portfolio": (
+            lambda: previous_load(before.update("s", lambda state: state)),
+            lambda: (lambda state: (state["holdings"].to_records(), state["holdings"].total_percentage()))(portfolio.load_state("s")),
+        ),
+        "edit Balance %": (
+            lambda: before.update("s", lambda state: previous_edit(state, change)),
+            lambda: portfolio.change_state("s", lambda state: portfolio.apply_cell_change(state, change)),
+        ),
+        "change total": (
+            lambda: before.update("s", lambda state: previous_total(state, TOTAL * 2)),
+            lambda: portfolio.change_state("s", lambda state: portfolio.apply_total(state, TOTAL * 2)),
+        ),
+        "add row": (
+            lambda: before.update("s", lambda state: previous_add(state, [new_row()])),
+            lambda: portfolio.change_state("s", lambda state: portfolio.add_rows(state, [new_row()])),
+        ),
+        "delete row": (
+            lambda: before.update("s", lambda state: previous_delete(state, set(added))),
+            lambda: portfolio.change_state("s", lambda state: portfolio.delete_rows(state, set(added))),
+        ),
+        "revalue": (
+            lambda: before.update("s", lambda state: previous_revalue(state, prices)),
+            lambda: portfolio.change_state("s", lambda state: portfolio.apply_valuation(state, snapshot)),
+        ),
+    }
+
+    cpu = {}
+    for name, (previous, current) in callbacks.items():
+        if name == "revalue":  # rebuilds the group sums, so check the ones kept up to date by the edits first
+            groups_match = matching_groups(portfolio.load_state("s"))
+        cpu[name] = {"row_dicts": cpu_ms(previous, args.repeat), "columns": cpu_ms(current, args.repeat)}
+
+    results = {
+        "holdings": args.holdings,
+        "memory": {
+            "row_dicts_bytes": rows_bytes,
+            "columns_bytes": columns_bytes,
+            "columns_frame_bytes": int(table.frame.memory_usage(deep=True).sum()),
+            "stored_rows_json_bytes": len(stored_before),
+            "stored_columns_json_bytes": len(after.backend.load("s")),
+        },
+        "ingest_ms": ingest_ms,
+        "callback_cpu_ms": cpu,
+        "groups_match": groups_match,
+    }
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if results["groups_match"] else 1)
+
+
+if __name__ == "__main__":
+    main()
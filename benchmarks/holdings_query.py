@@ -0,0 +1,126 @@
+"""Portfolio grid rows as they are fetched a block at a time, by portfolio size, vs. sending the whole table.
+
+For each --sizes portfolio, stored in a HoldingsStore on the in-memory backend, this times the
+page_rows requests the grid makes: the first block after the holdings changed (which decodes and
+indexes them), the first block again, the first sort by a column, a new sort by a column sorted
+before, a new text filter, a new number filter on a sorted view and scrolling further down it. Each is compared with the client-side row model's one
+response: every holding as rowData. Times are milliseconds of wall clock, the median of --repeat.
+
+    python benchmarks/holdings_query.py [--sizes 1000 10000 100000 500000] [--repeat 5]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+import holdings_query
+from holdings import Holdings
+from holdings_store import HoldingsStore, MemoryBackend
+from pages import portfolio
+
+TOTAL = 262000
+BLOCK = portfolio.GRID_BLOCK_ROWS
+
+
+def holdings(count):
+    rng = np.random.default_rng(count)
+    prct = rng.uniform(0, 1, count)
+    return Holdings.from_frame(
+        pd.DataFrame(
+            {
+                "id": [f"h{i}" for i in range(count)],
+                "region": rng.choice(["Domestic", "International", "Mix"], count),
+                "market": rng.choice(["Equities", "Bonds", "Annuities", "Commodities"], count),
+                "balance_prct": prct / prct.sum() * 100,
+                "ticker": np.array([f"T{i:04d}" for i in range(2000)])[rng.integers(0, 2000, count)],
+                "quantity": rng.integers(1, 1000, count).astype(float),
+                "investment": np.array([f"fund {i}" for i in range(400)])[rng.integers(0, 400, count)],
+                "account": rng.choice(["401k", "403b", "Brokerage", "IRA", "Roth IRA"], count),
+                "platform": rng.choice(["Vanguard", "Empower", "Tiaa-Cref", "Fidelity"], count),
+                "owner": rng.choice(["Cricket", "Ladybug", "Joint"], count),
+            }
+        )
+    ).with_total(TOTAL)
+
+
+def request(start=0, sort_model=(), filter_model=None):
+    return {"startRow": start, "endRow": start + BLOCK, "sortModel": list(sort_model), "filterModel": filter_model or {}}
+
+
+def timed(fn, repeat, before=None):
+    times = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return response, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    store = HoldingsStore(MemoryBackend())
+    portfolio.get_holdings_store = lambda: store
+    page_rows = portfolio.page_rows.__wrapped__
+
+    results = []
+    for size in args.sizes:
+        session = f"s{size}"
+        table = holdings(size)
+        store.put(session, portfolio.new_state(table))
+        queries = holdings_query.HoldingsQueries()
+        portfolio.get_holdings_queries = lambda: queries
+
+        def fresh():  # each first block after a change pays for decoding and indexing the holdings
+            queries._indexes.clear()
+
+        def new_orders():
+            for _, index in queries._indexes.values():
+                index.orders.clear()
+
+        def unsorted():
+            for _, index in queries._indexes.values():
+                index.orders.clear()
+                index.sorted.clear()
+
+        by_balance = [{"colId": "balance_prct", "sort": "desc"}]
+        accounts = {"account": {"filterType": "text", "type": "contains", "filter": "ira"}}
+        larger = {"balance_dollar": {"filterType": "number", "type": "greaterThan", "filter": TOTAL / size}}
+        first, cold = timed(lambda: page_rows(request(), session), args.repeat, before=fresh)
+        _, warm = timed(lambda: page_rows(request(), session), args.repeat)
+        _, first_sort = timed(lambda: page_rows(request(0, by_balance), session), args.repeat, before=unsorted)
+        _, sort = timed(lambda: page_rows(request(0, by_balance), session), args.repeat, before=new_orders)
+        _, text = timed(lambda: page_rows(request(0, (), accounts), session), args.repeat, before=new_orders)
+        _, number = timed(lambda: page_rows(request(0, by_balance, larger), session), args.repeat, before=new_orders)
+        _, scroll = timed(lambda: page_rows(request(size // 2, by_balance), session), args.repeat)
+        everything, whole = timed(lambda: to_json_plotly(table.to_records()), 1)
+
+        results.append(
+            {
+                "holdings": size,
+                "block_ms": {
+                    "first_after_change": cold, "first": warm, "first_sort": first_sort, "sort": sort, "text_filter": text,
+                    "number_filter_and_sort": number, "scroll_sorted": scroll,
+                },
+                "block_bytes": len(to_json_plotly(first)),
+                "client_side": {"rowData_ms": whole, "rowData_bytes": len(everything)},
+            }
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""What instrumentation.py adds to a callback call, and how long rendering /metrics takes.
+
+Times a trivial function bare and wrapped in @instrument, a count_cache call and an upstream()
+block, then renders the Prometheus text for --callbacks callbacks with a few labels each.
+
+    python benchmarks/instrumentation_overhead.py [--calls 100000] [--callbacks 20]
+"""
+import argparse
+import json
+import time
+
+import src_path  # noqa: F401  puts src/ on the path
+
+from instrumentation import Metrics, count_cache, get_metrics, instrument, upstream
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def noop():
+    return None
+
+
+def timed_upstream():
+    with upstream("prices"):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--callbacks", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {
+        "calls": args.calls,
+        "bare_us": per_call_us(noop, args.calls),
+        "instrumented_us": per_call_us(instrument(noop), args.calls),
+        "count_cache_us": per_call_us(lambda: count_cache("price_store", "hit"), args.calls),
+        "upstream_us": per_call_us(timed_upstream, args.calls),
+    }
+    results["overhead_us"] = results["instrumented_us"] - results["bare_us"]
+
+    metrics = Metrics()
+    for i in range(args.callbacks):
+        labels = {"callback": f"callback_{i}"}
+        for seconds in (0.003, 0.04, 0.6):
+            metrics.observe("dash_callback_seconds", labels, seconds)
+        metrics.inc("dash_callback_calls_total", labels, 3)
+        for outcome in ("hit", "miss"):
+            metrics.inc("dash_callback_cache_total", {**labels, "cache": "price_store", "outcome": outcome})
+    started = time.perf_counter()
+    text = metrics.render()
+    results["render_ms"] = (time.perf_counter() - started) * 1000
+    results["render_bytes"] = len(text)
+    results["recorded_calls"] = sum(v for (name, _), v in get_metrics().snapshot()["counters"].items() if name == "dash_callback_calls_total")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
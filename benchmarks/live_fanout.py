@@ -0,0 +1,87 @@
+"""Upstream quote calls and bytes per live update as the number of watching browsers grows.
+
+Every client polls the process's LivePoller the way extend_live does (watch, then read what is
+new) on a simulated feed. Upstream calls should track the poll interval, not the client count.
+The payload compares one tick's extendData with rebuilding the whole explore figure.
+
+    python benchmarks/live_fanout.py [--clients 1 10 100] [--seconds 2] [--interval 0.1]
+"""
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import src_path  # noqa: F401  puts src/ on the path
+
+from live_feed import LivePoller, SimulatedQuotes
+
+import app  # noqa: F401  registers the pages
+from pages.explore import line_figure
+
+TICKERS = ["AAPL", "MSFT", "NVDA"]
+
+
+def run_clients(count, seconds, interval):
+    feed = SimulatedQuotes()
+    poller = LivePoller(feed, interval=interval)
+    stop = threading.Event()
+    received = [0] * count
+
+    def client(i):
+        since = {}
+        while not stop.is_set():
+            poller.watch(TICKERS)
+            for ticker in TICKERS:
+                quotes = poller.since(ticker, since.get(ticker))
+                if quotes:
+                    since[ticker] = quotes[-1][0]
+                    received[i] += len(quotes)
+            stop.wait(interval)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    poller.stop()
+    return {
+        "clients": count,
+        "upstream_calls": feed.calls,
+        "reads": poller.stats["reads"],
+        "quotes_per_client": sum(received) / count,
+    }
+
+
+def payload_bytes():
+    dates = pd.bdate_range(end=pd.Timestamp.today(), periods=1200)
+    deltas = np.random.default_rng(0).normal(size=(len(dates), len(TICKERS))).cumsum(axis=0)
+    figure = line_figure(dates, deltas, [f"delta_{ticker}" for ticker in TICKERS], 1200, True)
+    now = pd.Timestamp.now().floor("s").isoformat()
+    extend = [{"x": [[now]] * len(TICKERS), "y": [[1.2345678]] * len(TICKERS)}, list(range(len(TICKERS)))]
+    return {"rebuilt_figure": len(to_json_plotly(figure)), "extend_data": len(json.dumps(extend))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {
+        "seconds": args.seconds,
+        "interval": args.interval,
+        "runs": [run_clients(count, args.seconds, args.interval) for count in args.clients],
+        "bytes_per_update": payload_bytes(),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Payload size and time of the portfolio grid callbacks: full rowData vs. row transactions.
+
+Requests compare uploading rowData as State with sending only the edit to the session store.
+
+    python benchmarks/portfolio_payload.py [--sizes 10 1000 50000]
+"""
+import argparse
+import json
+import random
+import time
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+from pages.portfolio import new_holding, to_number, with_balance
+
+TOTAL = 262000
+
+
+# the row transactions, as the page sent them before the grid fetched its rows from the server
+def balance_updates(data, total_investment):
+    updated = (with_balance(row, total_investment) for row in data)
+    return [new for new, old in zip(updated, data) if new != old]
+
+
+def total_percentage(data, changed_row=None):
+    if changed_row is not None:
+        data = [changed_row if row.get("id") == changed_row.get("id") else row for row in data]
+    return sum(to_number(row.get("balance_prct")) or 0 for row in data)
+
+
+def holdings(size):
+    rng = random.Random(size)
+    rows = []
+    for i in range(size):
+        prct = round(100 / size, 6)
+        rows.append(
+            {
+                "id": str(i),
+                "region": rng.choice(["Domestic", "International"]),
+                "market": rng.choice(["Equities", "Bonds", "Annuities", "Cash"]),
+                "balance_dollar": prct * TOTAL / 100,
+                "balance_prct": prct,
+                "investment": f"FUND{rng.randrange(500)}",
+                "account": rng.choice(["401k", "403b", "Brokerage", "IRA"]),
+                "platform": rng.choice(["Vanguard", "Empower", "Tiaa-Cref"]),
+                "owner": rng.choice(["Cricket", "Ladybug", "Joint"]),
+            }
+        )
+    return rows
+
+
+# the previous callbacks: rebuild a DataFrame and send every record back
+def full_add(data):
+    new_row = pd.DataFrame({key: [value] for key, value in new_holding().items()})
+    return pd.concat([pd.DataFrame(data), new_row]).to_dict("records")
+
+
+def full_recalculate(data, total_investment):
+    dff = pd.DataFrame(data)
+    dff["balance_prct"] = pd.to_numeric(dff["balance_prct"], errors="coerce")
+    dff["balance_dollar"] = dff["balance_prct"] * total_investment / 100
+    return dff.to_dict("records")
+
+
+def measure(fn):
+    started = time.perf_counter()
+    response = fn()
+    encoded = to_json_plotly(response)
+    return {"bytes": len(encoded), "ms": (time.perf_counter() - started) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        data = holdings(size)
+        edited = dict(data[0], balance_prct=str(data[0]["balance_prct"] * 2))
+        cases = {
+            "add row": (lambda: full_add(data), lambda: {"add": [new_holding()]}),
+            "edit Balance %": (
+                lambda: full_recalculate([edited] + data[1:], TOTAL),
+                lambda: ({"update": [with_balance(edited, TOTAL)]}, total_percentage(data, edited)),
+            ),
+            "change total": (
+                lambda: full_recalculate(data, TOTAL * 2),
+                lambda: {"update": balance_updates(data, TOTAL * 2)},
+            ),
+        }
+        for case, (before, after) in cases.items():
+            results.append({"holdings": size, "case": case, "rowData": measure(before), "rowTransaction": measure(after)})
+
+        change = {"rowIndex": 0, "rowId": edited["id"], "data": edited, "colId": "balance_prct"}
+        results.append(
+            {
+                "holdings": size,
+                "case": "pie refresh request",
+                "rowData": {"bytes": len(to_json_plotly([change, TOTAL, data]))},
+                "session store": {"bytes": len(to_json_plotly([change, TOTAL, "0" * 32]))},
+            }
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
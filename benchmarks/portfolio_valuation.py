@@ -0,0 +1,109 @@
+"""Marking a large portfolio to market: one batched price lookup and a vectorized revaluation.
+
+Holdings get random tickers from a universe of --tickers symbols (some rows without a ticker
+keep their static Balance $). Prices come from an in-memory store filled by FakeDownloader.
+Reports a cold lookup (every price downloaded), one served by the price store, a revaluation
+that reuses the price snapshot and the full session update the portfolio page does, and checks
+the result against a per-row loop.
+
+    python benchmarks/portfolio_valuation.py [--holdings 10000] [--tickers 500]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+import market_data
+from pages.portfolio import apply_valuation
+from price_store import FakeDownloader, PriceStore
+from holdings import Holdings
+from valuation import Valuer
+
+
+def holdings(count, tickers, rng):
+    rows = []
+    for i in range(count):
+        priced = rng.random() < 0.9
+        rows.append(
+            {
+                "id": str(i),
+                "owner": ["Cricket", "Ladybug", "Joint"][i % 3],
+                "region": ["Domestic", "International"][i % 2],
+                "market": "Equities",
+                "platform": "Vanguard",
+                "account": "401k",
+                "investment": f"fund {i % 40}",
+                "ticker": tickers[rng.integers(len(tickers))] if priced else "",
+                "quantity": float(rng.integers(1, 500)) if priced else None,
+                "balance_dollar": float(rng.integers(1000, 50000)),
+                "balance_prct": None,
+            }
+        )
+    return rows
+
+
+# the same thing a row at a time
+def per_row(rows, prices):
+    dollars = []
+    for row in rows:
+        price = prices.get(row["ticker"]) if row["ticker"] else None
+        if price is not None and price == price and row.get("quantity") is not None:
+            dollars.append(row["quantity"] * price)
+        else:
+            dollars.append(row.get("balance_dollar"))
+    total = sum(dollar for dollar in dollars if dollar is not None)
+    return [dollar / total * 100 for dollar in dollars]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, default=10000)
+    parser.add_argument("--tickers", type=int, default=500)
+    args = parser.parse_args()
+
+    store = PriceStore(":memory:", downloader=FakeDownloader())
+    market_data.get_store = lambda: store
+    rng = np.random.default_rng(0)
+    rows = holdings(args.holdings, [f"T{i:04d}" for i in range(args.tickers)], rng)
+    table = Holdings.from_records(rows)
+    state = {"holdings": table, "total": 0.0}
+
+    valuer = Valuer()
+    cold_ms, (snapshot, (dollar, prct, total, marked)) = timed(lambda: valuer.value(table))
+    warm_ms, _ = timed(lambda: valuer.value(table))
+    stored_ms, _ = timed(lambda: Valuer().value(table))
+    session_ms, updated = timed(lambda: apply_valuation(state, valuer.snapshot(table.tickers())))
+    loop_ms, expected = timed(lambda: per_row(rows, snapshot.prices.to_dict()))
+
+    results = {
+        "holdings": args.holdings,
+        "tickers": args.tickers,
+        "marked": int(marked.sum()),
+        "priced_at": str(snapshot.as_of),
+        "cold_lookup_and_value_ms": cold_ms,
+        "stored_prices_lookup_and_value_ms": stored_ms,
+        "snapshot_reused_value_ms": warm_ms,
+        "session_update_ms": session_ms,
+        "per_row_loop_ms": loop_ms,
+        "matches_per_row": bool(np.allclose(prct, expected)),
+        "shares_total": float(np.nansum(prct)),
+        "valuer": valuer.stats,
+    }
+    print(json.dumps(results, indent=2))
+    stored = updated["holdings"].column("balance_dollar")
+    sys.exit(0 if results["matches_per_row"] and np.allclose(stored, dollar, equal_nan=True) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Rebalancing plans for synthetic portfolios by size: the vectorized greedy vs. a per-holding loop.
+
+Each --holdings portfolio spreads random Balance % targets over five accounts and --tickers
+symbols at random prices, with quantities that have drifted up to 20% from target and one
+holding in twenty without a ticker. A tenth more money is to be invested. For each lot size the
+plan is worked out by rebalance.rebalance and by the same greedy written one holding at a time,
+and both report their trades, the cash they leave and how far from target they end. The
+update_rebalance callback is timed as it runs after an edit (the holdings read and indexed
+again) and again for another lot size. Times are milliseconds, the median of --repeat.
+
+    python benchmarks/rebalance.py [--holdings 1000 10000 50000] [--tickers 2000] [--repeat 5]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+import src_path  # noqa: F401  puts src/ on the path
+
+import app  # noqa: F401  registers the pages
+import holdings_query
+import rebalance
+from holdings import Holdings
+from holdings_store import HoldingsStore, MemoryBackend
+from pages import portfolio
+from valuation import PriceSnapshot, Valuer
+
+TOTAL_PER_HOLDING = 5000
+ACCOUNTS = ["401k", "403b", "Brokerage", "IRA", "Roth IRA"]
+
+
+def synthetic(count, tickers, rng):
+    prices = pd.Series(rng.uniform(5, 500, tickers), index=[f"T{i:04d}" for i in range(tickers)])
+    prct = rng.uniform(0, 1, count)
+    prct = prct / prct.sum() * 100
+    ticker = prices.index.to_numpy()[rng.integers(0, tickers, count)]
+    ticker[rng.random(count) < 0.05] = ""
+    total = TOTAL_PER_HOLDING * count
+    drifted = prct / 100 * total * rng.uniform(0.8, 1.2, count)
+    holdings = Holdings.from_frame(
+        pd.DataFrame(
+            {
+                "id": [f"h{i}" for i in range(count)],
+                "region": "Domestic",
+                "market": "Equities",
+                "balance_dollar": drifted,
+                "balance_prct": prct,
+                "ticker": ticker,
+                "quantity": np.floor(drifted / prices.reindex(ticker).fillna(1).to_numpy()),
+                "investment": ticker,
+                "account": rng.choice(ACCOUNTS, count),
+                "platform": "Vanguard",
+                "owner": "Joint",
+            }
+        )
+    )
+    return holdings, prices, total * 1.1
+
+
+# the same plan one holding at a time: accounts' new money by water filling, rounding each
+# holding to the lot at or below target, then spending what is left on the furthest under
+def loop_rebalance(holdings, prices, total, lot):
+    rows = holdings.frame.to_dict("records")
+    prct_sum = sum(row["balance_prct"] for row in rows)
+    accounts = {}
+    for row in rows:
+        price = prices.get(row["ticker"], np.nan)
+        row["price"] = price
+        row["tradeable"] = bool(row["ticker"]) and row["quantity"] >= 0 and price > 0
+        row["current"] = row["quantity"] * price if row["tradeable"] else row["balance_dollar"]
+        row["target"] = row["balance_prct"] / prct_sum * total
+        account = accounts.setdefault(row["account"], {"current": 0.0, "target": 0.0, "fixed": 0.0, "share": 0.0})
+        account["current"] += row["current"]
+        account["target"] += row["target"]
+        account["fixed"] += 0.0 if row["tradeable"] else row["current"]
+        account["share"] += row["target"] if row["tradeable"] else 0.0
+
+    names = list(accounts)
+    added = total - sum(account["current"] for account in accounts.values())
+    gaps = np.array([accounts[name]["target"] - accounts[name]["current"] for name in names])
+    flows = rebalance.fill(gaps, added) if added >= 0 else -rebalance.fill(-gaps, -added)
+    for name, flow in zip(names, flows):
+        account = accounts[name]
+        account["value"] = account["current"] + flow
+        pool = max(account["value"] - account["fixed"], 0)
+        account["scale"] = pool / account["share"] if account["share"] > 0 else 0.0
+        account["cash"] = pool + account["fixed"]
+
+    candidates = []
+    for row in rows:
+        account = accounts[row["account"]]
+        shares = 0.0
+        if row["tradeable"]:
+            desired = row["target"] * account["scale"]
+            lots = np.floor((desired - row["current"]) / (row["price"] * lot) + rebalance.EPSILON)
+            shares = max(lots * lot, -row["quantity"])
+            step = max((lots + 1) * lot, -row["quantity"]) - shares
+            short = desired - row["current"] - shares * row["price"]
+            if desired != row["current"] and short > step * row["price"] / 2:
+                candidates.append((row["account"], -short, step, row))
+        row["shares"] = shares
+        account["cash"] -= row["current"] + (shares * row["price"] if row["tradeable"] else 0.0)
+
+    for name, _, step, row in sorted(candidates, key=lambda candidate: candidate[:2]):
+        cost = step * row["price"]
+        if cost <= accounts[name]["cash"] + rebalance.EPSILON:
+            row["shares"] += step
+            accounts[name]["cash"] -= cost
+    trades = [row for row in rows if row["shares"]]
+    return len(trades), sum(account["cash"] for account in accounts.values())
+
+
+def timed(fn, repeat, before=None):
+    times = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    store = HoldingsStore(MemoryBackend())
+    portfolio.get_holdings_store = lambda: store
+    update_rebalance = portfolio.update_rebalance.__wrapped__
+
+    results = []
+    for count in args.holdings:
+        rng = np.random.default_rng(count)
+        holdings, prices, total = synthetic(count, args.tickers, rng)
+        plans = []
+        for label, lot in rebalance.LOT_SIZES.items():
+            plan, vectorized = timed(lambda: rebalance.rebalance(holdings, prices, total, lot), args.repeat)
+            (loop_trades, loop_cash), loop = timed(lambda: loop_rebalance(holdings, prices, total, lot), 1)
+            plans.append(
+                {
+                    "lot": label,
+                    "vectorized_ms": vectorized,
+                    "loop_ms": loop,
+                    "trades": len(plan.trades),
+                    "loop_trades": loop_trades,
+                    "cash_left": float(plan.cash.sum()),
+                    "loop_cash_left": loop_cash,
+                    "drift_points": plan.drift,
+                }
+            )
+
+        session = f"s{count}"
+        store.put(session, portfolio.new_state(holdings))
+        valuer = Valuer()
+        valuer.lookup = lambda tickers, fetch=None: PriceSnapshot(prices, pd.Timestamp("2023-04-21"), {}, time.time())
+        portfolio.get_valuer = lambda: valuer
+        queries = holdings_query.HoldingsQueries()
+        portfolio.get_holdings_queries = lambda: queries
+
+        def edited():  # an edit makes a new version, which this worker reads and indexes again
+            queries._indexes.clear()
+
+        _, after_edit = timed(lambda: update_rebalance(None, None, 1, 0, True, total, session), args.repeat, before=edited)
+        _, lot_change = timed(lambda: update_rebalance(None, None, 100, 0, True, total, session), args.repeat)
+        results.append({"holdings": count, "plans": plans, "callback_ms": {"after_edit": after_edit, "lot_change": lot_change}})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
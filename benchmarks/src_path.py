@@ -0,0 +1,13 @@
+"""Imported first by the benchmarks that run the app's modules in-process.
+
+Puts src/ on the path, as the app itself runs from there, and keeps the data sources offline
+unless the environment says otherwise.
+"""
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+os.environ.setdefault("INVESTING_APP_OFFLINE", "1")
@@ -0,0 +1,70 @@
+"""Time `import app` and the first render of each page, cold vs. warm.
+
+Cold runs start from an empty data snapshot directory and price store; warm runs reuse them,
+which is what every gunicorn worker after the first one sees.
+
+    python benchmarks/startup.py [--runs 5] [--offline]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+import dash
+for page in dash.page_registry.values():
+    layout = page["layout"]
+    if callable(layout):
+        layout()
+rendered = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "first_render_s": rendered - imported}))
+"""
+
+
+def probe(env):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=SRC, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        key: {"median_s": statistics.median(s[key] for s in samples), "max_s": max(s[key] for s in samples)}
+        for key in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--offline", action="store_true", help="skip github and use the bundled csv files")
+    args = parser.parse_args()
+
+    cold, warm = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as scratch:
+            env = dict(
+                os.environ,
+                DATA_SNAPSHOT_DIR=os.path.join(scratch, "snapshots"),
+                PRICE_STORE_PATH=os.path.join(scratch, "prices.sqlite"),
+            )
+            if args.offline:
+                env["INVESTING_APP_OFFLINE"] = "1"
+            cold.append(probe(env))
+            warm.append(probe(env))
+
+    print(json.dumps({"runs": args.runs, "cold": summarize(cold), "warm": summarize(warm)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+GROUP_COLUMNS = ("owner", "region", "market", "platform", "account", "investment")
+
+
+# group sums are kept as {column: {group: [sum, rows]}} so a group disappears with its last row
+def group_key(value):
+    return "" if value is None else str(value)
+
+
+def build(rows, weight, columns=GROUP_COLUMNS):
+    groups = {column: {} for column in columns}
+    for row in rows:
+        add(groups, row, weight)
+    return groups
+
+
+# update every column's sums for one row, in place; weight(row) is the row's share (or None).
+# Removing a row from a group that isn't there (sums rebuilt without it) changes nothing
+def add(groups, row, weight, sign=1):
+    amount = (weight(row) or 0) * sign
+    for column, totals in groups.items():
+        key = group_key(row.get(column))
+        if sign < 0 and key not in totals:
+            continue
+        total, count = totals.get(key, (0.0, 0))
+        if count + sign:
+            totals[key] = [total + amount, count + sign]
+        else:
+            totals.pop(key, None)
+    return groups
+
+
+def remove(groups, row, weight):
+    return add(groups, row, weight, sign=-1)
+
+
+# a single edited cell moves the row's share from its old groups to its new ones
+def replace(groups, old_row, new_row, weight):
+    remove(groups, old_row, weight)
+    return add(groups, new_row, weight)
+
+
+def slices(groups, column):
+    names = list(groups[column])
+    return names, [groups[column][name][0] for name in names]
+
+
+def total(groups):
+    return sum(value for value, count in next(iter(groups.values()), {}).values())
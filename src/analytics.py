@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+from numpy.lib.stride_tricks import sliding_window_view
+
+from instrumentation import count_cache
+
+SMA_WINDOW = 50  # bars
+EMA_SPAN = 20
+RETURN_WINDOW = 21  # bars, about a month of trading days
+VOLATILITY_WINDOW = 21
+BARS_PER_YEAR = {"1d": 252, "5d": 52, "1wk": 52, "1mo": 12, "3mo": 4}
+MAX_SERIES = 256  # derived series kept per process, least recently used dropped first
+
+# the rolling columns only ever look this far back, so new bars need just this tail of the old ones
+LOOKBACK = max(SMA_WINDOW, RETURN_WINDOW, VOLATILITY_WINDOW + 1)
+
+# what the explore page can overlay, in legend order
+OVERLAYS = {
+    "sma": f"SMA {SMA_WINDOW}",
+    "ema": f"EMA {EMA_SPAN}",
+    "return": f"{RETURN_WINDOW}-bar return",
+    "volatility": f"{VOLATILITY_WINDOW}-bar volatility",
+    "drawdown": "Max drawdown",
+}
+# the overlays that are percentages of their own rather than of the price, drawn on a second y axis
+RIGHT_AXIS = ("return", "volatility")
+
+
+# fn(windows) over every run of `window` bars, NaN until the first full one
+def rolling(values, window, fn):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = fn(sliding_window_view(values, window))
+    return out
+
+
+# the columns that only look back a fixed number of bars
+def rolling_columns(price, interval):
+    price = np.asarray(price, dtype=float)
+    returns = np.full(len(price), np.nan)
+    returns[RETURN_WINDOW:] = (price[RETURN_WINDOW:] / price[:-RETURN_WINDOW] - 1) * 100
+    annualize = np.sqrt(BARS_PER_YEAR.get(interval, 252)) * 100
+    volatility = rolling(np.diff(np.log(price)), VOLATILITY_WINDOW, lambda windows: windows.std(axis=1, ddof=1) * annualize)
+    return {
+        "sma": rolling(price, SMA_WINDOW, lambda windows: windows.mean(axis=1)),
+        "return": returns,
+        "volatility": np.concatenate([[np.nan], volatility]),  # no return into the first bar
+    }
+
+
+# exponential moving average, continuing from previous (the EMA of the bar before) if given
+def ema(price, previous=None):
+    if previous is None:
+        return pd.Series(price, dtype=float).ewm(span=EMA_SPAN, adjust=False).mean().to_numpy()
+    alpha, out = 2 / (EMA_SPAN + 1), np.empty(len(price))
+    for i, value in enumerate(price):  # only ever the few bars that were just added
+        previous += alpha * (value - previous)
+        out[i] = previous
+    return out
+
+
+class Derived:
+    """One ticker's prices with their rolling columns, all aligned on the same bars."""
+
+    def __init__(self, times, price, columns):
+        self.times = times  # datetime64[ns] array
+        self.price = price
+        self.columns = columns
+
+    @classmethod
+    def compute(cls, prices, interval):
+        price = prices.to_numpy(dtype=float)
+        return cls(prices.index.values, price, {**rolling_columns(price, interval), "ema": ema(price)})
+
+    @property
+    def last_ts(self):
+        return self.times[-1]
+
+    # the bars of prices are all here, the last one with the same (not since revised) price
+    def covers(self, times, price):
+        if self.times[0] > times[0] or self.last_ts < times[-1]:
+            return False
+        return self.price[self.times.searchsorted(times[-1])] == price[-1]
+
+    # the row of times from which on they are bars we don't have yet, or None if they don't
+    # continue ours unchanged
+    def continued_at(self, times, price):
+        row = times.searchsorted(self.last_ts)
+        if self.times[0] > times[0] or row == len(times) or times[row] != self.last_ts or price[row] != self.price[-1]:
+            return None
+        return row + 1
+
+    # the same series with the bars after last_ts added; only the lookback tail is recomputed
+    def extend(self, times, added, interval):
+        tail = self.price[-LOOKBACK:]
+        columns = {name: values[len(tail):] for name, values in rolling_columns(np.concatenate([tail, added]), interval).items()}
+        columns["ema"] = ema(added, previous=self.columns["ema"][-1])
+        return Derived(
+            np.concatenate([self.times, times]),
+            np.concatenate([self.price, added]),
+            {name: np.concatenate([self.columns[name], columns[name]]) for name in self.columns},
+        )
+
+    # the bars from start to end with the price and the rolling columns, and the largest fall from
+    # a high to a later low among them: {"peak": row, "trough": row, "percent": fall}
+    def window(self, start, end):
+        rows = slice(self.times.searchsorted(np.datetime64(start)), self.times.searchsorted(np.datetime64(end), side="right"))
+        price = self.price[rows]
+        window = {"times": pd.DatetimeIndex(self.times[rows]), "price": price}
+        window.update({name: values[rows] for name, values in self.columns.items()})
+        window["drawdown"] = max_drawdown(price)
+        return window
+
+
+def max_drawdown(price):
+    if len(price) == 0:
+        return None
+    falls = price / np.maximum.accumulate(price) - 1
+    trough = int(falls.argmin())
+    return {"peak": int(price[:trough + 1].argmax()), "trough": trough, "percent": float(falls[trough] * 100)}
+
+
+class Analytics:
+    """Derived series memoized by (ticker, interval, field) and the timestamp of their last bar.
+
+    A request whose bars are all covered is served as is; one that only adds newer bars extends
+    the cached series; anything else (a longer period, a revised last bar) is computed from scratch.
+    """
+
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "appends": 0, "computes": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        count_cache("analytics", name)
+
+    def get(self, ticker, interval, prices, field="Close"):
+        if prices.hasnans:
+            prices = prices.dropna()
+        if prices.empty:
+            return None
+        times, price = prices.index.values, prices.to_numpy(dtype=float)
+        key = (ticker, interval, field)
+        with self._lock:
+            cached = self._series.get(key)
+            if cached is not None:
+                self._series.move_to_end(key)
+
+        if cached is not None and cached.covers(times, price):
+            self._count("hits")
+            return cached
+        row = cached.continued_at(times, price) if cached is not None else None
+        if row is not None:
+            derived = cached.extend(times[row:], price[row:], interval)
+            self._count("appends")
+        else:
+            derived = Derived.compute(prices, interval)
+            self._count("computes")
+
+        with self._lock:
+            self._series[key] = derived
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+        return derived
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+@lru_cache(maxsize=None)
+def get_analytics():
+    return Analytics()
@@ -1,11 +1,19 @@
+import logging
+import os
+import uuid
+
 import dash
 import dash_ag_grid as dag
 from dash import Dash, html, dcc, Input, Output, State, Patch, no_update, ctx
 import dash_bootstrap_components as dbc  #  version 1.4.0
 import pandas as pd  # version 1.5.3
-import plotly.express as px
 import yfinance as yf
 
+import instrumentation
+
+# LOG_LEVEL=INFO shows per-request details such as the explore chart's payload size
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING"))
+
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"  # styling sheet
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.CYBORG, dbc_css])
 server = app.server
@@ -26,15 +34,26 @@ navbar = dbc.NavbarSimple(
             className="mb-2",
 )
 
-app.layout = dbc.Container(
-    [
-
-        navbar,
-        dash.page_container
-
-
-    ], fluid=True, className="dbc"  # incorporates the dbc_css from above)
-)
+# a function so each new browser tab gets its own id; the session Store keeps the first one it
+# was given, and server-side state such as the portfolio holdings is keyed by it
+def serve_layout():
+    return dbc.Container(
+        [
+            dcc.Store(id="session-id", storage_type="session", data=uuid.uuid4().hex),
+            navbar,
+            dash.page_container,
+        ], fluid=True, className="dbc"  # incorporates the dbc_css from above)
+    )
+
+
+app.layout = serve_layout
+instrumentation.register(app)
+
+# dash finishes setting itself up (the page router, the callbacks) in hooks that run before a
+# worker's first request, and they aren't safe to run for several requests at once on gunicorn's
+# threads (see render.yaml); run here, every worker starts out ready
+with server.test_request_context():
+    server.preprocess_request()
 
 
 if __name__ == "__main__":
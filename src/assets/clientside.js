@@ -0,0 +1,251 @@
+// Browser-side versions of the pure-arithmetic callbacks, so editing a number doesn't cost a server
+// round trip. The Python functions they mirror stay the reference implementations:
+// pages/portfolio.py update_balance and pages/goal.py update_goal.
+(function () {
+    // value * 10^decimals / divisor rounded half-to-even on the exact binary value of `value`,
+    // which is what numerize gets from Decimal(value)
+    function scaledRound(value, decimals, divisor) {
+        const view = new DataView(new ArrayBuffer(8));
+        view.setFloat64(0, value);
+        const high = view.getUint32(0);
+        const exponentBits = (high >>> 20) & 0x7ff;
+        let mantissa = (BigInt(high & 0xfffff) << 32n) | BigInt(view.getUint32(4));
+        let exponent = -1074;
+        if (exponentBits !== 0) {
+            mantissa |= 1n << 52n;
+            exponent = exponentBits - 1075;
+        }
+        let numerator = mantissa * 10n ** BigInt(decimals);
+        let denominator = BigInt(divisor);
+        if (exponent >= 0) {
+            numerator <<= BigInt(exponent);
+        } else {
+            denominator <<= BigInt(-exponent);
+        }
+        const quotient = numerator / denominator;
+        const twiceRemainder = 2n * (numerator % denominator);
+        if (twiceRemainder > denominator || (twiceRemainder === denominator && quotient % 2n === 1n)) {
+            return quotient + 1n;
+        }
+        return quotient;
+    }
+
+    // same output as numerize.numerize(n, decimals): 1234567 -> "1.23M"
+    function numerize(n, decimals) {
+        const sign = n < 0 ? "-" : "";
+        n = Math.abs(n);
+        if (n >= 1e15) {
+            return sign + (Number.isInteger(n) ? BigInt(n).toString() : String(n));
+        }
+        const units = [[1e12, "T"], [1e9, "B"], [1e6, "M"], [1e3, "K"], [1, ""]];
+        for (const [size, suffix] of units) {
+            if (n >= size || size === 1) {
+                const digits = scaledRound(n, decimals, size).toString().padStart(decimals + 1, "0");
+                const text = digits.slice(0, digits.length - decimals) + "." + digits.slice(digits.length - decimals);
+                return sign + text.replace(/0+$/, "").replace(/\.$/, "") + suffix;
+            }
+        }
+    }
+
+    function isDigits(value) {
+        return /^[0-9]+$/.test(String(value));
+    }
+
+    // portfolio.to_number: a float, or null for anything that doesn't parse
+    function toNumber(value) {
+        if (value === null || value === undefined || (typeof value === "string" && value.trim() === "")) {
+            return null;
+        }
+        const number = Number(value);
+        return Number.isNaN(number) ? null : number;
+    }
+
+    function withBalance(row, totalInvestment) {
+        const prct = toNumber(row.balance_prct);
+        const dollar = prct === null ? null : prct * totalInvestment / 100;
+        return Object.assign({}, row, {balance_prct: prct, balance_dollar: dollar});
+    }
+
+    // portfolio.balance_columns: "Balance $" drawn from the row's "Balance %" and the total
+    function balanceColumns(columnDefs, totalInvestment) {
+        const getter = {function: "balanceDollar(params.data, " + String(Number(totalInvestment)) + ")"};
+        return columnDefs.map((col) => (col.field === "balance_dollar" ? Object.assign({}, col, {valueGetter: getter}) : col));
+    }
+
+    // projection.project_grid, one rate at a time
+    function projectGrid(rates, years, initial, annual, periodsPerYear, contributionGrowth, inflation) {
+        const periods = years * periodsPerYear;
+        return rates.map(function (rate) {
+            const yearly = [initial];
+            let deposited = 0;
+            for (let n = 0; n < periods; n++) {
+                let contribution = annual / periodsPerYear;
+                if (contributionGrowth) {
+                    contribution = contribution * Math.pow(1 + contributionGrowth, Math.floor(n / periodsPerYear));
+                }
+                deposited += contribution / Math.pow(1 + rate / periodsPerYear, n);
+                if ((n + 1) % periodsPerYear === 0) {
+                    let balance = Math.pow(1 + rate / periodsPerYear, n + 1) * (initial + deposited);
+                    if (inflation) {
+                        balance = balance / Math.pow(1 + inflation, (n + 1) / periodsPerYear);
+                    }
+                    yearly.push(balance);
+                }
+            }
+            return yearly;
+        });
+    }
+
+    const SENSITIVITY = 2;
+
+    function updateBalance(cellChange, totalInvestment, columnDefs, total, triggeredId) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (triggeredId === "money-to-invest") {
+            if (totalInvestment === null || totalInvestment === undefined) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            return [balanceColumns(columnDefs, totalInvestment), noUpdate, noUpdate];
+        }
+        if (cellChange && typeof cellChange === "object" && cellChange.colId === "balance_prct") {
+            const moved = (toNumber(total) || 0) - (toNumber(cellChange.oldValue) || 0) + (toNumber(cellChange.newValue) || 0);
+            return [noUpdate, moved, numerize(100 - moved, 2)];
+        }
+        return [noUpdate, noUpdate, noUpdate];
+    }
+
+    function updateGoal(years, invest, contribute, interest, growth, inflation, compounding, mode, volatility, target, paths, period, rebalance, template) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (years === "0") {
+            return [noUpdate, noUpdate, noUpdate];
+        }
+        if (![years, invest, contribute, interest, growth, inflation].every(isDigits)) {
+            return [noUpdate, noUpdate, noUpdate];
+        }
+        if (mode === "backtest") {
+            // so does the backtest, which needs the stored portfolio and price history
+            return [noUpdate, noUpdate, {
+                invest: parseFloat(invest),
+                contribute: parseFloat(contribute),
+                compounding: compounding,
+                period: period,
+                rebalance: rebalance,
+            }];
+        }
+        if (mode === "simulation") {
+            // the Monte Carlo run stays on the server; hand it the validated inputs
+            if (![volatility, target, paths].every(isDigits)) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            if (parseInt(paths, 10) === 0) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            return [noUpdate, {
+                years: parseInt(years, 10),
+                invest: parseFloat(invest),
+                contribute: parseFloat(contribute),
+                interest: parseFloat(interest),
+                growth: parseFloat(growth),
+                inflation: parseFloat(inflation),
+                volatility: parseFloat(volatility),
+                target: parseFloat(target),
+                paths: parseInt(paths, 10),
+            }, noUpdate];
+        }
+
+        years = parseFloat(years);
+        interest = parseFloat(interest);
+        inflation = parseFloat(inflation);
+        const rates = [Math.max(interest - SENSITIVITY, 0), interest, interest + SENSITIVITY];
+        const [low, result, high] = projectGrid(
+            rates.map((rate) => rate / 100),
+            Math.trunc(years),
+            parseFloat(invest),
+            parseFloat(contribute),
+            compounding,
+            parseFloat(growth) / 100,
+            inflation / 100
+        );
+        const x = result.map((_, year) => year);
+        let title = "$" + numerize(result[result.length - 1], 2) + " after " + Math.trunc(years) + " years";
+        if (inflation) {
+            title += " in today's dollars";
+        }
+        const figure = {
+            data: [
+                {
+                    type: "scatter", x: x, y: result, mode: "lines+markers", name: "", showlegend: false,
+                    line: {color: "#636efa", dash: "solid"}, marker: {symbol: "circle"},
+                    hovertemplate: "x=%{x}<br>y=%{y}<extra></extra>",
+                },
+                {type: "scatter", x: x, y: high, mode: "lines", line: {width: 0}, showlegend: false, hoverinfo: "skip"},
+                {
+                    type: "scatter", x: x, y: low, mode: "lines", line: {width: 0}, fill: "tonexty",
+                    fillcolor: "rgba(99, 110, 250, 0.2)", name: rates[0] + "% - " + rates[2] + "%",
+                },
+            ],
+            layout: {
+                template: template,
+                title: {text: title},
+                xaxis: {title: {text: "Years"}},
+                yaxis: {title: {text: "USD"}},
+            },
+        };
+        return [figure, noUpdate, noUpdate];
+    }
+
+    function triggeredId() {
+        const triggered = window.dash_clientside.callback_context.triggered;
+        return triggered.length ? triggered[0].prop_id.split(".")[0] : null;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        portfolio: {
+            update_balance: function (cellChange, totalInvestment, columnDefs, total) {
+                return updateBalance(cellChange, totalInvestment, columnDefs, total, triggeredId());
+            },
+            // the export links with this tab's session id
+            export_links: function (sessionId, ...hrefs) {
+                return hrefs.map((href) => href.split("?")[0] + "?session=" + encodeURIComponent(sessionId || ""));
+            },
+        },
+        goal: {
+            update_goal: updateGoal,
+        },
+        explore: {
+            // the chart's rendered width, which sizes the server-side downsampling
+            chart_width: function (id) {
+                const element = document.getElementById(id);
+                return (element && element.clientWidth) || window.innerWidth;
+            },
+            live_paused: function (on) {
+                return !on;
+            },
+            // overlays are always in the figure, this only flips which of them are drawn, and shows
+            // the second y axis while one of the overlays on it is
+            toggle_overlays: function (selected, figure) {
+                if (!figure) {
+                    return window.dash_clientside.no_update;
+                }
+                const shown = selected || [];
+                const data = figure.data.map((trace) => (
+                    trace.meta ? Object.assign({}, trace, {visible: shown.includes(trace.meta)}) : trace
+                ));
+                const layout = Object.assign({}, figure.layout);
+                if (layout.yaxis2) {
+                    const right = data.some((trace) => trace.meta && trace.visible && trace.yaxis === "y2");
+                    layout.yaxis2 = Object.assign({}, layout.yaxis2, {visible: right});
+                }
+                return Object.assign({}, figure, {data: data, layout: layout});
+            },
+        },
+        // exposed for tests/test_clientside.py
+        internals: {numerize: numerize, projectGrid: projectGrid, updateBalance: updateBalance},
+    });
+
+    // functions the grid's column definitions can call
+    window.dashAgGridFunctions = Object.assign({}, window.dashAgGridFunctions, {
+        balanceDollar: function (row, totalInvestment) {
+            return row ? withBalance(row, totalInvestment).balance_dollar : null;
+        },
+    });
+})();
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+
+from analytics import BARS_PER_YEAR
+from market_data import get_stock_data
+
+# replays an allocation over the daily bars the price store already keeps: the first investment
+# and every contribution are bought at the target weights, and the holdings are sold back to them
+# on a rebalancing schedule. Adjusted closes, so dividends count as reinvested
+PRICE_FIELD = "Adj Close"
+PERIODS = ("1y", "2y", "5y", "10y")
+BARS = BARS_PER_YEAR["1d"]
+REBALANCE_BARS = {"never": 0, "monthly": BARS // 12, "quarterly": BARS // 4, "yearly": BARS}
+POOL_WORKERS = int(os.environ.get("BACKTEST_WORKERS", os.cpu_count() or 1))
+MIN_CHUNK = 64  # allocations per pool task, below which the pool costs more than it saves
+
+
+class Prices:
+    """Daily prices of several tickers, one column each, from the first bar all of them have."""
+
+    def __init__(self, dates, values, tickers, failed):
+        self.dates = dates  # datetime64[ns] array
+        self.values = values  # (bars, tickers) floats, forward filled
+        self.tickers = tickers
+        self.failed = failed  # {ticker: reason} for those left out
+
+
+def load_prices(tickers, period):
+    data = get_stock_data(list(tickers), period, "1d", "column")
+    failed = dict(data.attrs.get("failed", {}))
+    frame = data[PRICE_FIELD].reindex(columns=list(tickers)) if PRICE_FIELD in data else pd.DataFrame()
+    for ticker in tickers:
+        if ticker not in frame or frame[ticker].isna().all():
+            failed.setdefault(ticker, "no prices")
+    frame = frame[[ticker for ticker in tickers if ticker not in failed]].ffill().dropna()
+    return Prices(frame.index.values, frame.to_numpy(dtype=float), list(frame.columns), failed)
+
+
+# rows of `weights` scaled to sum to 1
+def normalized(weights):
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    sums = weights.sum(axis=1, keepdims=True)
+    if (sums <= 0).any():
+        raise ValueError("Every allocation needs a positive weight")
+    return weights / sums
+
+
+def backtest(prices, weights, initial, contribution=0.0, contribute_every=0, rebalance_every=0):
+    """Value on every bar of each row of `weights` over `prices`, with the money paid in by then.
+
+    Returns (values, deposited, flows): values is (allocations, bars), the other two are per bar.
+    `contribution` is paid in every `contribute_every` bars and the holdings are rebalanced every
+    `rebalance_every` bars (0 for never). Between two rebalances the value is linear in the value
+    at the first one, so all of them follow from one cumulative product and sum, as in
+    projection.project_grid, and every allocation is a matrix product with the same price arrays.
+    """
+    weights = normalized(weights)
+    bars = len(prices)
+    flows = np.zeros(bars)
+    if contribute_every:
+        flows[contribute_every::contribute_every] = contribution
+    # units bought with one dollar of every contribution so far, per ticker
+    units = np.cumsum(np.where(flows[:, None] > 0, 1 / prices, 0), axis=0)
+
+    starts = np.arange(0, bars, rebalance_every) if rebalance_every else np.array([0])
+    period = np.searchsorted(starts, np.arange(bars), side="right") - 1
+    start = starts[period]
+    growth = weights @ (prices / prices[start]).T  # a dollar held since the last rebalance
+    added = contribution * (weights @ ((units - units[start]) * prices).T)  # contributions since then
+
+    # value at each rebalance: V[k+1] = V[k] * growth + added at the bar it happens
+    ends = starts[1:]
+    gain = weights @ (prices[ends] / prices[starts[:-1]]).T
+    paid = contribution * (weights @ ((units[ends] - units[starts[:-1]]) * prices[ends]).T)
+    scale = np.ones((len(weights), len(starts)))
+    np.cumprod(gain, axis=1, out=scale[:, 1:])
+    invested = np.zeros_like(scale)
+    np.cumsum(paid / scale[:, 1:], axis=1, out=invested[:, 1:])
+    at_start = scale * (initial + invested)
+
+    values = at_start[:, period] * growth + added
+    return values, initial + np.cumsum(flows), flows
+
+
+def summary(values, flows, bars_per_year=BARS):
+    """CAGR, annual volatility and the deepest drawdown of each row of `values`, in percent.
+
+    All three are of the time-weighted returns, so contributions don't count as gains.
+    """
+    returns = (values[:, 1:] - flows[1:]) / values[:, :-1] - 1
+    growth = np.ones_like(values)
+    np.cumprod(1 + returns, axis=1, out=growth[:, 1:])
+    years = (values.shape[1] - 1) / bars_per_year
+    return {
+        "cagr": (growth[:, -1] ** (1 / years) - 1) * 100 if years else np.full(len(values), np.nan),
+        "volatility": returns.std(axis=1, ddof=1) * np.sqrt(bars_per_year) * 100,
+        "drawdown": (growth / np.maximum.accumulate(growth, axis=1) - 1).min(axis=1) * 100,
+        "final": values[:, -1],
+    }
+
+
+def backtest_summary(prices, weights, *schedule):
+    values, _, flows = backtest(prices, weights, *schedule)
+    return summary(values, flows)
+
+
+# one process pool per process, started from a fork server: a web worker's threads could hold a
+# lock while it forks (see jobs.py)
+@lru_cache(maxsize=None)
+def get_pool(workers=POOL_WORKERS):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+
+
+def run_variants(prices, weights, initial, contribution=0.0, contribute_every=0, rebalance_every=0, workers=POOL_WORKERS):
+    """summary() of many allocations over the same prices, split across the process pool.
+
+    Each worker gets one contiguous share of the allocations, so the prices are sent once per worker.
+    """
+    weights = normalized(weights)
+    schedule = (initial, contribution, contribute_every, rebalance_every)
+    shares = min(workers, len(weights) // MIN_CHUNK)
+    if shares <= 1:
+        return backtest_summary(prices, weights, *schedule)
+    parts = np.array_split(weights, shares)
+    results = list(get_pool(workers).map(backtest_summary, [prices] * shares, parts, *[[value] * shares for value in schedule]))
+    return {name: np.concatenate([result[name] for result in results]) for name in results[0]}
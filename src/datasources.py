@@ -0,0 +1,61 @@
+import os
+import time
+from functools import lru_cache
+
+import pandas as pd  # version 1.5.3
+import requests
+
+from singleflight import interprocess_lock
+
+# the ticker universe and the seed portfolio are loaded on first use rather than at import time,
+# so a worker can boot without network access and the github copies are only fetched once
+HERE = os.path.dirname(os.path.abspath(__file__))
+GITHUB_DATA = "https://raw.githubusercontent.com/Coding-with-Adam/Dash-by-Plotly/master/Other"
+TICKERS_URL = f"{GITHUB_DATA}/tickers_yahoo.csv"
+PORTFOLIO_URL = f"{GITHUB_DATA}/my-portfolio.csv"
+
+SNAPSHOT_DIR = os.environ.get("DATA_SNAPSHOT_DIR", os.path.join(HERE, ".cache", "datasources"))
+SNAPSHOT_TTL = 24 * 60 * 60  # seconds
+FETCH_TIMEOUT = 5  # seconds
+OFFLINE = os.environ.get("INVESTING_APP_OFFLINE") == "1"
+
+
+def is_fresh(path):
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < SNAPSHOT_TTL
+
+
+def download_snapshot(url, path):
+    response = requests.get(url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    # write next to the snapshot and swap it in, so other workers never read half a file
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "wb") as handle:
+        handle.write(response.content)
+    os.replace(partial, path)
+
+
+# read a csv from the shared disk snapshot, refreshing it from github at most once per TTL
+def load_csv(name, url):
+    snapshot = os.path.join(SNAPSHOT_DIR, name)
+    if not is_fresh(snapshot):
+        with interprocess_lock(f"{snapshot}.lock"):
+            if not is_fresh(snapshot) and not OFFLINE:  # another worker may have just refreshed it
+                try:
+                    download_snapshot(url, snapshot)
+                except (requests.RequestException, OSError):
+                    pass
+
+    # an old snapshot still beats the copy bundled with the app
+    if os.path.exists(snapshot):
+        return pd.read_csv(snapshot)
+    return pd.read_csv(os.path.join(HERE, name))
+
+
+@lru_cache(maxsize=None)
+def get_tickers():
+    return load_csv("tickers_yahoo.csv", TICKERS_URL)  # dataset of tickers and their names
+
+
+@lru_cache(maxsize=None)
+def get_seed_portfolio():
+    return load_csv("my-portfolio.csv", PORTFOLIO_URL)
@@ -0,0 +1,48 @@
+import numpy as np
+
+MIN_POINTS = 200  # never thin a series below this, however narrow the chart
+MAX_POINTS = 4000
+DEFAULT_WIDTH = 1200  # pixels assumed until the browser reports the chart's width
+
+
+# one point per horizontal pixel is all a line chart can show
+def points_for(width):
+    width = width or DEFAULT_WIDTH
+    return int(min(max(width, MIN_POINTS), MAX_POINTS))
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: the rows of y to keep, shape (n_out, series).
+
+    x is the shared 1-D axis and y a (rows, series) matrix; every series is thinned on its own,
+    all of them in the same pass over the buckets. NaNs are never picked over a real value.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float).reshape(len(x), -1)
+    n, series = y.shape
+    columns = np.arange(series)
+    if n <= n_out or n_out < 3:
+        return np.repeat(np.arange(n)[:, None], series, axis=1)
+
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    # bucket j covers rows edges[j]:edges[j + 1], the last one only the final row; their averages
+    # don't depend on which points get picked, so they are all computed up front
+    valid = ~np.isnan(y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_x = np.add.reduceat(x, edges) / np.diff(np.append(edges, n))
+        avg_y = np.add.reduceat(np.where(valid, y, 0), edges, axis=0) / np.add.reduceat(valid, edges, axis=0)
+
+    selected = np.empty((n_out, series), dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = np.zeros(series, dtype=int)
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a, columns]
+        # twice the area of the triangle (previous pick, candidate, next bucket's average)
+        area = np.abs((ax - avg_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi, None]) * (avg_y[i + 1] - ay))
+        area[np.isnan(area)] = -1.0
+        a = lo + area.argmax(axis=0)
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,130 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+# one bounded pool per process for all symbol downloads; they are network-bound
+POOL_WORKERS = int(os.environ.get("PRICE_DOWNLOAD_WORKERS", 8))
+TIMEOUT = 8.0  # seconds one attempt at one symbol may run before it is retried
+RETRIES = 2  # further attempts after a failed or timed out one
+BACKOFF = 0.5  # seconds before the first retry, doubled for each one after it
+BUDGET = 12.0  # seconds a whole fetch_many may take; whatever is done by then is returned
+
+
+class Attempt:
+    def __init__(self, key, number):
+        self.key = key
+        self.number = number
+        self.started = None  # set once a pool thread picks it up, queueing doesn't count
+        self.timed_out = False
+
+
+class FetchExecutor:
+    """Runs fn(key) for many keys on a shared thread pool with timeouts, retries and a deadline.
+
+    fetch_many returns ({key: result}, {key: reason}) for the keys that succeeded and those that
+    didn't. A timed out attempt can't be cancelled, so it keeps running and its result is still
+    used if it arrives before the key is given up on; otherwise it just warms the cache.
+    """
+
+    def __init__(self, workers=POOL_WORKERS, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, budget=BUDGET, clock=time.monotonic):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+        self.clock = clock
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "errors": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _submit(self, fn, key, number):
+        attempt = Attempt(key, number)
+
+        def run():
+            attempt.started = self.clock()
+            return fn(key)
+
+        # in the caller's context, so what is measured on the pool counts towards its callback
+        return self.pool.submit(contextvars.copy_context().run, run), attempt
+
+    def fetch_many(self, keys, fn, budget=None):
+        keys = list(dict.fromkeys(keys))
+        deadline = self.clock() + (self.budget if budget is None else budget)
+        results, reasons = {}, {}
+        running = {}  # future -> attempt, timed out ones included
+        retry_at = {}  # key -> when its next attempt may start
+        attempts = dict.fromkeys(keys, 0)
+
+        for key in keys:
+            future, attempt = self._submit(fn, key, 1)
+            running[future] = attempt
+            attempts[key] = 1
+        self._count("calls", len(keys))
+
+        def retry_or_give_up(key, reason):
+            reasons[key] = reason
+            if attempts[key] <= self.retries:
+                retry_at[key] = self.clock() + self.backoff * 2 ** (attempts[key] - 1)
+
+        def open_keys():
+            live = {attempt.key for attempt in running.values() if not attempt.timed_out}
+            return [key for key in keys if key not in results and (key in live or key in retry_at)]
+
+        while open_keys():
+            now = self.clock()
+            if now >= deadline:
+                break
+
+            for key, when in list(retry_at.items()):
+                if when <= now:
+                    del retry_at[key]
+                    attempts[key] += 1
+                    self._count("retries")
+                    future, attempt = self._submit(fn, key, attempts[key])
+                    running[future] = attempt
+
+            # sleep until something finishes, a running attempt times out or a retry is due
+            wake = [deadline, *retry_at.values()]
+            for attempt in running.values():
+                if not attempt.timed_out:
+                    wake.append(attempt.started + self.timeout if attempt.started else now + 0.05)
+            if not running:  # only retries waiting out their backoff
+                time.sleep(max(0, min(wake) - now))
+                continue
+            done, _ = wait(list(running), timeout=max(0, min(wake) - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                attempt = running.pop(future)
+                if attempt.key in results:
+                    continue
+                error = future.exception()
+                if error is None:
+                    results[attempt.key] = future.result()
+                    reasons.pop(attempt.key, None)
+                    retry_at.pop(attempt.key, None)
+                elif not attempt.timed_out:  # a timed out attempt has already been retried
+                    self._count("errors")
+                    retry_or_give_up(attempt.key, f"{type(error).__name__}: {error}")
+
+            now = self.clock()
+            for attempt in running.values():
+                if not attempt.timed_out and attempt.started and now - attempt.started >= self.timeout:
+                    attempt.timed_out = True
+                    self._count("timeouts")
+                    if attempt.key not in results:
+                        retry_or_give_up(attempt.key, f"timed out after {self.timeout:g}s")
+
+        failed = {key: reasons.get(key, "over the fetch budget") for key in keys if key not in results}
+        self._count("failed", len(failed))
+        return results, failed
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return FetchExecutor()
@@ -0,0 +1,218 @@
+import numpy as np  # version 1.24.2
+import plotly.io as pio
+from plotly import colors  # plotly.express.colors without importing plotly.express
+
+# Figures as plain dicts, laid out the way plotly.express would build them, so callbacks skip px's
+# DataFrame introspection and the graph_objects validation. Dash serializes them with orjson when
+# it is installed (plotly's "auto" JSON engine).
+
+# built once; every figure refers to the same template dict
+DARK_TEMPLATE = pio.templates["plotly_dark"].to_plotly_json()
+MARGIN = {"t": 20, "l": 20, "r": 20, "b": 20}
+LINE_COLORS = colors.qualitative.Dark24
+PIE_COLORS = colors.sequential.Jet
+BAND_COLOR = "rgba(99, 110, 250, 0.2)"
+OVERLAY_COLORS = colors.qualitative.Pastel
+
+
+def axis(anchor, title, **extra):
+    return {"anchor": anchor, "domain": [0.0, 1.0], "title": {"text": title} if title else {}, **extra}
+
+
+# daily bars go out as "2023-04-21" rather than with a midnight time on every point
+def dates_for_json(values):
+    values = np.asarray(values, dtype="datetime64[ns]")
+    if (values.astype("datetime64[D]") == values).all():
+        return np.datetime_as_string(values, unit="D")
+    return np.datetime_as_string(values, unit="s")
+
+
+# one WebGL line per series, like px.line(long_df, x=..., y="value", color="variable")
+def line_figure(xs, ys, names, legend=True, x_title="Date", y_suffix="%"):
+    data = []
+    for i, (x, y, name) in enumerate(zip(xs, ys, names)):
+        if np.issubdtype(np.asarray(x).dtype, np.datetime64):
+            x = dates_for_json(x)
+        data.append(
+            {
+                "type": "scattergl",
+                "x": x,
+                "y": y,
+                "mode": "lines",
+                "name": name if legend else "",
+                "legendgroup": name if legend else "",
+                "showlegend": legend,
+                "line": {"color": LINE_COLORS[i % len(LINE_COLORS)], "dash": "solid"},
+                "marker": {"symbol": "circle"},
+                "xaxis": "x",
+                "yaxis": "y",
+                "hovertemplate": (f"variable={name}<br>" if legend else "") + f"{x_title}=%{{x}}<br>value=%{{y}}<extra></extra>",
+            }
+        )
+    layout = {
+        "template": DARK_TEMPLATE,
+        "xaxis": axis("y", x_title),
+        "yaxis": axis("x", None, ticksuffix=y_suffix),
+        "legend": {"title": {"text": "variable"}, "tracegroupgap": 0} if legend else {"tracegroupgap": 0},
+        "margin": MARGIN,
+    }
+    return {"data": data, "layout": layout}
+
+
+# a dotted line over a chart, shown or hidden in the browser by the key in its meta; on "y2" it
+# is measured on overlay_axis
+def overlay_trace(x, y, name, key, visible, color, yaxis="y"):
+    if np.issubdtype(np.asarray(x).dtype, np.datetime64):
+        x = dates_for_json(x)
+    return {
+        "type": "scattergl",
+        "x": x,
+        "y": y,
+        "mode": "lines",
+        "name": name,
+        "meta": key,
+        "visible": visible,
+        "showlegend": True,
+        "line": {"color": color, "dash": "dot", "width": 1.5},
+        "yaxis": yaxis,
+        "hovertemplate": f"{name}=%{{y:.2f}}<extra></extra>",
+    }
+
+
+# the fall from a high to the lowest point after it, as two points on a line; its size is in the name
+def drawdown_trace(x, y, name, key, visible, color):
+    trace = overlay_trace(x, y, name, key, visible, color)
+    trace["mode"] = "lines+markers"
+    trace["line"] = {"color": color, "width": 2}
+    trace["hovertemplate"] = f"{name}<br>%{{x}}: %{{y:.2f}}%<extra></extra>"
+    return trace
+
+
+# a second y axis on the right for overlays that aren't in the lines' terms, shown only while one is
+def overlay_axis(title, visible):
+    return axis("x", title, overlaying="y", side="right", ticksuffix="%", showgrid=False, zeroline=False, visible=visible)
+
+
+# px.pie(values=..., names=..., labels={"names": label_name, "values": value_name})
+def pie_figure(labels, values, label_name, value_name, hole=0.3, height=400):
+    trace = {
+        "type": "pie",
+        "labels": labels,
+        "values": values,
+        "hole": hole,
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "hovertemplate": f"{label_name}=%{{label}}<br>{value_name}=%{{value}}<extra></extra>",
+        "legendgroup": "",
+        "name": "",
+        "showlegend": True,
+    }
+    layout = {
+        "template": DARK_TEMPLATE,
+        "legend": {"tracegroupgap": 0},
+        "margin": MARGIN,
+        "piecolorway": PIE_COLORS,
+        "height": height,
+    }
+    return {"data": [trace], "layout": layout}
+
+
+# the goal page's projection: the chosen rate with markers and a shaded band for the others.
+# assets/clientside.js builds the same dict in the browser
+def projection_figure(x, result, low, high, title, band_name):
+    data = [
+        {
+            "type": "scatter",
+            "x": x,
+            "y": result,
+            "mode": "lines+markers",
+            "name": "",
+            "showlegend": False,
+            "line": {"color": "#636efa", "dash": "solid"},
+            "marker": {"symbol": "circle"},
+            "hovertemplate": "x=%{x}<br>y=%{y}<extra></extra>",
+        },
+        {"type": "scatter", "x": x, "y": high, "mode": "lines", "line": {"width": 0}, "showlegend": False, "hoverinfo": "skip"},
+        {
+            "type": "scatter",
+            "x": x,
+            "y": low,
+            "mode": "lines",
+            "line": {"width": 0},
+            "fill": "tonexty",
+            "fillcolor": BAND_COLOR,
+            "name": band_name,
+        },
+    ]
+    return {"data": data, "layout": years_layout(title)}
+
+
+# Monte Carlo fan: P10-P90 band, the median path and a dashed line at the target
+def fan_figure(x, p10, p50, p90, target, title):
+    data = [
+        {"type": "scatter", "x": x, "y": p90, "mode": "lines", "line": {"width": 0}, "showlegend": False, "hoverinfo": "skip"},
+        {
+            "type": "scatter",
+            "x": x,
+            "y": p10,
+            "mode": "lines",
+            "line": {"width": 0},
+            "fill": "tonexty",
+            "fillcolor": BAND_COLOR,
+            "name": "P10 - P90",
+        },
+        {"type": "scatter", "x": x, "y": p50, "mode": "lines+markers", "name": "Median"},
+    ]
+    layout = years_layout(title)
+    layout["shapes"] = [
+        {
+            "type": "line",
+            "xref": "x domain",
+            "x0": 0,
+            "x1": 1,
+            "yref": "y",
+            "y0": target,
+            "y1": target,
+            "line": {"dash": "dash", "color": "gray"},
+        }
+    ]
+    return {"data": data, "layout": layout}
+
+
+# portfolio value of each backtested allocation over the dates, with the money paid in dashed
+def backtest_figure(dates, values, deposited, names, title):
+    x = dates_for_json(dates)
+    data = [
+        {
+            "type": "scattergl",
+            "x": x,
+            "y": y,
+            "mode": "lines",
+            "name": name,
+            "line": {"color": LINE_COLORS[i % len(LINE_COLORS)]},
+            "hovertemplate": f"{name}<br>%{{x}}<br>$%{{y:,.0f}}<extra></extra>",
+        }
+        for i, (y, name) in enumerate(zip(values, names))
+    ]
+    data.append(
+        {
+            "type": "scattergl",
+            "x": x,
+            "y": deposited,
+            "mode": "lines",
+            "name": "Paid in",
+            "line": {"color": "gray", "dash": "dash"},
+            "hovertemplate": "Paid in<br>%{x}<br>$%{y:,.0f}<extra></extra>",
+        }
+    )
+    layout = years_layout(title)
+    layout["xaxis"] = {"title": {"text": "Date"}}
+    return {"data": data, "layout": layout}
+
+
+def years_layout(title):
+    return {
+        "template": DARK_TEMPLATE,
+        "title": {"text": title},
+        "xaxis": {"title": {"text": "Years"}},
+        "yaxis": {"title": {"text": "USD"}},
+    }
@@ -0,0 +1,208 @@
+import base64
+import uuid
+
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+from pandas.api.types import union_categoricals
+
+# the columns of the portfolio grid and how each one is kept
+COLUMNS = (
+    "id", "region", "market", "balance_dollar", "balance_prct", "ticker", "quantity", "investment", "account",
+    "platform", "owner",
+)
+CATEGORIES = ("region", "market", "account", "platform", "owner")  # a few labels repeated, stored as codes
+NUMBERS = ("balance_dollar", "balance_prct", "quantity")  # float64, NaN when empty; the rest are strings
+
+
+# a cell as the grid or a file has it: a one-element list is unwrapped, nothing becomes ""
+def clean_text(value):
+    if isinstance(value, (list, tuple)):
+        value = value[0] if len(value) == 1 else ""
+    if not isinstance(value, str) and pd.isna(value):
+        return ""
+    return str(value).strip()
+
+
+def clean_texts(values):
+    if pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):  # the usual case, done in one go
+        return values.fillna("").str.strip().to_numpy(dtype=object)
+    return values.map(clean_text).to_numpy(dtype=object)
+
+
+def clean_number(value):
+    if isinstance(value, (list, tuple)):
+        value = value[0] if len(value) == 1 else None
+    if isinstance(value, str):
+        value = value.strip().replace(",", "")
+    return value
+
+
+def pack(values):
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode("ascii")
+
+
+def unpack(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+def as_json_numbers(values):
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+class Holdings:
+    """A portfolio as one typed column per grid field.
+
+    Rows are checked and converted once, when they come in from the grid, a file or an older
+    session; callbacks then work on whole columns, and only the grid gets a list of dicts back.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    @classmethod
+    def from_frame(cls, df):
+        columns = {}
+        for name in COLUMNS:
+            values = df[name] if name in df else pd.Series([None] * len(df), index=df.index, dtype=object)
+            if name in NUMBERS:
+                numbers = values if values.dtype.kind in "if" else values.map(clean_number)
+                columns[name] = pd.to_numeric(numbers, errors="coerce").astype("float64").to_numpy()
+            else:
+                text = clean_texts(values)
+                if name == "ticker":
+                    text = np.array([ticker.upper() for ticker in text], dtype=object)
+                columns[name] = pd.Categorical(text) if name in CATEGORIES else text
+
+        missing = columns["id"] == ""
+        if missing.any():
+            columns["id"][missing] = [uuid.uuid4().hex for _ in range(int(missing.sum()))]
+        return cls(pd.DataFrame(columns, columns=list(COLUMNS))).checked()
+
+    # holdings read in parts, e.g. a file a chunk at a time
+    @classmethod
+    def concat(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls.from_records([])
+        frame = pd.concat([part.frame for part in parts], ignore_index=True)
+        for name in CATEGORIES:
+            frame[name] = union_categoricals([part.frame[name] for part in parts], ignore_order=True)
+        return cls(frame).checked()
+
+    def checked(self):
+        duplicated = self.frame["id"].duplicated()
+        if duplicated.any():
+            raise ValueError(f"Holding ids must be unique, {self.frame['id'][duplicated].iloc[0]!r} is repeated")
+        return self
+
+    @classmethod
+    def from_records(cls, rows):
+        return cls.from_frame(pd.DataFrame.from_records(list(rows), columns=list(COLUMNS)))
+
+    # the form kept in the session store: numbers and label codes as the bytes of their arrays, so
+    # a session with many holdings is decoded and saved without a Python object per cell
+    @classmethod
+    def from_json(cls, data):
+        columns = {"id": np.array(data["id"], dtype=object)}
+        for name in COLUMNS[1:]:
+            if name in NUMBERS:
+                columns[name] = unpack(data[name], "float64")
+                continue
+            codes = unpack(data[name]["codes"], "int32")
+            if name in CATEGORIES:
+                columns[name] = pd.Categorical.from_codes(codes, data[name]["labels"])
+            else:
+                columns[name] = np.array(data[name]["labels"], dtype=object)[codes]
+        return cls(pd.DataFrame(columns, columns=list(COLUMNS)))
+
+    def to_json(self):
+        data = {"id": self.frame["id"].tolist()}
+        for name in COLUMNS[1:]:
+            values = self.frame[name]
+            if name in NUMBERS:
+                data[name] = pack(values.to_numpy())
+                continue
+            if name in CATEGORIES:
+                codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+            else:
+                codes, labels = pd.factorize(values)
+            data[name] = {"labels": labels.tolist(), "codes": pack(codes.astype("int32"))}
+        return data
+
+    # rowData for the grid, with None for empty numbers
+    def to_records(self):
+        columns = [
+            as_json_numbers(self.frame[name].to_numpy()) if name in NUMBERS else self.frame[name].tolist()
+            for name in COLUMNS
+        ]
+        return [dict(zip(COLUMNS, values)) for values in zip(*columns)]
+
+    def __len__(self):
+        return len(self.frame)
+
+    def column(self, name):
+        return self.frame[name].to_numpy()
+
+    def position(self, holding_id):
+        found = np.flatnonzero(self.frame["id"].to_numpy() == holding_id)
+        return int(found[0]) if len(found) else None
+
+    def row(self, position):
+        return Holdings(self.frame.iloc[[position]]).to_records()[0]
+
+    def rows(self, holding_ids):
+        return Holdings(self.frame[self.frame["id"].isin(holding_ids)]).to_records()
+
+    def tickers(self):
+        return [ticker for ticker in pd.unique(self.frame["ticker"]) if ticker]
+
+    def total_percentage(self):
+        return float(np.nansum(self.frame["balance_prct"].to_numpy()))
+
+    # "Balance %" summed per ticker, over the holdings that have both
+    def allocation(self):
+        tickers, prct = self.column("ticker"), self.column("balance_prct")
+        kept = (tickers != "") & ~np.isnan(prct)
+        return pd.Series(prct[kept], index=tickers[kept], dtype=float).groupby(level=0, sort=False).sum()
+
+    # "Balance $" of every holding recalculated from its "Balance %"
+    def with_total(self, total_investment):
+        frame = self.frame.copy()
+        frame["balance_dollar"] = frame["balance_prct"] * total_investment / 100
+        return Holdings(frame)
+
+    def with_balances(self, dollar, prct):
+        frame = self.frame.copy()
+        frame["balance_dollar"] = np.asarray(dollar, dtype="float64")
+        frame["balance_prct"] = np.asarray(prct, dtype="float64")
+        return Holdings(frame)
+
+    # one holding replaced by a row as the grid sends it
+    def replace(self, position, row):
+        new = Holdings.from_records([row]).frame
+        frame = self.frame.copy()
+        for name in CATEGORIES:
+            label = new[name].iloc[0]
+            if label not in frame[name].cat.categories:
+                frame[name] = frame[name].cat.add_categories([label])
+        for name in COLUMNS:
+            frame.iat[position, frame.columns.get_loc(name)] = new[name].iloc[0]
+        return Holdings(frame)
+
+    def append(self, other):
+        return Holdings.concat([self, other])
+
+    def drop(self, holding_ids):
+        return Holdings(self.frame[~self.frame["id"].isin(holding_ids)].reset_index(drop=True))
+
+    # "Balance %" summed per group of each column, in the {column: {group: [sum, rows]}} form of
+    # aggregates.py, for the whole table at once
+    def group_sums(self, columns):
+        weights = np.nan_to_num(self.frame["balance_prct"].to_numpy())
+        groups = {}
+        for name in columns:
+            codes, labels = pd.factorize(self.frame[name])
+            sums = np.bincount(codes, weights=weights, minlength=len(labels))
+            counts = np.bincount(codes, minlength=len(labels))
+            groups[name] = {str(label): [float(total), int(count)] for label, total, count in zip(labels, sums, counts)}
+        return groups
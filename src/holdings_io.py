@@ -0,0 +1,203 @@
+import base64
+import binascii
+import io
+import os
+
+import pandas as pd  # version 1.5.3
+
+from holdings import COLUMNS, Holdings
+
+# portfolio files in and out. An upload is parsed a chunk of rows at a time, and each chunk becomes
+# typed columns straight away, so a large broker export never sits in memory as a table of Python
+# objects; an export is written, and sent, a chunk at a time
+CHUNK_ROWS = int(os.environ.get("HOLDINGS_CHUNK_ROWS", 50000))
+MAX_UPLOAD_BYTES = int(os.environ.get("HOLDINGS_MAX_UPLOAD_BYTES", 256 * 1024 * 1024))
+READ_BYTES = 1024 * 1024  # base64 text decoded per read while parsing a CSV upload
+
+FORMATS = {
+    ".csv": "csv", ".txt": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow",
+}
+MIMETYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"}
+
+
+def arrow():
+    try:
+        import pyarrow  # version 11.0.0
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as error:
+        raise RuntimeError("Parquet and Arrow files need the pyarrow package") from error
+    return pyarrow
+
+
+def file_format(filename):
+    fmt = FORMATS.get(os.path.splitext(filename or "")[1].lower())
+    if fmt is None:
+        raise ValueError(f"{filename} isn't a CSV, Parquet or Arrow file")
+    return fmt
+
+
+# the holdings field each of a file's columns holds: grid fields, or their header names
+def field_names(columns, headers):
+    aliases = {name.lower(): name for name in COLUMNS}
+    aliases.update({header.lower(): field for header, field in headers.items()})
+    names = {column: aliases.get(str(column).strip().lower()) for column in columns}
+    found = {column: name for column, name in names.items() if name}
+    if not found:
+        raise ValueError(f"No portfolio columns found; expected some of {', '.join(headers)}")
+    return found
+
+
+class Base64Reader(io.RawIOBase):
+    """The bytes of a base64 text, decoded a block at a time as they are read."""
+
+    def __init__(self, text, start=0):
+        self.text = text
+        self.position = start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        block = self.text[self.position:self.position + max(4, len(buffer) // 3 * 4)]
+        self.position += len(block)
+        data = base64.b64decode(block)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def csv_chunks(contents, start, headers):
+    stream = io.BufferedReader(Base64Reader(contents, start), READ_BYTES)
+    with pd.read_csv(stream, chunksize=CHUNK_ROWS, encoding="utf-8-sig", skipinitialspace=True) as reader:
+        for chunk in reader:
+            yield chunk.rename(columns=field_names(chunk.columns, headers))
+
+
+# Parquet and Arrow files keep their index at the end, so they are decoded whole; being
+# compressed and typed, they are a fraction of the size of the same holdings as CSV
+def parquet_chunks(contents, start, headers):
+    pa = arrow()
+    data = pa.BufferReader(base64.b64decode(contents[start:]))
+    parquet = pa.parquet.ParquetFile(data)
+    names = field_names(parquet.schema_arrow.names, headers)
+    for batch in parquet.iter_batches(batch_size=CHUNK_ROWS, columns=list(names)):
+        yield batch.to_pandas().rename(columns=names)
+
+
+def arrow_chunks(contents, start, headers):
+    pa = arrow()
+    data = pa.BufferReader(base64.b64decode(contents[start:]))
+    try:
+        reader = pa.ipc.open_file(data)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:  # the streaming format has no footer
+        data.seek(0)
+        batches = pa.ipc.open_stream(data)
+    names = None
+    for batch in batches:
+        names = names or field_names(batch.schema.names, headers)
+        for offset in range(0, batch.num_rows, CHUNK_ROWS):
+            part = batch.slice(offset, CHUNK_ROWS)
+            yield part.to_pandas()[list(names)].rename(columns=names)
+
+
+READERS = {"csv": csv_chunks, "parquet": parquet_chunks, "arrow": arrow_chunks}
+
+
+# the holdings in a dcc.Upload's contents ("data:<type>;base64,<data>"), checked like any other
+# holdings; a file that can't be read raises ValueError with what is wrong with it
+def read_upload(contents, filename, headers):
+    fmt = file_format(filename)
+    start = contents.find(",") + 1
+    if not start:
+        raise ValueError(f"{filename} was not uploaded as a data URL")
+    unreadable = (binascii.Error, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError)
+    if fmt != "csv":
+        unreadable += (arrow().ArrowException,)
+    try:
+        holdings = Holdings.concat(Holdings.from_frame(chunk) for chunk in READERS[fmt](contents, start, headers))
+    except unreadable as error:
+        raise ValueError(f"{filename} couldn't be read as {fmt.upper()}: {error}") from error
+    if not len(holdings):
+        raise ValueError(f"{filename} has no holdings")
+    return holdings
+
+
+class Chunks:
+    """A write-only file that hands over what has been written to it since it was last asked."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def slices(holdings):
+    for start in range(0, max(len(holdings), 1), CHUNK_ROWS):
+        yield holdings.frame.iloc[start:start + CHUNK_ROWS]
+
+
+# the holdings as a file of the given format, in pieces to be sent as they are made
+def export(holdings, fmt):
+    if fmt == "csv":
+        for i, frame in enumerate(slices(holdings)):
+            yield frame.to_csv(index=False, header=i == 0)
+        return
+
+    pa = arrow()
+    sink = Chunks()
+    writer = None
+    for frame in slices(holdings):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pa.parquet.ParquetWriter(sink, table.schema) if fmt == "parquet" else pa.ipc.new_file(sink, table.schema)
+        writer.write_table(table)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+# GET <path>.csv|.parquet|.arrow?session=<id> downloads the session's holdings; holdings_for(id)
+# reads them the way the page does, or returns None for a session that isn't stored (a 404)
+def register(app, path, holdings_for):
+    import flask
+
+    @app.server.route(f"{app.config.routes_pathname_prefix}{path}.<fmt>")
+    def export_holdings(fmt):
+        session_id = flask.request.args.get("session", "")
+        if fmt not in MIMETYPES or not session_id:
+            flask.abort(404)
+        if fmt != "csv":
+            try:
+                arrow()
+            except RuntimeError as error:
+                flask.abort(501, description=str(error))
+        holdings = holdings_for(session_id)
+        if holdings is None:
+            flask.abort(404)
+        chunks = export(holdings, fmt)
+        return flask.Response(
+            flask.stream_with_context(chunks),
+            mimetype=MIMETYPES[fmt],
+            headers={"Content-Disposition": f"attachment; filename=portfolio.{fmt}"},
+        )
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+
+from holdings import COLUMNS, NUMBERS, Holdings
+from singleflight import SingleFlight
+
+# the portfolio grid asks for its rows a block at a time (AG Grid's infinite row model), with the
+# sort and filter it shows. Each version of a session's holdings is indexed once per worker: text
+# columns as sorted label codes, so a filter is tested against the few labels rather than every
+# row, and each column sorted once, so a filter on a sorted view only picks from that order. The
+# last few filtered and sorted orders are kept, so scrolling only slices them
+MAX_SESSIONS = int(os.environ.get("HOLDINGS_QUERY_SESSIONS", 32))  # indexed holdings kept per worker
+MAX_ORDERS = 8  # filtered and sorted orders kept per session
+
+TEXT_TESTS = {
+    "contains": lambda labels, text: labels.str.contains(text, regex=False),
+    "notContains": lambda labels, text: ~labels.str.contains(text, regex=False),
+    "equals": lambda labels, text: labels == text,
+    "notEqual": lambda labels, text: labels != text,
+    "startsWith": lambda labels, text: labels.str.startswith(text),
+    "endsWith": lambda labels, text: labels.str.endswith(text),
+    "blank": lambda labels, text: labels == "",
+    "notBlank": lambda labels, text: labels != "",
+}
+NUMBER_TESTS = {
+    "equals": lambda values, number, number_to: values == number,
+    "notEqual": lambda values, number, number_to: values != number,
+    "lessThan": lambda values, number, number_to: values < number,
+    "lessThanOrEqual": lambda values, number, number_to: values <= number,
+    "greaterThan": lambda values, number, number_to: values > number,
+    "greaterThanOrEqual": lambda values, number, number_to: values >= number,
+    "inRange": lambda values, number, number_to: (values > number) & (values < number_to),
+    "blank": lambda values, number, number_to: np.isnan(values),
+    "notBlank": lambda values, number, number_to: ~np.isnan(values),
+}
+
+
+class HoldingsIndex:
+    """One version of a session's holdings, with the orders the grid has asked for."""
+
+    def __init__(self, holdings):
+        self.holdings = holdings
+        self.codes = {}
+        self.sorted = {}
+        self.orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    # a text column as codes into its labels in sorted order, worked out the first time it is used.
+    # The labels themselves are sorted: a categorical column's own order is the order they came in
+    def encoded(self, name):
+        if name not in self.codes:
+            codes, labels = pd.factorize(self.holdings.frame[name].astype(object), sort=True)
+            self.codes[name] = codes, pd.Series(labels, dtype=object)
+        return self.codes[name]
+
+    def matches(self, name, condition):
+        kind = condition.get("type")
+        if name in NUMBERS:
+            if kind not in NUMBER_TESTS:
+                raise ValueError(f"Unknown number filter {kind!r}")
+            values = self.holdings.column(name)
+            with np.errstate(invalid="ignore"):
+                return NUMBER_TESTS[kind](values, to_float(condition.get("filter")), to_float(condition.get("filterTo")))
+        if kind not in TEXT_TESTS:
+            raise ValueError(f"Unknown text filter {kind!r}")
+        codes, labels = self.encoded(name)
+        text = str(condition.get("filter") or "").lower()
+        hits = TEXT_TESTS[kind](labels.str.lower(), text).to_numpy(dtype=bool)
+        return hits[codes]
+
+    # the grid's filter model, {column: condition or {"operator", "condition1", "condition2"}}
+    def mask(self, filter_model):
+        mask = np.ones(len(self.holdings), dtype=bool)
+        for name, model in (filter_model or {}).items():
+            if name not in COLUMNS:
+                continue
+            conditions = model.get("conditions") or [model[key] for key in ("condition1", "condition2") if key in model]
+            if not conditions:
+                mask &= self.matches(name, model)
+                continue
+            found = [self.matches(name, condition) for condition in conditions]
+            mask &= np.logical_or.reduce(found) if model.get("operator") == "OR" else np.logical_and.reduce(found)
+        return mask
+
+    # a column's values as a sort key; empty values sort first, as in the grid
+    def sort_key(self, name, descending):
+        if name in NUMBERS:
+            key = np.nan_to_num(self.holdings.column(name), nan=-np.inf)
+        else:
+            key = self.encoded(name)[0]
+        return -key if descending else key
+
+    # positions of all holdings sorted by one column, worked out the first time it is used
+    def sorted_by(self, name, descending):
+        if (name, descending) not in self.sorted:
+            self.sorted[name, descending] = np.argsort(self.sort_key(name, descending), kind="stable")
+        return self.sorted[name, descending]
+
+    def sorted_positions(self, sort_model, mask):
+        columns = [(column.get("colId"), column.get("sort") == "desc") for column in sort_model or []]
+        columns = [(name, descending) for name, descending in columns if name in COLUMNS]
+        if not columns:
+            return np.flatnonzero(mask)
+        if len(columns) == 1:
+            positions = self.sorted_by(*columns[0])
+            return positions[mask[positions]]
+        positions = np.flatnonzero(mask)
+        keys = [self.sort_key(name, descending)[positions] for name, descending in reversed(columns)]
+        return positions[np.lexsort(keys)]
+
+    # positions of the matching holdings in the order asked for
+    def order(self, sort_model, filter_model):
+        key = json.dumps([sort_model or [], filter_model or {}], sort_keys=True)
+        with self._lock:
+            if key in self.orders:
+                self.orders.move_to_end(key)
+                return self.orders[key]
+            positions = self.sorted_positions(sort_model, self.mask(filter_model))
+            self.orders[key] = positions
+            while len(self.orders) > MAX_ORDERS:
+                self.orders.popitem(last=False)
+            return positions
+
+    # rows start to end of the ordered holdings, as rowData, and how many holdings match in all
+    def page(self, start, end, sort_model=None, filter_model=None):
+        positions = self.order(sort_model, filter_model)
+        rows = Holdings(self.holdings.frame.iloc[positions[start:end]]).to_records()
+        return rows, len(positions)
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class HoldingsQueries:
+    """The latest indexed version of each recently used session's holdings, in this worker."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._builds = SingleFlight()
+        self.stats = {"hits": 0, "builds": 0}
+
+    # the index of the holdings at `version`; load() returns (version, holdings) as stored now
+    def index(self, session_id, version, load):
+        with self._lock:
+            found = self._indexes.get(session_id)
+            if found is not None and found[0] == version:
+                self._indexes.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return found[1]
+        return self._builds.do((session_id, version), self.build, session_id, load)
+
+    def build(self, session_id, load):
+        version, holdings = load()
+        index = HoldingsIndex(holdings)
+        with self._lock:
+            self.stats["builds"] += 1
+            self._indexes[session_id] = version, index
+            self._indexes.move_to_end(session_id)
+            while len(self._indexes) > self.max_sessions:
+                self._indexes.popitem(last=False)
+        return index
+
+
+@lru_cache(maxsize=None)
+def get_holdings_queries():
+    return HoldingsQueries()
@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+# "memory", "sqlite" or a redis:// URL; sqlite lets every gunicorn worker see the same sessions
+BACKEND = os.environ.get("HOLDINGS_STORE", "sqlite")
+STORE_PATH = os.environ.get(
+    "HOLDINGS_STORE_PATH", os.path.join(os.path.dirname(__file__), ".cache", "holdings.sqlite")
+)
+MAX_SESSIONS = int(os.environ.get("HOLDINGS_MAX_SESSIONS", 1000))
+SESSION_TTL = int(os.environ.get("HOLDINGS_SESSION_TTL", 7 * 24 * 3600))  # seconds since last use
+
+# small summaries kept under their own keys so callbacks that need only them skip decoding the rows;
+# "version" changes whenever the holdings do, so cached views of them know when they are stale.
+# Backends keep a session's parts and the rest of its state ("state") together and drop them
+# together, so a part can't outlive the holdings it summarizes
+PARTS = ("groups", "version")
+MAIN = "state"
+
+
+# process-local, least recently used session is dropped first
+class MemoryBackend:
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._items = OrderedDict()  # session -> {part: value}
+        self._lock = threading.RLock()
+
+    def load(self, key, part=MAIN):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key].get(part)
+
+    # values is {part: value}; the parts not in it are kept
+    def save(self, key, values):
+        with self._lock:
+            self._items.setdefault(key, {}).update(values)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    @contextmanager
+    def transaction(self, key):
+        with self._lock:
+            yield
+
+
+# one row per session and part in a SQLite file shared by all workers on the host; the rows of a
+# session are touched together, so they expire and are evicted together
+class SQLiteBackend:
+    def __init__(self, path=STORE_PATH, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, clock=time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS session_parts"
+                " (key TEXT NOT NULL, part TEXT NOT NULL, value TEXT NOT NULL, touched REAL NOT NULL, PRIMARY KEY (key, part))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS session_parts_touched ON session_parts (touched)")
+
+    # one connection per thread; the transaction() lock makes read-modify-write atomic across workers
+    @contextmanager
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        yield db
+
+    def load(self, key, part=MAIN):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM session_parts WHERE key = ? AND part = ? AND touched >= ?",
+                (key, part, self.clock() - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE session_parts SET touched = ? WHERE key = ?", (self.clock(), key))
+            return row[0]
+
+    def save(self, key, values):
+        now = self.clock()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO session_parts VALUES (?, ?, ?, ?)",
+                [(key, part, value, now) for part, value in values.items()],
+            )
+            db.execute("UPDATE session_parts SET touched = ? WHERE key = ?", (now, key))
+            db.execute("DELETE FROM session_parts WHERE touched < ?", (now - self.ttl,))
+            db.execute(
+                "DELETE FROM session_parts WHERE key IN"
+                " (SELECT key FROM session_parts GROUP BY key ORDER BY MAX(touched) DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, key):
+        with self._connect() as db:
+            db.execute("DELETE FROM session_parts WHERE key = ?", (key,))
+
+    @contextmanager
+    def transaction(self, key):
+        with self._connect() as db:
+            if db.in_transaction:  # already inside an outer transaction on this thread
+                yield
+                return
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+
+# Redis (or anything speaking its protocol) for workers on several hosts: one hash per session, so
+# expiry (or Redis's own eviction) drops its parts together
+class RedisBackend:
+    def __init__(self, url, ttl=SESSION_TTL, prefix="holdings:"):
+        try:
+            import redis
+        except ImportError as error:
+            raise RuntimeError("HOLDINGS_STORE is a redis:// URL but the redis package is not installed") from error
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def load(self, key, part=MAIN):
+        value = self.client.hget(self.prefix + key, part)
+        if value is None:
+            return None
+        self.client.expire(self.prefix + key, self.ttl)
+        return value.decode()
+
+    def save(self, key, values):
+        with self.client.pipeline() as pipe:
+            pipe.hset(self.prefix + key, mapping=values)
+            pipe.expire(self.prefix + key, self.ttl)
+            pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    @contextmanager
+    def transaction(self, key):
+        with self.client.lock(self.prefix + key + ":lock", timeout=10, blocking_timeout=10):
+            yield
+
+
+def make_backend(spec=BACKEND):
+    if spec == "memory":
+        return MemoryBackend()
+    if spec == "sqlite":
+        return SQLiteBackend()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    raise ValueError(f"Unknown holdings store: {spec}")
+
+
+# values that aren't plain JSON, like holdings.Holdings, are stored as what their to_json() returns
+def encode(value):
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# the portfolio of each browser session, as {"holdings": ..., "total": ..., "groups": ...}, stored as JSON
+class HoldingsStore:
+    def __init__(self, backend=None):
+        self.backend = backend or make_backend()
+
+    def get(self, session_id):
+        value = self.backend.load(session_id)
+        if value is None:
+            return None
+        state = json.loads(value)
+        for part in PARTS:
+            value = self.backend.load(session_id, part)
+            if value is not None:  # a part the session was saved without is left for its user to rebuild
+                state[part] = json.loads(value)
+        return state
+
+    # {part: value} for the requested summaries, or None if any of them is missing (e.g. evicted)
+    def get_parts(self, session_id, *parts):
+        values = {}
+        for part in parts:
+            value = self.backend.load(session_id, part)
+            if value is None:
+                return None
+            values[part] = json.loads(value)
+        return values
+
+    def put(self, session_id, state):
+        values = {part: json.dumps(state[part], default=encode) for part in PARTS if part in state}
+        values[MAIN] = json.dumps({key: value for key, value in state.items() if key not in PARTS}, default=encode)
+        self.backend.save(session_id, values)
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    # apply fn to the stored state (or to default() for a new session) and save the result in one step
+    def update(self, session_id, fn, default=None):
+        with self.backend.transaction(session_id):
+            state = self.get(session_id)
+            if state is None:
+                state = default() if default else {}
+            state = fn(state)
+            self.put(session_id, state)
+            return state
+
+
+@lru_cache(maxsize=None)
+def get_holdings_store():
+    return HoldingsStore()
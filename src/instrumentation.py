@@ -0,0 +1,215 @@
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# per-callback measurements, served as Prometheus text on /metrics. Each process keeps its own:
+# a gunicorn worker reports the callbacks it ran, and what a background job measured is handed to
+# the worker that picks up the job's result (see jobs.py). Every series carries the worker's pid,
+# so the scrapes of different workers add up (sum without (worker)) instead of overwriting each other
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+PROFILING = os.environ.get("CALLBACK_PROFILING") == "1"  # lets /metrics/profile capture a call
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "profiles")
+)
+PROFILE_LINES = 40  # functions listed in a capture, by cumulative time
+
+METRICS = {
+    "dash_callback_calls_total": ("counter", "Calls of the callback"),
+    "dash_callback_errors_total": ("counter", "Calls that raised, PreventUpdate aside"),
+    "dash_callback_seconds": ("histogram", "Wall time of the callback"),
+    "dash_callback_upstream_seconds_total": ("counter", "Time spent waiting on an upstream source"),
+    "dash_callback_upstream_calls_total": ("counter", "Requests made to an upstream source"),
+    "dash_callback_cache_total": ("counter", "Cache lookups by outcome"),
+    "dash_callback_requests_total": ("counter", "HTTP requests for the callback, background job polls included"),
+    "dash_callback_request_bytes_total": ("counter", "Bytes of the serialized inputs received"),
+    "dash_callback_response_bytes_total": ("counter", "Bytes of the serialized outputs sent"),
+}
+
+# the callback whose work is being done; it follows the work onto the fetch pool's threads
+current_callback = contextvars.ContextVar("current_callback", default="none")
+
+
+class Metrics:
+    """Counters and histograms keyed by metric name and a tuple of (label, value) pairs."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}  # key -> [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self.counters), "histograms": {k: list(v) for k, v in self.histograms.items()}}
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in snapshot["histograms"].items():
+                histogram = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    # Prometheus text exposition format, version 0.0.4
+    def render(self, worker=None):
+        snapshot = self.snapshot()
+        extra = (("worker", str(worker if worker is not None else os.getpid())),)
+        snapshot = {
+            kind: {(metric, labels + extra): value for (metric, labels), value in series.items()}
+            for kind, series in snapshot.items()
+        }
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "counter":
+                for (metric, labels), value in sorted(snapshot["counters"].items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+                continue
+            for (metric, labels), values in sorted(snapshot["histograms"].items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(BUCKETS, values):
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                lines.append(f"{name}_sum{format_labels(labels)} {values[-2]:g}")
+                lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + "}"
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    return Metrics()
+
+
+# time a call to an upstream source (price history, live quotes) for the current callback
+@contextmanager
+def upstream(source):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        labels = {"callback": current_callback.get(), "source": source}
+        get_metrics().inc("dash_callback_upstream_seconds_total", labels, time.perf_counter() - started)
+        get_metrics().inc("dash_callback_upstream_calls_total", labels)
+
+
+def count_cache(cache, outcome):
+    get_metrics().inc("dash_callback_cache_total", {"callback": current_callback.get(), "cache": cache, "outcome": outcome})
+
+
+def profile_path(name):
+    return os.path.join(PROFILE_DIR, f"{name}.prof")
+
+
+# a capture is armed with a marker file, so whichever process runs the callback next (a worker or
+# a background job) takes it; removing the marker is atomic, so only one of them does
+def take_armed_profile(name):
+    if not PROFILING:
+        return None
+    try:
+        os.remove(profile_path(name) + ".armed")
+    except OSError:  # not armed
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+# wall time, calls and errors of a Dash callback. Goes below @callback, so Dash registers the
+# measured function
+def instrument(fn):
+    name = fn.__name__
+
+    # it keeps this module's name: a background job pickles the callback by value, and so it
+    # refers to this module's globals rather than copying them
+    @functools.wraps(fn, assigned=("__name__", "__qualname__", "__doc__"))
+    def measured(*args, **kwargs):
+        token = current_callback.set(name)
+        profiler = take_armed_profile(name)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as error:
+            from dash.exceptions import PreventUpdate
+
+            if not isinstance(error, PreventUpdate):
+                get_metrics().inc("dash_callback_errors_total", {"callback": name})
+            raise
+        finally:
+            get_metrics().observe("dash_callback_seconds", {"callback": name}, time.perf_counter() - started)
+            get_metrics().inc("dash_callback_calls_total", {"callback": name})
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile_path(name))
+            current_callback.reset(token)
+
+    return measured
+
+
+# /metrics, plus the bytes every callback request carries in and out. Those are counted on the
+# HTTP layer, where the payloads are already serialized
+def register(app):
+    import flask
+
+    server = app.server
+
+    @server.after_request
+    def count_payload(response):
+        if flask.request.path.endswith("/_dash-update-component"):
+            body = flask.request.get_json(silent=True) or {}
+            callback = app.callback_map.get(body.get("output"), {}).get("callback")
+            labels = {"callback": getattr(callback, "__name__", "unknown")}
+            get_metrics().inc("dash_callback_requests_total", labels)
+            get_metrics().inc("dash_callback_request_bytes_total", labels, flask.request.content_length or 0)
+            get_metrics().inc("dash_callback_response_bytes_total", labels, response.calculate_content_length() or 0)
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return flask.Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
+
+    if not PROFILING:
+        return
+
+    # POST arms a cProfile capture of the callback's next call; GET shows the last one
+    @server.route("/metrics/profile/<name>", methods=["GET", "POST"])
+    def profile(name):
+        if not name.isidentifier():
+            flask.abort(404)
+        if flask.request.method == "POST":
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            open(profile_path(name) + ".armed", "w").close()
+            return flask.Response(f"the next call of {name} will be profiled\n", mimetype="text/plain")
+        if not os.path.exists(profile_path(name)):
+            flask.abort(404)
+        out = io.StringIO()
+        pstats.Stats(profile_path(name), stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        return flask.Response(out.getvalue(), mimetype="text/plain")
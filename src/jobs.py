@@ -0,0 +1,80 @@
+import os
+import time
+from functools import lru_cache
+
+from dash import DiskcacheManager
+
+from instrumentation import get_metrics
+
+# callbacks that can take seconds (price downloads, Monte Carlo) run as Dash background
+# callbacks: each call in a process of its own, while the request that started it returns at
+# once and the browser polls for the result. A slow yahoo response then ties up neither a
+# gunicorn worker nor one of its threads. BACKGROUND_CALLBACKS=0 runs them in the request again
+BACKGROUND = os.environ.get("BACKGROUND_CALLBACKS", "1") == "1"
+CACHE_DIR = os.environ.get("JOB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs"))
+PRELOAD = os.environ.get("JOB_PRELOAD", "app")  # the module job processes start out with
+JOB_NICENESS = 10  # jobs yield the CPU to the web workers, whose requests are all short
+RESULT_TTL = 60  # seconds a finished job's output is reused for the same inputs, by any worker
+POLL_MS = 300  # how often the browser asks whether a job is done
+METRICS_QUEUE = "metrics"
+METRICS_TTL = 600  # seconds a job's measurements wait for a worker to collect them
+
+
+class JobManager(DiskcacheManager):
+    # every job lowers its own priority first, and leaves what it measured (see instrumentation.py)
+    # for whichever worker polls for a job next
+    def make_job_fn(self, fn, progress):
+        job_fn = super().make_job_fn(fn, progress)
+        cache = self.handle
+
+        def run_job(*args):
+            os.nice(JOB_NICENESS)
+            job_fn(*args)
+            cache.push(get_metrics().snapshot(), prefix=METRICS_QUEUE, expire=METRICS_TTL)
+
+        return run_job
+
+    def get_result(self, key, job):
+        while True:
+            _, snapshot = self.handle.pull(prefix=METRICS_QUEUE)
+            if snapshot is None:
+                break
+            get_metrics().merge(snapshot)
+        return super().get_result(key, job)
+
+    # a job that is done exits and is reaped by the fork server straight away, so it can be gone
+    # halfway through terminating it (which dash does after reading every result)
+    def terminate_job(self, job):
+        import psutil  # version 5.9.4
+
+        try:
+            super().terminate_job(job)
+        except psutil.NoSuchProcess:
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_manager():
+    try:
+        import diskcache  # version 5.4.0
+        import multiprocess  # version 0.70.14
+    except ImportError as error:
+        raise RuntimeError("BACKGROUND_CALLBACKS is on but diskcache or multiprocess is not installed") from error
+    # jobs are forked from a server process that imported the app and does nothing else, never
+    # from a web worker: one of its threads could hold a lock (sqlite's, say) at that moment, and
+    # the job's copy of it would never be released
+    multiprocess.set_start_method("forkserver", force=True)
+    multiprocess.set_forkserver_preload([PRELOAD])
+    # results are keyed on the inputs and the current RESULT_TTL window, so two browsers asking for
+    # the same prices at the same time each get them instead of the first one clearing them. A
+    # background callback's output must therefore follow from its inputs alone, not ctx.triggered_id
+    return JobManager(
+        diskcache.Cache(CACHE_DIR), cache_by=[lambda: int(time.time() // RESULT_TTL)], expire=2 * RESULT_TTL
+    )
+
+
+# the extra @callback arguments for a background callback, or none when they are turned off
+def background(running=None, cancel=None):
+    if not BACKGROUND:
+        return {}
+    return {"background": True, "manager": get_manager(), "running": running, "cancel": cancel, "interval": POLL_MS}
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from functools import lru_cache
+
+import numpy as np  # version 1.24.2
+import yfinance as yf  # version 0.2.12
+
+from datasources import OFFLINE
+from instrumentation import upstream
+from price_store import get_store
+
+logger = logging.getLogger(__name__)
+
+# one poller per process asks for the latest quote of every ticker someone is watching, however
+# many browsers that is; browsers only ever read what it has already collected
+POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", 5))
+WATCH_TTL = 30  # seconds a ticker is still polled after the last browser asked for it
+BUFFER = 2000  # quotes kept per ticker
+SOURCE = os.environ.get("LIVE_QUOTES", "simulated" if OFFLINE else "yahoo")
+
+
+class SimulatedQuotes:
+    """Local quote feed: a random walk per ticker from a starting price, one step per call."""
+
+    def __init__(self, start=lambda ticker: 100.0, volatility=0.001):
+        self.start = start
+        self.volatility = volatility
+        self.prices = {}
+        self.random = {}
+        self.calls = 0
+
+    def __call__(self, tickers):
+        self.calls += 1
+        quotes = {}
+        for ticker in tickers:
+            if ticker not in self.prices:
+                self.prices[ticker] = self.start(ticker)
+                self.random[ticker] = np.random.default_rng(zlib.crc32(ticker.encode()))
+            self.prices[ticker] *= np.exp(self.random[ticker].normal(0, self.volatility))
+            quotes[ticker] = float(self.prices[ticker])
+        return quotes
+
+
+# the last 1 minute bar's close of every ticker, in one request
+def yahoo_quotes(tickers):
+    frame = yf.download(tickers=list(tickers), period="1d", interval="1m", progress=False, threads=False, group_by="column")
+    closes = frame["Close"] if len(tickers) > 1 else frame[["Close"]].set_axis(list(tickers), axis=1)
+    return {ticker: float(closes[ticker].dropna().iloc[-1]) for ticker in tickers if closes[ticker].notna().any()}
+
+
+# the simulated feed carries on from the last stored close, so it continues the chart's line
+def last_close(ticker):
+    frame = get_store().get(ticker, "5d")
+    return float(frame["Close"].dropna().iloc[-1]) if frame["Close"].notna().any() else 100.0
+
+
+class LivePoller:
+    """Polls `source(tickers) -> {ticker: price}` on a background thread for the watched tickers.
+
+    The thread starts with the first watch() and keeps a short history of (time, price) per
+    ticker that since() reads from, so the number of upstream calls only depends on the interval.
+    """
+
+    def __init__(self, source, interval=POLL_SECONDS, watch_ttl=WATCH_TTL, clock=time.time):
+        self.source = source
+        self.interval = interval
+        self.watch_ttl = watch_ttl
+        self.clock = clock
+        self.watched = {}  # ticker -> last time a browser asked for it
+        self.quotes = {}  # ticker -> deque of (time, price)
+        self.stats = {"upstream_calls": 0, "errors": 0, "reads": 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, tickers):
+        now, new = self.clock(), False
+        with self._lock:
+            for ticker in tickers:
+                new = new or ticker not in self.watched
+                self.watched[ticker] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="live-poller", daemon=True)
+                self._thread.start()
+        if new:
+            self._wake.set()  # a new ticker gets its first quote now rather than next interval
+
+    def watching(self):
+        now = self.clock()
+        with self._lock:
+            for ticker, seen in list(self.watched.items()):
+                if now - seen > self.watch_ttl:
+                    del self.watched[ticker]
+            return sorted(self.watched)
+
+    def poll_once(self):
+        tickers = self.watching()
+        if not tickers:
+            return
+        self.stats["upstream_calls"] += 1
+        try:
+            with upstream("quotes"):
+                quotes = self.source(tickers)
+        except Exception:  # a failed poll is just a gap in the live line
+            self.stats["errors"] += 1
+            logger.warning("live quotes for %s failed", ",".join(tickers), exc_info=True)
+            return
+        now = self.clock()
+        with self._lock:
+            for ticker, price in quotes.items():
+                self.quotes.setdefault(ticker, deque(maxlen=BUFFER)).append((now, price))
+
+    # the quotes of ticker newer than `after` (a time from an earlier quote, or None for all)
+    def since(self, ticker, after=None):
+        with self._lock:
+            self.stats["reads"] += 1
+            return [quote for quote in self.quotes.get(ticker, ()) if after is None or quote[0] > after]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+@lru_cache(maxsize=None)
+def get_poller():
+    source = SimulatedQuotes(start=last_close) if SOURCE == "simulated" else yahoo_quotes
+    return LivePoller(source)
@@ -0,0 +1,44 @@
+import pandas as pd  # version 1.5.3
+
+from price_store import empty_frame, get_store
+from singleflight import SingleFlight
+
+# price history for the pages, shared by the explore chart and the portfolio valuation.
+# Concurrent requests for the same (tickers, period, interval) share one fetch; see fetches.stats
+fetches = SingleFlight()
+
+
+# function to get ticker data, served from the local price store and topped up from yahoo's API
+def get_stock_data(v_tickers, v_period, v_interval, v_group_by):
+    key = (tuple(v_tickers) if not isinstance(v_tickers, str) else v_tickers, v_period, v_interval, v_group_by)
+    # every caller gets its own copy, so one can't change the frame another is reading
+    return fetches.do(key, fetch_stock_data, v_tickers, v_period, v_interval, v_group_by).copy()
+
+
+def fetch_stock_data(v_tickers, v_period, v_interval, v_group_by):
+    store = get_store()
+    if isinstance(v_tickers, str):
+        return store.get(v_tickers, v_period, v_interval)
+
+    # same shape as yf.download for several tickers: (ticker, field) columns when grouped by ticker.
+    # Symbols that failed or timed out get empty columns and are listed in data.attrs["failed"];
+    # data.attrs["tz"] has each symbol's exchange time zone, where known
+    frames, failed = store.get_many(v_tickers, v_period, v_interval)
+    return combine(frames, failed, v_tickers, v_group_by)
+
+
+# the same frame from whatever is stored already, without downloading anything: for callbacks
+# that draw what a background job (see jobs.py) has just fetched
+def stored_stock_data(v_tickers, v_period, v_interval, v_group_by):
+    store = get_store()
+    frames = {ticker: store.read(ticker, v_period, v_interval) for ticker in v_tickers}
+    return combine({ticker: frame for ticker, frame in frames.items() if len(frame)}, {}, v_tickers, v_group_by)
+
+
+def combine(frames, failed, v_tickers, v_group_by):
+    data = pd.concat({ticker: frames.get(ticker, empty_frame()) for ticker in v_tickers}, axis=1)
+    if v_group_by != "ticker":
+        data = data.swaplevel(axis=1).sort_index(axis=1, level=0)
+    data.attrs["failed"] = failed
+    data.attrs["tz"] = {ticker: frame.attrs.get("tz") for ticker, frame in frames.items()}
+    return data
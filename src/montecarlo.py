@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from instrumentation import count_cache
+
+MAX_PATHS = 100_000  # hard cap whatever the page asks for
+TIME_BUDGET = 1.5  # seconds of simulation per request before we stop adding paths
+CHUNK = 5_000  # paths simulated per vectorized step, checked against the budget in between
+PERCENTILES = (10, 50, 90)
+MODELS = ("lognormal", "normal", "bootstrap")
+MAX_RESULTS = 64  # complete runs kept per process when diskcache isn't installed
+RESULTS_DIR = os.environ.get(
+    "SIMULATION_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "simulations")
+)
+RESULTS_BYTES = 64 * 2**20  # of complete runs kept on disk, least recently used dropped first
+
+# only runs that got through all their paths are kept: one cut short by the time budget while the
+# machine was busy would otherwise be served as the answer for good
+stats = {"hits": 0, "runs": 0}
+
+
+class LocalResults:
+    """The last few complete runs of this process, least recently used dropped first."""
+
+    def __init__(self, max_results=MAX_RESULTS):
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def set(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+
+# runs are simulated in background jobs, each a process of its own (see jobs.py), so they are kept
+# on disk where every job and worker finds them; opened on first use, never before a fork
+@lru_cache(maxsize=None)
+def get_results():
+    try:
+        import diskcache  # version 5.4.0
+    except ImportError:
+        return LocalResults()
+    return diskcache.Cache(RESULTS_DIR, size_limit=RESULTS_BYTES, eviction_policy="least-recently-used")
+
+
+def sample_returns(rng, model, size, mean, volatility, historical=()):
+    if model == "normal":
+        returns = rng.normal(mean, volatility, size)
+    elif model == "lognormal":
+        # parameters chosen so the yearly returns keep the requested arithmetic mean and volatility
+        sigma = np.sqrt(np.log(1 + volatility**2 / (1 + mean) ** 2))
+        returns = np.exp(rng.normal(np.log(1 + mean) - sigma**2 / 2, sigma, size)) - 1
+    elif model == "bootstrap":
+        if len(historical) == 0:
+            raise ValueError("The bootstrap model needs historical returns")
+        returns = rng.choice(np.asarray(historical, dtype=float), size=size)
+    else:
+        raise ValueError(f"Unknown return model: {model}")
+    return np.maximum(returns, -0.99)  # a normal draw can lose more than everything
+
+
+def simulate_paths(returns, initial, contributions):
+    """Balances at the end of years 0..Y for each row of yearly `returns`, shape (paths, Y + 1).
+
+    Contributions are paid at the start of each year, as in the deterministic projection.
+    """
+    growth = np.ones((returns.shape[0], returns.shape[1] + 1))
+    np.cumprod(1 + returns, axis=1, out=growth[:, 1:])
+    deposited = np.zeros_like(growth)
+    np.cumsum(contributions / growth[:, :-1], axis=1, out=deposited[:, 1:])
+    return growth * (initial + deposited)
+
+
+def simulate(
+    years,
+    initial,
+    annual,
+    mean,
+    volatility,
+    target,
+    n_paths=10_000,
+    model="lognormal",
+    historical=(),
+    contribution_growth=0.0,
+    inflation=0.0,
+    seed=0,
+    time_budget=TIME_BUDGET,
+):
+    """Percentile bands and the chance of ending at or above `target`, memoized on the inputs.
+
+    Paths are simulated in chunks until `n_paths` (at least 1, capped at MAX_PATHS) or `time_budget`
+    is reached, so one request can't pin a worker; `paths` in the result says how many were actually
+    run, and only a result with all of them is memoized.
+    """
+    n_paths = max(1, min(int(n_paths), MAX_PATHS))
+    key = (
+        years, initial, annual, mean, volatility, target, n_paths, model, tuple(historical), contribution_growth,
+        inflation, seed,
+    )
+    results = get_results()
+    result = results.get(key)
+    if result is not None:
+        stats["hits"] += 1
+        count_cache("simulation", "hit")
+        return result
+    stats["runs"] += 1
+    count_cache("simulation", "miss")
+
+    rng = np.random.default_rng(seed)
+    contributions = annual * (1 + contribution_growth) ** np.arange(years)
+    deflator = (1 + inflation) ** np.arange(years + 1)
+
+    started = time.perf_counter()
+    chunks, done = [], 0
+    while done < n_paths and (not chunks or time.perf_counter() - started < time_budget):
+        size = min(CHUNK, n_paths - done)
+        returns = sample_returns(rng, model, (size, years), mean, volatility, historical)
+        chunks.append(simulate_paths(returns, initial, contributions) / deflator)
+        done += size
+
+    balances = np.concatenate(chunks)
+    result = {
+        "percentiles": np.percentile(balances, PERCENTILES, axis=0),
+        "probability": float(np.mean(balances[:, -1] >= target)),
+        "paths": done,
+        "elapsed": time.perf_counter() - started,
+    }
+    if done == n_paths:
+        results.set(key, result)
+    return result
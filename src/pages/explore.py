@@ -1,195 +1,413 @@
-from dash import Dash, html, dcc, callback, Input, Output, no_update, ctx, register_page
+import logging
+
+from dash import Dash, html, dcc, callback, clientside_callback, ClientsideFunction, Input, Output, State, no_update, ctx, register_page
 import dash_bootstrap_components as dbc  #  version 1.4.0
+import numpy as np  # version 1.24.2
 import pandas as pd  # version 1.5.3
-import plotly.express as px
-import yfinance as yf  # version 0.2.12
+from plotly.io.json import to_json_plotly
+
+import downsample
+import figures
+from analytics import OVERLAYS, RIGHT_AXIS, get_analytics
+from instrumentation import instrument
+from jobs import background
+from live_feed import POLL_SECONDS, get_poller
+from market_data import get_stock_data, stored_stock_data
+from ticker_search import get_index
 
 register_page(__name__)
 
+logger = logging.getLogger(__name__)
 
-df_tickers = pd.read_csv("https://raw.githubusercontent.com/Coding-with-Adam/Dash-by-Plotly/master/Other/tickers_yahoo.csv")  # dataset of tickers and their names
-options = df_tickers["Ticker"]
+MAX_COMPARE = 100  # symbols drawn on one chart, the selected ticker included
+PRICE_FIELD = "Close"  # the live quotes are last prices, so the lines they continue are closes
 
 
-# function to get ticker data from yahoo's API
-def get_stock_data(v_tickers, v_period, v_interval, v_group_by):
-    return yf.download(
-        tickers=v_tickers, period=v_period, interval=v_interval, group_by=v_group_by
+# the dropdowns start with only their selected value; matches are served as the user types
+def layout():
+    return dbc.Container(
+        [
+            dbc.Tooltip(
+                "No data found, symbol may be delisted.",
+                id="alert-auto",
+                is_open=False,
+                target="ticker-select",
+                trigger=None,
+            ),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dcc.Dropdown(
+                                options=[{"label": "AAPL", "value": "AAPL"}],
+                                value="AAPL",
+                                clearable=False,
+                                searchable=True,
+                                persistence=True,
+                                className="mb-2",
+                                id="ticker-select",
+                            ),
+                        ],
+                        width=3,
+                        lg=2,
+                    ),
+                    dbc.Col(
+                        [
+                            html.Div(
+                                [
+                                    dbc.RadioItems(
+                                        id="time-line",
+                                        className="w-100 mb-2",
+                                        inputClassName="btn-check",
+                                        labelClassName="btn btn-outline-primary",
+                                        labelCheckedClassName="active",
+                                        persistence=True,
+                                        options=[
+                                            {"label": "5D",
+                                             "value": "5d"},
+                                            {"label": "1M",
+                                             "value": "1mo"},
+                                            {"label": "6M",
+                                             "value": "6mo"},
+                                            {"label": "1Y",
+                                             "value": "1y"},
+                                            {"label": "2Y",
+                                             "value": "2y"},
+                                            {"label": "5Y",
+                                             "value": "5y"},
+                                            {"label": "10Y",
+                                             "value": "10y"},
+                                        ],
+                                        value="5y",
+                                        inline=True
+                                    ),
+                                ],
+                                className="radio-group",
+                            )
+                        ],
+                        width=12,
+                        lg=6,
+                    ),
+                    dbc.Col(
+                        [
+                            dcc.Dropdown(
+                                options=[],
+                                placeholder="Compare",
+                                multi=True,
+                                searchable=True,
+                                persistence=True,
+                                id="comparison-input",
+                            ),
+                        ],
+                        width=3,
+                        lg=2,
+                    ),
+                ],
+                justify="between",
+                className="my-4",
+            ),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        dbc.Checklist(
+                            id="overlay-select",
+                            options=[{"label": label, "value": key} for key, label in OVERLAYS.items()],
+                            value=[],
+                            inline=True,
+                            switch=True,
+                            persistence=True,
+                        ),
+                    ),
+                    dbc.Col(dbc.Switch(id="live-mode", label="Live", value=False, persistence=True), width="auto"),
+                ],
+                className="mb-2",
+            ),
+            # shown while the chart's prices are being fetched
+            dbc.Progress(value=100, striped=True, animated=True, style={"height": "3px"}, class_name="d-none", id="chart-progress"),
+            dbc.Row(dcc.Graph(id="ticker-chart")),
+            dcc.Store(id="chart-prices"),  # what the last fetch was for; the bars are in the price store
+            dcc.Store(id="chart-width"),  # pixels, reported by the browser to size the downsampling
+            dcc.Interval(id="live-interval", interval=POLL_SECONDS * 1000, disabled=True),
+            dcc.Store(id="live-cursor"),  # the chart's tickers, their base prices and the last quote drawn
+        ], fluid=True
     )
 
+def as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
 
-layout = dbc.Container(
-    [
-        dbc.Tooltip(
-            "No data found, symbol may be delisted.",
-            id="alert-auto",
-            is_open=False,
-            target="ticker-select",
-            trigger=None,
-        ),
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        dcc.Dropdown(
-                            options=options,
-                            value="AAPL",
-                            clearable=False,
-                            searchable=True,
-                            persistence=True,
-                            className="mb-2",
-                            id="ticker-select",
-                        ),
-                    ],
-                    width=3,
-                    lg=2,
-                ),
-                dbc.Col(
-                    [
-                        html.Div(
-                            [
-                                dbc.RadioItems(
-                                    id="time-line",
-                                    className="w-100 mb-2",
-                                    inputClassName="btn-check",
-                                    labelClassName="btn btn-outline-primary",
-                                    labelCheckedClassName="active",
-                                    persistence=True,
-                                    options=[
-                                        {"label": "5D",
-                                         "value": "5d"},
-                                        {"label": "1M",
-                                         "value": "1mo"},
-                                        {"label": "6M",
-                                         "value": "6mo"},
-                                        {"label": "1Y",
-                                         "value": "1y"},
-                                        {"label": "2Y",
-                                         "value": "2y"},
-                                        {"label": "5Y",
-                                         "value": "5y"},
-                                        {"label": "10Y",
-                                         "value": "10y"},
-                                    ],
-                                    value="5y",
-                                    inline=True
-                                ),
-                            ],
-                            className="radio-group",
-                        )
-                    ],
-                    width=12,
-                    lg=6,
-                ),
-                dbc.Col(
-                    [
-                        dcc.Dropdown(
-                            options=options[options != "AAPL"],
-                            placeholder="Compare",
-                            searchable=True,
-                            persistence=True,
-                            id="comparison-input",
-                        ),
-                    ],
-                    width=3,
-                    lg=2,
-                ),
-            ],
-            justify="between",
-            className="my-4",
-        ),
-        dbc.Row(dcc.Graph(id="ticker-chart")),
-    ], fluid=True
+
+# only the top matches for what has been typed are sent to a dropdown, always keeping its own
+# selection and never offering the value already selected in the other dropdown
+def search_options(search_value, value, other_value):
+    index = get_index()
+    selected = as_list(value)
+    if not search_value:
+        return index.options_for(selected)
+    matches = index.options(search_value, exclude=selected + as_list(other_value))
+    return index.options_for(selected) + matches
+
+
+@callback(
+    Output("ticker-select", "options"),
+    Input("ticker-select", "search_value"),
+    Input("ticker-select", "value"),
+    State("comparison-input", "value"),
 )
+@instrument
+def search_ticker(search_value, ticker_value, compare_value):
+    return search_options(search_value, ticker_value, compare_value)
+
 
-# selected value from dropdown x would be removed from dropdown y options' list
 @callback(
     Output("comparison-input", "options"),
-    Output("ticker-select", "options"),
+    Input("comparison-input", "search_value"),
+    Input("comparison-input", "value"),
+    State("ticker-select", "value"),
+)
+@instrument
+def search_comparison(search_value, compare_value, ticker_value):
+    return search_options(search_value, compare_value, ticker_value)
+
+
+# % change of every column of a (dates x tickers) price matrix since the first date on which all of
+# them have a price, so a newer listing doesn't stretch the others; rows before that are dropped
+def rebase(prices):
+    start = (~np.isnan(prices)).argmax(axis=0).max()
+    return start, (prices[start:] / first_prices(prices, start) - 1) * 100
+
+
+# a column may have a gap on the common start date (different exchange holidays), so each one is
+# rebased on its own first price from there on
+def first_prices(prices, start):
+    first = start + (~np.isnan(prices[start:])).argmax(axis=0)
+    return prices[first, np.arange(prices.shape[1])]
+
+
+def missing_message(missing, failed):
+    reasons = [f"{ticker} ({failed.get(ticker, 'symbol may be delisted')})" for ticker in missing]
+    return "No data found for " + ", ".join(reasons) + "."
+
+
+# the (start, end) dates of a zoom, None when the chart is reset to the whole period, or False
+# for relayout events that don't change the x range
+def zoom_window(relayout_data):
+    relayout_data = relayout_data or {}
+    if relayout_data.get("xaxis.autorange"):
+        return None
+    if "xaxis.range[0]" in relayout_data:
+        return pd.Timestamp(relayout_data["xaxis.range[0]"]), pd.Timestamp(relayout_data["xaxis.range[1]"])
+    if "xaxis.range" in relayout_data:
+        return tuple(pd.Timestamp(value) for value in relayout_data["xaxis.range"])
+    return False
+
+
+# the rows of each column of matrix thinned to about one point per pixel, so columns can keep
+# different dates. Inside a zoom window they are thinned again over the window alone, which draws
+# it at full resolution where the width allows, while panning or zooming out still finds the
+# coarser line around it
+def thinned_rows(times, matrix, points, window=None):
+    rows = downsample.lttb(times.asi8, matrix, points)
+    columns = [rows[:, i] for i in range(matrix.shape[1])]
+    inside = np.flatnonzero((times >= window[0]) & (times <= window[1])) if window else []
+    if len(inside) == 0:
+        return columns
+    detail = inside[downsample.lttb(times.asi8[inside], matrix[inside], points)]
+    return [
+        np.concatenate([column[column < inside[0]], detail[:, i], column[column > inside[-1]]])
+        for i, column in enumerate(columns)
+    ]
+
+
+def line_figure(dates, deltas, names, points, legend, window=None):
+    rows = thinned_rows(dates, deltas, points, window)
+    xs = [dates.values[column] for column in rows]
+    ys = [deltas[column, i] for i, column in enumerate(rows)]
+    return figures.line_figure(xs, ys, names, legend)
+
+
+# the selected ticker's derived series as hidden lines: the averages in the same % as its own line
+# (rebased on the same first price), the rolling return and volatility on an axis of their own, and
+# the period's largest drawdown marked on the line from its high to its low. Toggling them never
+# reaches the server
+def overlay_traces(ticker, prices, period, window, points, shown):
+    derived = get_analytics().get(ticker, "1d", prices, field=PRICE_FIELD)
+    if derived is None:
+        return []
+    series = derived.window(period[0], period[-1])
+    times, base = series["times"], series["price"][0]
+    keys = [key for key in OVERLAYS if key != "drawdown"]
+    values = {key: series[key] for key in keys}
+    values["sma"] = (values["sma"] / base - 1) * 100
+    values["ema"] = (values["ema"] / base - 1) * 100
+
+    matrix = np.column_stack(list(values.values()))
+    rows = thinned_rows(times, matrix, points, window)
+    traces = [
+        figures.overlay_trace(
+            times.values[rows[i]], matrix[rows[i], i], f"{ticker} {OVERLAYS[key]}", key, key in shown,
+            figures.OVERLAY_COLORS[i], "y2" if key in RIGHT_AXIS else "y",
+        )
+        for i, key in enumerate(keys)
+    ]
+    drawdown = series["drawdown"]
+    ends = [drawdown["peak"], drawdown["trough"]]
+    traces.append(
+        figures.drawdown_trace(
+            times.values[ends], (series["price"][ends] / base - 1) * 100,
+            f"{ticker} {OVERLAYS['drawdown']} {drawdown['percent']:.1f}%", "drawdown", "drawdown" in shown,
+            figures.OVERLAY_COLORS[len(keys)],
+        )
+    )
+    return traces
+
+
+# the width of the chart, measured once it is on the page
+clientside_callback(
+    ClientsideFunction(namespace="explore", function_name="chart_width"),
+    Output("chart-width", "data"),
+    Input("ticker-chart", "id"),
+)
+
+
+# bring the chart's symbols up to date in the price store. Only this part runs as a background
+# job (see jobs.py), so a slow download doesn't hold up anyone else's requests; leaving the page
+# cancels it, and so does changing an input, which starts the next one. Its result depends on
+# nothing but these inputs, so a finished job can be handed to any browser asking for the same
+@callback(
+    Output("chart-prices", "data"),
     Input("ticker-select", "value"),
     Input("comparison-input", "value"),
-    prevent_initial_call=True,
+    Input("time-line", "value"),
+    **background(
+        running=[(Output("chart-progress", "class_name"), "mb-1", "d-none")],
+        cancel=[Input("_pages_location", "pathname")],
+    ),
 )
-def remove_options(ticker_value, compare_value):
-    if ctx.triggered_id == "ticker-select":
-        new_options = options[options != ticker_value]
-        return new_options, no_update
-    elif ctx.triggered_id == "comparison-input":
-        new_options = options[options != compare_value]
-        return no_update, new_options
+@instrument
+def fetch_prices(ticker_value, compare_value, time_value):
+    tickers = list(dict.fromkeys([ticker_value] + as_list(compare_value)))[:MAX_COMPARE]
+    data = get_stock_data(tickers, time_value, "1d", "column")
+    return {"tickers": tickers, "period": time_value, "compare": bool(as_list(compare_value)), "failed": data.attrs["failed"]}
 
 
-# create the line chart
+# create the line chart from whichever symbols could be fetched; the tooltip names the others.
+# A zoom redraws the visible window at full resolution where the width allows. The selected
+# ticker's overlays always come along, hidden unless switched on. It reads the bars fetch_prices
+# stored and runs in the web worker, where the overlays' memo (see analytics.py) lasts
 @callback(
     Output("ticker-chart", "figure"),
     Output("alert-auto", "is_open"),
     Output("alert-auto", "target"),
-    Input("ticker-select", "value"),
-    Input("comparison-input", "value"),
-    Input("time-line", "value"),
+    Output("alert-auto", "children"),
+    Output("live-cursor", "data"),
+    Input("chart-prices", "data"),
+    Input("chart-width", "data"),
+    Input("ticker-chart", "relayoutData"),
+    State("overlay-select", "value"),
+)
+@instrument
+def create_graph(request, chart_width, relayout_data, overlays):
+    window = zoom_window(relayout_data) if ctx.triggered_id == "ticker-chart" else None
+    if not request or window is False:
+        return no_update, no_update, no_update, no_update, no_update
+
+    tickers, time_value = request["tickers"], request["period"]
+    ticker_value = tickers[0]
+
+    # one read for all symbols, then only the closes as a single matrix
+    data = stored_stock_data(tickers, time_value, "1d", "column")
+    data.attrs["failed"] = request["failed"]
+    prices = data[PRICE_FIELD].reindex(columns=tickers).to_numpy(dtype=float)
+
+    empty = np.isnan(prices).all(axis=0)
+    missing = [ticker for ticker, none in zip(tickers, empty) if none]
+    target = "ticker-select" if empty[0] else "comparison-input"
+    if empty.all():
+        return no_update, True, target, missing_message(missing, data.attrs.get("failed", {})), None
+
+    tickers = [ticker for ticker, none in zip(tickers, empty) if not none]
+    start, deltas = rebase(prices[:, ~empty])  # always against the start of the whole period
+    cursor = {
+        "tickers": tickers,
+        "bases": first_prices(prices[:, ~empty], start).tolist(),
+        "timezones": [data.attrs.get("tz", {}).get(ticker) for ticker in tickers],
+        "since": {},
+    }
+    dates = data.index[start:]
+    names = [f"delta_{ticker}" for ticker in tickers]
+    legend = request["compare"]
+    points = downsample.points_for(chart_width)
+    fig = line_figure(dates, deltas, names, points, legend, window)
+    if window:
+        fig["layout"]["xaxis"]["range"] = [str(window[0]), str(window[1])]
+
+    if logger.isEnabledFor(logging.INFO):
+        full = line_figure(dates, deltas, names, len(dates), legend)
+        logger.info(
+            "ticker-chart %s x %d bars: %d -> %d points, %d -> %d bytes",
+            ",".join(tickers), len(dates), deltas.size, sum(len(trace["x"]) for trace in fig["data"]),
+            len(to_json_plotly(full)), len(to_json_plotly(fig)),
+        )
+
+    if not empty[0]:
+        fig["data"] += overlay_traces(ticker_value, data[PRICE_FIELD][ticker_value], dates, window, points, overlays or [])
+        right = [OVERLAYS[key] for key in RIGHT_AXIS]
+        fig["layout"]["yaxis2"] = figures.overlay_axis(" / ".join(right), any(key in RIGHT_AXIS for key in overlays or []))
+    if missing:
+        return fig, True, target, missing_message(missing, data.attrs.get("failed", {})), cursor
+    return fig, False, no_update, no_update, cursor
+
+
+# show or hide the overlays already in the figure, without a round trip
+clientside_callback(
+    ClientsideFunction(namespace="explore", function_name="toggle_overlays"),
+    Output("ticker-chart", "figure", allow_duplicate=True),
+    Input("overlay-select", "value"),
+    State("ticker-chart", "figure"),
+    prevent_initial_call=True,
+)
+
+
+# the live switch only starts and stops the interval
+clientside_callback(
+    ClientsideFunction(namespace="explore", function_name="live_paused"),
+    Output("live-interval", "disabled"),
+    Input("live-mode", "value"),
+)
+
+
+# the quotes that arrived since the last tick, appended to the chart's lines in the same % terms
+# and, like the stored bars, at the exchange's wall time. Every browser reads from the one poller
+# of this process, which only polls what is being watched
+@callback(
+    Output("ticker-chart", "extendData"),
+    Output("live-cursor", "data", allow_duplicate=True),
+    Input("live-interval", "n_intervals"),
+    State("live-cursor", "data"),
+    prevent_initial_call=True,
 )
-def create_graph(ticker_value, compare_value, time_value):
-    # if only the first dropdown has a value selected
-    if compare_value is None or len(compare_value) == 0:
-        df1 = get_stock_data(ticker_value, time_value, "1d", "ticker")
-        if df1.empty:
-            return no_update, True, "ticker-select"
-        else:
-            # calculate change in value over time
-            df1[f"delta_{ticker_value}"] = (df1["Open"] / df1["Open"].iloc[0] - 1) * 100
-            fig = px.line(
-                df1,
-                x=df1.index,
-                y=f"delta_{ticker_value}",
-                color_discrete_sequence=px.colors.qualitative.Dark24,
-                template="plotly_dark",
-            )
-            fig.update_layout(
-                margin=dict(l=20, r=20, t=20, b=20),
-                yaxis_title=None,
-                yaxis_ticksuffix="%",
-            )
-    # both dropdowns have values selected
-    else:
-        data = get_stock_data([ticker_value, compare_value], time_value, "1d", "ticker")
-        # convert multilevel dataframe to single level
-        single_lvl_data = {
-            idx: gp.xs(idx, level=1, axis=1)
-            for idx, gp in data.groupby(level=1, axis=1)
-        }
-        new_df = single_lvl_data["Open"]
-
-        if new_df[compare_value].isna().all():  # if column is empty
-            return no_update, True, "comparison-input"
-
-        elif new_df[ticker_value].isna().all():  # if column is empty
-            return no_update, True, "ticker-select"
-
-        else:
-            # ensure both stock tickers start from the same date in case one is newer than the other
-            first_valid_date = new_df.loc[:, new_df.isna().any()].first_valid_index()
-            df1 = new_df.loc[first_valid_date:, :].copy()
-
-            # calculate change in value over time
-            df1[f"delta_{ticker_value}"] = (
-                df1[ticker_value] / df1[ticker_value].iloc[0] - 1
-            ) * 100
-            df1[f"delta_{compare_value}"] = (
-                df1[compare_value] / df1[compare_value].iloc[0] - 1
-            ) * 100
-
-            fig = px.line(
-                df1,
-                x=df1.index,
-                y=[f"delta_{ticker_value}", f"delta_{compare_value}"],
-                color_discrete_sequence=px.colors.qualitative.Dark24,
-                template="plotly_dark",
-            )
-            fig.update_layout(
-                margin=dict(l=20, r=20, t=20, b=20),
-                yaxis_title=None,
-                yaxis_ticksuffix="%",
-            )
-
-    return fig, False, no_update
+@instrument
+def extend_live(n_intervals, cursor):
+    if not cursor:
+        return no_update, no_update
+    poller = get_poller()
+    poller.watch(cursor["tickers"])
 
+    since, xs, ys, traces = dict(cursor["since"]), [], [], []
+    timezones = cursor.get("timezones") or [None] * len(cursor["tickers"])
+    for trace, (ticker, base, tz) in enumerate(zip(cursor["tickers"], cursor["bases"], timezones)):
+        quotes = poller.since(ticker, since.get(ticker))
+        if quotes:
+            times, quoted = zip(*quotes)
+            stamps = pd.to_datetime(times, unit="s")
+            if tz:
+                stamps = stamps.tz_localize("UTC").tz_convert(tz).tz_localize(None)
+            xs.append(figures.dates_for_json(stamps).tolist())
+            ys.append(((np.array(quoted) / base - 1) * 100).tolist())
+            traces.append(trace)
+            since[ticker] = times[-1]
+    if not traces:
+        return no_update, no_update
+    return [{"x": xs, "y": ys}, traces], {**cursor, "since": since}
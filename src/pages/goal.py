@@ -1,9 +1,18 @@
-from dash import Dash, html, dcc, callback, Input, Output, no_update, register_page
+from dash import Dash, html, dcc, callback, clientside_callback, ClientsideFunction, Input, Output, State, no_update, register_page
 import dash_bootstrap_components as dbc  #  version 1.4.0
+import numpy as np  # version 1.24.2
 import pandas as pd  # version 1.5.3
-import plotly.express as px
 from numerize import numerize
 
+import figures
+from backtest import BARS, PERIODS, REBALANCE_BARS, backtest, load_prices, summary
+from holdings import Holdings
+from holdings_store import get_holdings_store
+from instrumentation import instrument
+from jobs import background
+from montecarlo import MAX_PATHS, simulate
+from projection import project_grid
+
 register_page(__name__)
 
 input_style = {
@@ -12,134 +21,464 @@ input_style = {
     "width": 150,
 }
 
+SENSITIVITY = 2  # +/- percentage points shown as a band around the chosen interest rate
+
 
-def comound_interest(t, initial, annual, interest_rate):
-    return (
-        initial * (1 + interest_rate) ** t
-        + annual * (1 + interest_rate) * ((1 + interest_rate) ** t - 1) / interest_rate
+# a function rather than a Container: a background job pickles its callback by value (see
+# instrumentation.py), and with it this module's globals, which a component can't be
+def layout():
+    return dbc.Container(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardBody(
+                                        [
+                                            dbc.Label(
+                                                "Years to Retire",
+                                                size="sm",
+                                                class_name="mb-1",  # margin bottom
+                                            ),
+                                            dbc.Input(
+                                                id="years-to-retire",
+                                                value="25",
+                                                type="text",
+                                                persistence=True,
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.Label(
+                                                "Initial Investment",
+                                                size="sm",
+                                                class_name="mb-1",
+                                            ),
+                                            dbc.Input(
+                                                id="initial-invest",
+                                                value="100000",
+                                                type="text",
+                                                persistence=True,
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.Label(
+                                                "Annual Contribution",
+                                                class_name="mb-1",
+                                                size="sm",
+                                                width="auto",
+                                            ),
+                                            dbc.Input(
+                                                id="annual-contribute",
+                                                value="5000",
+                                                persistence=True,
+                                                type="text",
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.Label(
+                                                "Annual Interest Rates",
+                                                className="mb-1",
+                                                size="sm",
+                                            ),
+                                            dbc.Input(
+                                                id="annual-interest",
+                                                value="9",
+                                                type="text",
+                                                persistence=True,
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.Label(
+                                                "Contribution Growth %",
+                                                className="mb-1",
+                                                size="sm",
+                                            ),
+                                            dbc.Input(
+                                                id="contribution-growth",
+                                                value="0",
+                                                type="text",
+                                                persistence=True,
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.Label(
+                                                "Inflation %",
+                                                className="mb-1",
+                                                size="sm",
+                                            ),
+                                            dbc.Input(
+                                                id="inflation",
+                                                value="0",
+                                                type="text",
+                                                persistence=True,
+                                                class_name="mb-3",
+                                                style=input_style,
+                                            ),
+                                            dbc.RadioItems(
+                                                id="compounding",
+                                                options=[
+                                                    {"label": "Yearly", "value": 1},
+                                                    {"label": "Monthly", "value": 12},
+                                                ],
+                                                value=1,
+                                                persistence=True,
+                                                inline=True,
+                                                class_name="mb-3",
+                                            ),
+                                            dbc.RadioItems(
+                                                id="goal-mode",
+                                                options=[
+                                                    {"label": "Projection", "value": "projection"},
+                                                    {"label": "Monte Carlo", "value": "simulation"},
+                                                    {"label": "Backtest", "value": "backtest"},
+                                                ],
+                                                value="projection",
+                                                persistence=True,
+                                                inline=True,
+                                            ),
+                                            dbc.Collapse(
+                                                [
+                                                    dbc.Label(
+                                                        "Volatility %",
+                                                        className="mb-1 mt-3",
+                                                        size="sm",
+                                                    ),
+                                                    dbc.Input(
+                                                        id="volatility",
+                                                        value="15",
+                                                        type="text",
+                                                        persistence=True,
+                                                        class_name="mb-3",
+                                                        style=input_style,
+                                                    ),
+                                                    dbc.Label(
+                                                        "Target",
+                                                        className="mb-1",
+                                                        size="sm",
+                                                    ),
+                                                    dbc.Input(
+                                                        id="goal-target",
+                                                        value="1000000",
+                                                        type="text",
+                                                        persistence=True,
+                                                        class_name="mb-3",
+                                                        style=input_style,
+                                                    ),
+                                                    dbc.Label(
+                                                        "Simulations",
+                                                        className="mb-1",
+                                                        size="sm",
+                                                    ),
+                                                    dbc.Input(
+                                                        id="simulations",
+                                                        value="10000",
+                                                        type="text",
+                                                        persistence=True,
+                                                        style=input_style,
+                                                    ),
+                                                ],
+                                                id="simulation-settings",
+                                                is_open=False,
+                                            ),
+                                            dbc.Collapse(
+                                                [
+                                                    dbc.Label(
+                                                        "History",
+                                                        className="mb-1 mt-3",
+                                                        size="sm",
+                                                    ),
+                                                    dbc.RadioItems(
+                                                        id="backtest-period",
+                                                        options=[{"label": period, "value": period} for period in PERIODS],
+                                                        value="5y",
+                                                        persistence=True,
+                                                        inline=True,
+                                                        class_name="mb-3",
+                                                    ),
+                                                    dbc.Label(
+                                                        "Rebalance",
+                                                        className="mb-1",
+                                                        size="sm",
+                                                    ),
+                                                    dbc.RadioItems(
+                                                        id="rebalance",
+                                                        options=[
+                                                            {"label": schedule.capitalize(), "value": schedule}
+                                                            for schedule in REBALANCE_BARS
+                                                        ],
+                                                        value="yearly",
+                                                        persistence=True,
+                                                        inline=True,
+                                                    ),
+                                                ],
+                                                id="backtest-settings",
+                                                is_open=False,
+                                            ),
+                                        ],
+                                        style={"padding": 45},
+                                    ),
+                                ],
+                                style={"margin-top": 25},
+                            )
+                        ],
+                        xs=12,
+                        sm=12,
+                        md=12,
+                        lg=3,  # if screen is large or X-large, use only 3 columns to display control panel
+                    ),
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardBody(
+                                        [
+                                            # shown while a Monte Carlo run or a backtest is in progress
+                                            dbc.Progress(
+                                                value=100, striped=True, animated=True, style={"height": "3px"},
+                                                class_name="d-none", id="simulation-progress",
+                                            ),
+                                            dcc.Graph(id="goal-chart"),
+                                        ]
+                                    )
+                                ]
+                            )
+                        ],
+                        xs=12,
+                        sm=12,
+                        md=12,
+                        lg=9,
+                    ),
+                ], className="py-4",
+            ),
+            dcc.Store(id="simulation-request"),
+            dcc.Store(id="backtest-request"),
+            dcc.Store(id="backtest-job"),  # the request with the allocation it is for
+            # sent once per page load so the browser can build projection figures itself
+            dcc.Store(id="goal-template", data=figures.DARK_TEMPLATE),
+        ], fluid=True
     )
 
 
-layout = dbc.Container(
-    [
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardBody(
-                                    [
-                                        dbc.Label(
-                                            "Years to Retire",
-                                            size="sm",
-                                            class_name="mb-1",  # margin bottom
-                                        ),
-                                        dbc.Input(
-                                            id="years-to-retire",
-                                            value="25",
-                                            type="text",
-                                            persistence=True,
-                                            class_name="mb-3",
-                                            style=input_style,
-                                        ),
-                                        dbc.Label(
-                                            "Initial Investment",
-                                            size="sm",
-                                            class_name="mb-1",
-                                        ),
-                                        dbc.Input(
-                                            id="initial-invest",
-                                            value="100000",
-                                            type="text",
-                                            persistence=True,
-                                            class_name="mb-3",
-                                            style=input_style,
-                                        ),
-                                        dbc.Label(
-                                            "Annual Contribution",
-                                            class_name="mb-1",
-                                            size="sm",
-                                            width="auto",
-                                        ),
-                                        dbc.Input(
-                                            id="annual-contribute",
-                                            value="5000",
-                                            persistence=True,
-                                            type="text",
-                                            class_name="mb-3",
-                                            style=input_style,
-                                        ),
-                                        dbc.Label(
-                                            "Annual Interest Rates",
-                                            className="mb-1",
-                                            size="sm",
-                                        ),
-                                        dbc.Input(
-                                            id="annual-interest",
-                                            value="9",
-                                            type="text",
-                                            persistence=True,
-                                            style=input_style,
-                                        ),
-                                    ],
-                                    style={"padding": 45},
-                                ),
-                            ],
-                            style={"margin-top": 25},
-                        )
-                    ],
-                    xs=12,
-                    sm=12,
-                    md=12,
-                    lg=3,  # if screen is large or X-large, use only 3 columns to display control panel
-                ),
-                dbc.Col(
-                    [dbc.Card([dbc.CardBody([html.Div(id="goal-chart")])])],
-                    xs=12,
-                    sm=12,
-                    md=12,
-                    lg=9,
-                ),
-            ], className="py-4",
-        ),
-    ], fluid=True
+# show the Monte Carlo settings only in that mode
+@callback(
+    Output("simulation-settings", "is_open"),
+    Input("goal-mode", "value"),
 )
+@instrument
+def toggle_simulation_settings(mode):
+    return mode == "simulation"
+
 
 @callback(
-    Output("goal-chart", "children"),
+    Output("backtest-settings", "is_open"),
+    Input("goal-mode", "value"),
+)
+@instrument
+def toggle_backtest_settings(mode):
+    return mode == "backtest"
+
+
+# the projection runs in the browser (assets/clientside.js); update_goal below is the reference
+# implementation it mirrors, and tests/test_clientside.py checks that both agree
+clientside_callback(
+    ClientsideFunction(namespace="goal", function_name="update_goal"),
+    Output("goal-chart", "figure"),
+    Output("simulation-request", "data"),
+    Output("backtest-request", "data"),
     Input("years-to-retire", "value"),
     Input("initial-invest", "value"),
     Input("annual-contribute", "value"),
     Input("annual-interest", "value"),
+    Input("contribution-growth", "value"),
+    Input("inflation", "value"),
+    Input("compounding", "value"),
+    Input("goal-mode", "value"),
+    Input("volatility", "value"),
+    Input("goal-target", "value"),
+    Input("simulations", "value"),
+    Input("backtest-period", "value"),
+    Input("rebalance", "value"),
+    State("goal-template", "data"),
+)
+
+
+# Monte Carlo runs, like backtests below, reach the server as background jobs (see jobs.py).
+# Switching back to the projection or leaving the page cancels a run, so its fan chart can't
+# replace what is shown by then
+@callback(
+    Output("goal-chart", "figure", allow_duplicate=True),
+    Input("simulation-request", "data"),
+    prevent_initial_call=True,
+    **background(
+        running=[(Output("simulation-progress", "class_name"), "mb-1", "d-none")],
+        cancel=[Input("goal-mode", "value"), Input("_pages_location", "pathname")],
+    ),
+)
+@instrument
+def update_simulation(request):
+    return simulation_chart(**request)
+
+
+# the portfolio page's allocation is read here, in the worker, and goes to the backtest with the
+# request: a finished job is reused for the same arguments, so after a Balance % edit they differ
+@callback(
+    Output("backtest-job", "data"),
+    Input("backtest-request", "data"),
+    State("session-id", "data"),
+    prevent_initial_call=True,
+)
+@instrument
+def backtest_allocation(request, session_id):
+    return {**request, "allocation": session_allocation(session_id).to_dict()}
+
+
+# backtests of that allocation run as background jobs too, over the price history the explore
+# page keeps (see backtest.py)
+@callback(
+    Output("goal-chart", "figure", allow_duplicate=True),
+    Input("backtest-job", "data"),
+    prevent_initial_call=True,
+    **background(
+        running=[(Output("simulation-progress", "class_name"), "mb-1", "d-none")],
+        cancel=[Input("goal-mode", "value"), Input("_pages_location", "pathname")],
+    ),
 )
-def update_goal(years, invest, contribute, interest):
-    if interest == "0" or years == "0":
-        return no_update
-    for x in [years, invest, contribute, interest]:
+@instrument
+def update_backtest(job):
+    request = dict(job)
+    allocation = pd.Series(request.pop("allocation"), dtype=float)
+    return backtest_chart(allocation, **request)
+
+
+def update_goal(
+    years, invest, contribute, interest, growth, inflation, compounding, mode, volatility, target, paths, period,
+    rebalance,
+):
+    if years == "0":
+        return no_update, no_update, no_update
+    for x in [years, invest, contribute, interest, growth, inflation]:
         if not str(x).isdigit():  # if the text values do not represent digits
-            return no_update
+            return no_update, no_update, no_update
+
+    if mode == "backtest":
+        request = dict(
+            invest=float(invest),
+            contribute=float(contribute),
+            compounding=compounding,
+            period=period,
+            rebalance=rebalance,
+        )
+        return no_update, no_update, request
+
+    if mode == "simulation":
+        for x in [volatility, target, paths]:
+            if not str(x).isdigit():
+                return no_update, no_update, no_update
+        if not int(paths):  # no simulations to run
+            return no_update, no_update, no_update
+        request = dict(
+            years=int(years),
+            invest=float(invest),
+            contribute=float(contribute),
+            interest=float(interest),
+            growth=float(growth),
+            inflation=float(inflation),
+            volatility=float(volatility),
+            target=float(target),
+            paths=int(paths),
+        )
+        return no_update, request, no_update
 
     # convert text to float
-    years, invest, contribute, interest = (
+    years, invest, contribute, interest, growth, inflation = (
         float(years),
         float(invest),
         float(contribute),
         float(interest),
+        float(growth),
+        float(inflation),
     )
 
-    result = []
-    for y in range(0, int(years) + 1):
-        ci = comound_interest(y, invest, contribute, interest / 100)
-        result.append(ci)
+    # the chosen rate and the sensitivity band around it, in one vectorized pass
+    rates = [max(interest - SENSITIVITY, 0), interest, interest + SENSITIVITY]
+    low, result, high = project_grid(
+        [rate / 100 for rate in rates],
+        int(years),
+        invest,
+        contribute,
+        periods_per_year=compounding,
+        contribution_growth=growth / 100,
+        inflation=inflation / 100,
+    )
+    x = list(range(0, int(years) + 1))
     end_result = numerize.numerize(result[-1], 2)
     fig_title = f"${end_result} after {int(years)} years"
-    fig = px.line(
-        x=range(0, int(years) + 1),
-        y=result,
-        template="plotly_dark",
-        markers=True,
-        title=fig_title,
+    if inflation:
+        fig_title += " in today's dollars"
+    fig = figures.projection_figure(x, result, low, high, fig_title, f"{rates[0]:g}% - {rates[2]:g}%")
+    return fig, no_update, no_update
+
+
+# fan chart of simulated outcomes: P10-P90 band, the median path and the target line
+def simulation_chart(years, invest, contribute, interest, growth, inflation, volatility, target, paths):
+    result = simulate(
+        years,
+        invest,
+        contribute,
+        interest / 100,
+        volatility / 100,
+        target,
+        n_paths=min(paths, MAX_PATHS),
+        contribution_growth=growth / 100,
+        inflation=inflation / 100,
+    )
+    p10, p50, p90 = result["percentiles"]
+    x = list(range(0, years + 1))
+    fig_title = (
+        f"{result['probability']:.0%} chance of ${numerize.numerize(target, 2)} after {years} years"
+        f" ({result['paths']:,} simulations)"
+    )
+    fig = figures.fan_figure(x, p10, p50, p90, target, fig_title)
+    return fig
+
+
+# Balance % per ticker of this session's portfolio, as the portfolio page last saved it
+def session_allocation(session_id):
+    state = get_holdings_store().get(session_id) if session_id else None
+    if not state:
+        return pd.Series(dtype=float)
+    return Holdings.from_json(state["holdings"]).allocation()
+
+
+# the allocation and an equal weight one over the same tickers, paying in the initial investment
+# at the start and the annual contribution once a year or split over the months
+def backtest_chart(allocation, invest, contribute, compounding, period, rebalance):
+    allocation = allocation[allocation > 0]
+    if allocation.empty:
+        return {"data": [], "layout": figures.years_layout("Give the portfolio's holdings a ticker to backtest them")}
+    if not invest:
+        return {"data": [], "layout": figures.years_layout("Enter an initial investment to backtest the portfolio")}
+    prices = load_prices(list(allocation.index), period)
+    if len(prices.dates) < 2:
+        return {"data": [], "layout": figures.years_layout(f"No price history for {', '.join(allocation.index)}")}
+
+    weights = allocation.reindex(prices.tickers).to_numpy()
+    values, deposited, flows = backtest(
+        prices.values,
+        np.vstack([weights, np.ones(len(weights))]),
+        invest,
+        contribute / compounding,
+        BARS // compounding,
+        REBALANCE_BARS[rebalance],
+    )
+    stats = summary(values, flows)
+    fig_title = (
+        f"${numerize.numerize(float(values[0, -1]), 2)} from ${numerize.numerize(float(deposited[-1]), 2)} paid in:"
+        f" {stats['cagr'][0]:.1f}% a year, {stats['volatility'][0]:.1f}% volatility,"
+        f" {stats['drawdown'][0]:.1f}% max drawdown"
     )
-    fig.update_layout(xaxis_title="Years", yaxis_title="USD")
-    return dcc.Graph(figure=fig)
+    if prices.failed:
+        fig_title += f" (without {', '.join(prices.failed)})"
+    return figures.backtest_figure(prices.dates, values, deposited, ["Your allocation", "Equal weight"], fig_title)
@@ -1,13 +1,31 @@
+import math
+import os
+import uuid
+
 import dash_ag_grid as dag
-from dash import Dash, html, dcc, callback, Input, Output, State, no_update, ctx, register_page
+from dash import Dash, html, dcc, callback, clientside_callback, ClientsideFunction, Input, Output, State, no_update, ctx, register_page, get_app, get_relative_path
 import dash_bootstrap_components as dbc  # version 1.4.0
-import pandas as pd  # version 1.5.3
-import plotly.express as px
+import numpy as np  # version 1.24.2
 from numerize import numerize
 
+import aggregates
+import figures
+import holdings_io
+from datasources import get_seed_portfolio
+from holdings import Holdings
+from holdings_query import get_holdings_queries
+from holdings_store import get_holdings_store
+from instrumentation import instrument
+from rebalance import LOT_SIZES, rebalance
+from valuation import get_valuer, mark_to_market
+
 register_page(__name__, path="/")
 
-df = pd.read_csv("https://raw.githubusercontent.com/Coding-with-Adam/Dash-by-Plotly/master/Other/my-portfolio.csv")
+# the grid fetches its rows from the server a block at a time as it scrolls, and keeps at most
+# GRID_MAX_BLOCKS of them in the browser
+GRID_BLOCK_ROWS = int(os.environ.get("PORTFOLIO_GRID_BLOCK_ROWS", 100))
+GRID_MAX_BLOCKS = 50
+TRADES_SHOWN = 20  # largest trades listed under Rebalance
 
 input_style = {
     "backgroundColor": "black",
@@ -16,12 +34,6 @@ input_style = {
 }
 
 
-# list of options for the pie chart dropdown
-dropdown_col_names = df.columns.tolist()
-dropdown_col_names.remove("balance_dollar")
-dropdown_col_names.remove("balance_prct")
-
-
 columnDefs = [
     {
         "headerName": "Region",  # Name of table displayed in app
@@ -49,6 +61,16 @@ columnDefs = [
         "type": "numberColumn",
         "filter": "agNumberColumnFilter",
     },
+    {
+        "headerName": "Ticker",  # optional: with a quantity, the holding is valued at its last close
+        "field": "ticker",
+    },
+    {
+        "headerName": "Quantity",
+        "field": "quantity",
+        "type": "numberColumn",
+        "filter": "agNumberColumnFilter",
+    },
     {
         "headerName": "Investment",
         "field": "investment",
@@ -71,6 +93,14 @@ columnDefs = [
     },
 ]
 
+# an imported file's columns may be named by field or by header
+HEADERS = {col["headerName"]: col["field"] for col in columnDefs}
+
+# list of options for the pie chart dropdown
+dropdown_col_names = [
+    col["field"] for col in columnDefs if col["field"] not in ("balance_dollar", "balance_prct", "ticker", "quantity")
+]
+
 # color the `Balance %` column gray
 cellStyle = {
     "styleConditions": [
@@ -92,233 +122,688 @@ defaultColDef = {
 }
 
 
-table = dag.AgGrid(
-    id="portfolio-table",
-    className="ag-theme-alpine-dark",
-    columnDefs=columnDefs,
-    rowData=df.to_dict("records"),
-    columnSize="sizeToFit",
-    defaultColDef=defaultColDef,
-    dashGridOptions={"undoRedoCellEditing": True, "rowSelection": "multiple"},
-)
+def new_holding():
+    return {
+        "id": uuid.uuid4().hex,
+        "region": "",
+        "market": "",
+        "balance_dollar": None,
+        "balance_prct": 0,
+        "ticker": "",
+        "quantity": None,
+        "investment": "",
+        "account": "",
+        "platform": "",
+        "owner": "Ladybug",
+    }
+
+
+def to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number  # NaN counts as empty
+
+
+# a row with "Balance %" as a number and "Balance $" recalculated from the total
+def with_balance(row, total_investment):
+    prct = to_number(row.get("balance_prct"))
+    dollar = None if prct is None else prct * total_investment / 100
+    return {**row, "balance_prct": prct, "balance_dollar": dollar}
+
+
+# a number as JavaScript writes it, so the browser builds the same column definitions
+def js_number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() and abs(value) < 1e21 else repr(value)
+
+
+# "Balance $" is worked out in the browser from each row's "Balance %" and the total, so an edit or
+# a new total shows without fetching rows again; balanceDollar is in assets/clientside.js
+def balance_columns(column_defs, total_investment):
+    getter = {"function": f"balanceDollar(params.data, {js_number(total_investment)})"}
+    return [{**col, "valueGetter": getter} if col["field"] == "balance_dollar" else col for col in column_defs]
+
+
+def balance_prct(row):
+    return to_number(row.get("balance_prct"))
+
+
+# the holdings live on the server, keyed by the browser session, so callbacks only send deltas.
+# They are kept as typed columns (see holdings.py) and only become rowData for the grid. "groups"
+# holds the Balance % sums per pie column and is kept up to date row by row; "version" is new
+# whenever the holdings change
+def seed_state():
+    return new_state(Holdings.from_frame(get_seed_portfolio()))
+
+
+# holdings as the seed portfolio or an imported file has them: the total is what their Balance $
+# add up to, and Balance % is worked out from the amounts when a file only has those
+def new_state(holdings, total_investment=None):
+    dollar, prct = holdings.column("balance_dollar"), holdings.column("balance_prct")
+    total = float(np.nansum(dollar)) if not np.isnan(dollar).all() else float(total_investment or 0)
+    if np.isnan(prct).all() and total:
+        holdings = holdings.with_balances(dollar, dollar / total * 100)
+    else:
+        holdings = holdings.with_total(total)
+    return versioned({"holdings": holdings, "total": total, "groups": holdings.group_sums(aggregates.GROUP_COLUMNS)})
+
+
+def versioned(state):
+    return {**state, "version": uuid.uuid4().hex}
+
+
+# the stored state with its holdings as columns again
+def decoded(state):
+    if not isinstance(state["holdings"], Holdings):
+        state["holdings"] = Holdings.from_json(state["holdings"])
+    if "groups" not in state:
+        state["groups"] = state["holdings"].group_sums(aggregates.GROUP_COLUMNS)
+    if "version" not in state:
+        state["version"] = uuid.uuid4().hex
+    return state
 
 
-layout = dbc.Container(
-    [
-        dbc.Row(
-            [
+def load_state(session_id):
+    return get_holdings_store().update(session_id, decoded, default=seed_state)
+
+
+# fn returns the state it was given when nothing changed, which keeps the version
+def change_state(session_id, fn):
+    def change(state):
+        state = decoded(state)
+        changed = fn(state)
+        return state if changed is state else versioned(changed)
+
+    return get_holdings_store().update(session_id, change, default=seed_state)
+
+
+# the session's holdings indexed for the grid's queries; only the small "version" part is read
+# unless they have changed since this worker last indexed them
+def holdings_index(session_id):
+    parts = get_holdings_store().get_parts(session_id, "version")
+
+    def load():
+        state = get_holdings_store().get(session_id)
+        state = decoded(state) if state and "version" in state else load_state(session_id)
+        return state["version"], state["holdings"]
+
+    return get_holdings_queries().index(session_id, parts and parts["version"], load)
+
+
+# the edited row as the grid sent it, with "Balance $" recalculated like the browser does
+def apply_cell_change(state, cell_change):
+    row = with_balance(cell_change["data"], state["total"])
+    holdings = state["holdings"]
+    position = holdings.position(row.get("id"))
+    if position is None:  # the session was evicted and reseeded since the grid loaded
+        return add_rows(state, [row])
+    changed = holdings.replace(position, row)
+    groups = aggregates.replace(state["groups"], holdings.row(position), changed.row(position), balance_prct)
+    return {**state, "holdings": changed, "groups": groups}
+
+
+# Balance % doesn't change, so neither do the group sums
+def apply_total(state, total_investment):
+    if total_investment is None or total_investment == state["total"]:
+        return state
+    return {**state, "holdings": state["holdings"].with_total(total_investment), "total": total_investment}
+
+
+# every holding with a ticker and quantity valued at its last close, the rest keep their Balance $,
+# and Balance % recalculated for all of them from the new total; with a total of $0 there is
+# nothing to work Balance % out from, and the state is left as it is
+def apply_valuation(state, snapshot):
+    dollar, prct, total, marked = mark_to_market(state["holdings"], snapshot.prices)
+    if not total:
+        return state
+    holdings = state["holdings"].with_balances(dollar, prct)
+    return {**state, "holdings": holdings, "total": total, "groups": holdings.group_sums(aggregates.GROUP_COLUMNS)}
+
+
+def add_rows(state, rows):
+    added = Holdings.from_records(rows)
+    groups = state["groups"]
+    for row in added.to_records():
+        aggregates.add(groups, row, balance_prct)
+    return {**state, "holdings": state["holdings"].append(added), "groups": groups}
+
+
+def delete_rows(state, row_ids):
+    groups = state["groups"]
+    for row in state["holdings"].rows(row_ids):
+        aggregates.remove(groups, row, balance_prct)
+    return {**state, "holdings": state["holdings"].drop(row_ids), "groups": groups}
+
+
+# the grid uses AG Grid's infinite row model: it asks page_rows for each block of rows it shows,
+# with its sort and filter, so the browser never holds the whole portfolio
+def grid_table(total_investment=None):
+    return dag.AgGrid(
+        id="portfolio-table",
+        className="ag-theme-alpine-dark",
+        columnDefs=columnDefs if total_investment is None else balance_columns(columnDefs, total_investment),
+        rowModelType="infinite",
+        getRowId="params.data.id",  # keeps a selected holding selected as blocks are fetched again
+        columnSize="sizeToFit",
+        defaultColDef=defaultColDef,
+        dashGridOptions={
+            "undoRedoCellEditing": True,
+            "rowSelection": "multiple",
+            "cacheBlockSize": GRID_BLOCK_ROWS,
+            "maxBlocksInCache": GRID_MAX_BLOCKS,
+        },
+    )
+
+
+# the grid is keyed by the holdings' version, so once rows are added, deleted or replaced on the
+# server it is mounted afresh and fetches them again
+def grid(state):
+    return html.Div(grid_table(state["total"]), id=f"portfolio-grid-{state['version']}")
+
+
+# totals and the pie are filled in by load_portfolio once the session id is known
+def layout():
+    table = html.Div(html.Div(grid_table(), id="portfolio-grid-new"), id="portfolio-grid")
+
+    return dbc.Container(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(
+                                        [
+                                            dbc.Row([
+                                                dbc.Col([
+                                                    html.Label(
+                                                        children="Total Balance (USD): ",
+                                                        className="me-2",
+                                                    ),
+                                                    dcc.Input(
+                                                        id="money-to-invest",
+                                                        type="number",
+                                                        step=1000,
+                                                        style=input_style,
+                                                    ),
+                                                ], width=12, xl=4),
+                                                dbc.Col([
+                                                    html.Label(
+                                                        children="Total Percentage: ",
+                                                        className="me-2",
+                                                    ),
+                                                    dcc.Input(
+                                                        id="total-percentage",
+                                                        type="number",
+                                                        step=1000,
+                                                        disabled=True,
+                                                        style=input_style,
+                                                    ),
+                                                ], width=12, xl=4),
+                                                dbc.Col([
+                                                    html.Label(
+                                                        children="Outstanding: ",
+                                                        className="me-2",
+                                                    ),
+                                                    dcc.Input(
+                                                        id="changed_percent",
+                                                        type="number",
+                                                        disabled=True,
+                                                        style=input_style
+                                                    ),
+                                                ], width=12, xl=4),
+                                            ])
+                                        ]
+                                    ),
+                                    dbc.CardBody(
+                                        [
+                                            table,
+                                            # Span ensures that both buttons display on the same row
+                                            html.Span(
+                                                [
+                                                    dbc.Button(
+                                                        id="delete-row-btn",
+                                                        children="Delete row",
+                                                        color="secondary",
+                                                        size="md",
+                                                        className="mt-3 me-1",
+                                                    ),
+                                                    dbc.Button(
+                                                        id="add-row-btn",
+                                                        children="Add row",
+                                                        color="primary",
+                                                        size="md",
+                                                        className="mt-3 me-1",
+                                                    ),
+                                                    dbc.Button(
+                                                        id="mark-to-market-btn",
+                                                        children="Mark to market",
+                                                        color="info",
+                                                        size="md",
+                                                        className="mt-3 me-2",
+                                                    ),
+                                                    html.Small(id="valuation-status"),
+                                                ]
+                                            ),
+                                            html.Div(
+                                                [
+                                                    dcc.Upload(
+                                                        id="holdings-upload",
+                                                        children=html.Div(
+                                                            ["Drop or ", html.A("select"), " a CSV, Parquet or Arrow file to replace the holdings"]
+                                                        ),
+                                                        max_size=holdings_io.MAX_UPLOAD_BYTES,
+                                                        className="flex-grow-1 p-2 me-2 text-center border border-secondary rounded",
+                                                    ),
+                                                    dbc.DropdownMenu(
+                                                        [
+                                                            dbc.DropdownMenuItem(
+                                                                label,
+                                                                id=f"export-{fmt}",
+                                                                href=get_relative_path(f"/portfolio/export.{fmt}"),
+                                                                external_link=True,
+                                                            )
+                                                            for fmt, label in [("csv", "CSV"), ("parquet", "Parquet"), ("arrow", "Arrow")]
+                                                        ],
+                                                        label="Export",
+                                                        color="secondary",
+                                                    ),
+                                                ],
+                                                className="d-flex align-items-center mt-3",
+                                            ),
+                                            html.Small(id="holdings-status"),
+                                        ]
+                                    ),
+                                ],
+                            )
+                        ],
+                        xs=12,
+                        sm=12,
+                        md=12,
+                        lg=7,
+                    ),
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(
+                                        dcc.Dropdown(
+                                            options=dropdown_col_names,
+                                            id="col-name",
+                                            value="owner",
+                                            clearable=False,
+                                            style={"color": "black"},
+                                        )
+                                    ),
+                                    dbc.CardBody(
+                                        [
+                                            html.Div(
+                                                id="pie-breakdown", className="card-text"
+                                            )
+                                        ]
+                                    ),
+                                ],
+                            )
+                        ],
+                        xs=12,
+                        sm=12,
+                        md=12,
+                        lg=5,
+                    ),
+                ],
+                className="py-4",
+            ),
+            dbc.Row(
                 dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardHeader(
+                    dbc.Card(
+                        [
+                            dbc.CardHeader(
+                                dbc.Row(
                                     [
-                                        dbc.Row([
-                                            dbc.Col([
-                                                html.Label(
-                                                    children="Total Balance (USD): ",
-                                                    className="me-2",
-                                                ),
-                                                dcc.Input(
-                                                    id="money-to-invest",
-                                                    value=df.balance_dollar.sum(),
-                                                    type="number",
-                                                    step=1000,
-                                                    style=input_style,
-                                                ),
-                                            ], width=12, xl=4),
-                                            dbc.Col([
-                                                html.Label(
-                                                    children="Total Percentage: ",
-                                                    className="me-2",
-                                                ),
+                                        dbc.Col(html.Label("Rebalance"), width="auto"),
+                                        dbc.Col(
+                                            dbc.RadioItems(
+                                                id="lot-size",
+                                                options=[{"label": label, "value": lot} for label, lot in LOT_SIZES.items()],
+                                                value=LOT_SIZES["Whole shares"],
+                                                persistence=True,
+                                                inline=True,
+                                            ),
+                                            width="auto",
+                                        ),
+                                        dbc.Col(
+                                            [
+                                                html.Label("Leave holdings within (%): ", className="me-2"),
                                                 dcc.Input(
-                                                    id="total-percentage",
-                                                    value=df.balance_prct.astype(float).sum(),
+                                                    id="rebalance-tolerance",
                                                     type="number",
-                                                    step=1000,
-                                                    disabled=True,
+                                                    min=0,
+                                                    value=0,
+                                                    persistence=True,
                                                     style=input_style,
                                                 ),
-                                            ], width=12, xl=4),
-                                            dbc.Col([
-                                                html.Label(
-                                                    children="Outstanding: ",
-                                                    className="me-2",
-                                                ),
-                                                dcc.Input(
-                                                    id="changed_percent",
-                                                    value=df.balance_prct.astype(float).sum()-100,
-                                                    type="number",
-                                                    disabled=True,
-                                                    style=input_style
-                                                ),
-                                            ], width=12, xl=4),
-                                        ])
-                                    ]
-                                ),
-                                dbc.CardBody(
-                                    [
-                                        table,
-                                        # Span ensures that both buttons display on the same row
-                                        html.Span(
-                                            [
-                                                dbc.Button(
-                                                    id="delete-row-btn",
-                                                    children="Delete row",
-                                                    color="secondary",
-                                                    size="md",
-                                                    className="mt-3 me-1",
-                                                ),
-                                                dbc.Button(
-                                                    id="add-row-btn",
-                                                    children="Add row",
-                                                    color="primary",
-                                                    size="md",
-                                                    className="mt-3",
-                                                ),
-                                            ]
+                                            ],
+                                            width="auto",
                                         ),
-                                    ]
-                                ),
-                            ],
-                        )
-                    ],
-                    xs=12,
-                    sm=12,
-                    md=12,
-                    lg=7,
-                ),
-                dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardHeader(
-                                    dcc.Dropdown(
-                                        options=dropdown_col_names,
-                                        id="col-name",
-                                        value="owner",
-                                        clearable=False,
-                                        style={"color": "black"},
-                                    )
-                                ),
-                                dbc.CardBody(
-                                    [
-                                        html.Div(
-                                            id="pie-breakdown", className="card-text"
-                                        )
-                                    ]
-                                ),
-                            ],
-                        )
-                    ],
-                    xs=12,
-                    sm=12,
-                    md=12,
-                    lg=5,
+                                        dbc.Col(
+                                            dbc.Switch(
+                                                id="by-account",
+                                                label="Keep money in each account",
+                                                value=True,
+                                                persistence=True,
+                                            ),
+                                            width="auto",
+                                        ),
+                                    ],
+                                    align="center",
+                                )
+                            ),
+                            dbc.CardBody(html.Div(id="rebalance-trades")),
+                        ]
+                    ),
+                    width=12,
                 ),
-            ],
-            className="py-4",
-        ),
-    ], fluid=True
+                className="pb-4",
+            ),
+        ], fluid=True
+    )
+
+
+# fill the totals from this session's stored holdings (the seed portfolio on a first visit); the
+# grid asks for its rows itself
+@callback(
+    Output("money-to-invest", "value"),
+    Output("total-percentage", "value"),
+    Output("changed_percent", "value"),
+    Input("session-id", "data"),
 )
+@instrument
+def load_portfolio(session_id):
+    state = load_state(session_id)
+    total = state["holdings"].total_percentage()
+    return state["total"], total, total - 100
 
 
-# add or delete rows of table
+# a block of rows as the grid scrolls, sorts or filters, from this session's indexed holdings (see
+# holdings_query.py), so a block costs about the same however many holdings there are
 @callback(
-    Output("portfolio-table", "deleteSelectedRows"),
-    Output("portfolio-table", "rowData"),
+    Output("portfolio-table", "getRowsResponse"),
+    Input("portfolio-table", "getRowsRequest"),
+    State("session-id", "data"),
+    prevent_initial_call=True,
+)
+@instrument
+def page_rows(request, session_id):
+    if not request:
+        return no_update
+    start = int(request.get("startRow") or 0)
+    end = int(request.get("endRow") or start + GRID_BLOCK_ROWS)
+    try:
+        rows, count = holdings_index(session_id).page(start, end, request.get("sortModel"), request.get("filterModel"))
+    except ValueError:  # a filter the server doesn't know matches nothing
+        rows, count = [], 0
+    return {"rowData": rows, "rowCount": count}
+
+
+# replace this session's holdings with those of an uploaded file, which is read a chunk at a time
+# (see holdings_io.py). The upload is cleared so the same file can be imported again
+@callback(
+    Output("portfolio-grid", "children", allow_duplicate=True),
+    Output("money-to-invest", "value", allow_duplicate=True),
+    Output("total-percentage", "value", allow_duplicate=True),
+    Output("changed_percent", "value", allow_duplicate=True),
+    Output("holdings-status", "children"),
+    Output("holdings-upload", "contents"),
+    Input("holdings-upload", "contents"),
+    State("holdings-upload", "filename"),
+    State("money-to-invest", "value"),
+    State("session-id", "data"),
+    prevent_initial_call=True,
+)
+@instrument
+def import_holdings(contents, filename, total_investment, session_id):
+    if not contents:
+        return no_update, no_update, no_update, no_update, no_update, no_update
+    try:
+        holdings = holdings_io.read_upload(contents, filename, HEADERS)
+    except (ValueError, RuntimeError) as error:
+        return no_update, no_update, no_update, no_update, str(error), None
+    state = new_state(holdings, total_investment)
+    get_holdings_store().update(session_id, lambda old: state)
+
+    total = state["holdings"].total_percentage()
+    return grid(state), state["total"], total, total - 100, f"Imported {len(holdings):,} holdings from {filename}.", None
+
+
+# the export links download this tab's holdings
+clientside_callback(
+    ClientsideFunction(namespace="portfolio", function_name="export_links"),
+    Output("export-csv", "href"),
+    Output("export-parquet", "href"),
+    Output("export-arrow", "href"),
+    Input("session-id", "data"),
+    State("export-csv", "href"),
+    State("export-parquet", "href"),
+    State("export-arrow", "href"),
+)
+
+# the Export links download the session's holdings from here; reading a session never creates one
+def stored_holdings(session_id):
+    state = get_holdings_store().get(session_id)
+    return decoded(state)["holdings"] if state is not None else None
+
+
+holdings_io.register(get_app(), "portfolio/export", stored_holdings)
+
+
+# add or delete rows of table; only the ids of the selected rows come in for a delete, and the
+# grid fetches its rows again afterwards
+@callback(
+    Output("portfolio-grid", "children"),
+    Output("total-percentage", "value", allow_duplicate=True),
+    Output("changed_percent", "value", allow_duplicate=True),
     Input("delete-row-btn", "n_clicks"),
     Input("add-row-btn", "n_clicks"),
-    State("portfolio-table", "rowData"),
+    State("portfolio-table", "selectedRows"),
+    State("session-id", "data"),
     prevent_initial_call=True,
 )
-def update_dash_table(n_dlt, n_add, data):
+@instrument
+def update_dash_table(n_dlt, n_add, selected_rows, session_id):
     if ctx.triggered_id == "add-row-btn":
-        new_row = {
-            "region": [""],
-            "market": [""],
-            "balance_dollar": None,
-            "balance_prct": [0],
-            "investment": [""],
-            "account": [""],
-            "platform": [""],
-            "owner": ["Ladybug"],
-        }
-        df_new_row = pd.DataFrame(new_row)
-        updated_table = pd.concat(
-            [pd.DataFrame(data), df_new_row]
-        )  # add new row to orginal dataframe
-        return False, updated_table.to_dict("records")
-
-    elif ctx.triggered_id == "delete-row-btn":
-        return True, no_update
-
-# calculate "Balance $" column, update Total Percentage and Outstanding fields
+        state = change_state(session_id, lambda state: add_rows(state, [new_holding()]))
+
+    else:
+        row_ids = {row.get("id") for row in selected_rows or []}
+        if not row_ids:
+            return no_update, no_update, no_update
+        state = change_state(session_id, lambda state: delete_rows(state, row_ids))
+
+    total = state["holdings"].total_percentage()
+    return grid(state), total, total - 100
+
+
+# value the holdings that have a ticker and quantity at their last close, all tickers in one price
+# lookup made outside the session's transaction. The new total then redraws the pie as usual
 @callback(
-    Output("portfolio-table", "rowData", allow_duplicate=True),
-    Output("total-percentage", "value"),
-    Output("changed_percent", "value"),
+    Output("portfolio-grid", "children", allow_duplicate=True),
+    Output("money-to-invest", "value", allow_duplicate=True),
+    Output("total-percentage", "value", allow_duplicate=True),
+    Output("changed_percent", "value", allow_duplicate=True),
+    Output("valuation-status", "children"),
+    Input("mark-to-market-btn", "n_clicks"),
+    State("session-id", "data"),
+    prevent_initial_call=True,
+)
+@instrument
+def revalue_portfolio(n_clicks, session_id):
+    holdings = load_state(session_id)["holdings"]
+    tickers = holdings.tickers()
+    if not tickers:
+        return no_update, no_update, no_update, no_update, "Add a ticker and quantity to value a holding."
+    snapshot = get_valuer().snapshot(tickers)
+    unpriced = ", ".join(snapshot.prices.index[snapshot.prices.isna()])
+    if snapshot.as_of is None:
+        return no_update, no_update, no_update, no_update, f"No price found for {unpriced}."
+    _, _, total, marked = mark_to_market(holdings, snapshot.prices)
+    if not total:
+        return no_update, no_update, no_update, no_update, "Nothing to value: the priced holdings are worth $0 and the rest have no Balance $."
+    state = change_state(session_id, lambda state: apply_valuation(state, snapshot))
+
+    status = f"Valued {int(marked.sum())} of {len(holdings)} holdings at the {snapshot.as_of:%Y-%m-%d} close"
+    if unpriced:
+        status += f"; no price for {unpriced}"
+    total = round(state["holdings"].total_percentage(), 9)  # the shares add up to 100 but for float rounding
+    return grid(state), state["total"], total, total - 100, status
+
+
+# calculate "Balance $" column, update Total Percentage and Outstanding fields. This runs in the
+# browser (assets/clientside.js); update_balance below is the reference implementation it mirrors,
+# and tests/test_clientside.py checks that both agree
+clientside_callback(
+    ClientsideFunction(namespace="portfolio", function_name="update_balance"),
+    Output("portfolio-table", "columnDefs"),
+    Output("total-percentage", "value", allow_duplicate=True),
+    Output("changed_percent", "value", allow_duplicate=True),
     Input("portfolio-table", "cellValueChanged"),
     Input("money-to-invest", "value"),
-    State("portfolio-table", "rowData"),
+    State("portfolio-table", "columnDefs"),
+    State("total-percentage", "value"),
     prevent_initial_call=True,
 )
-def update_balance(cell_change, total_investment, data):
-    # Ensure cell_change is a dictionary
-    if isinstance(cell_change, dict) and "colId" in cell_change:
-        if cell_change["colId"] == "balance_prct":
-            # Your existing logic when the balance percentage column is changed
-            dff = pd.DataFrame(data)
-            dff["balance_prct"] = pd.to_numeric(dff["balance_prct"], errors="coerce")
-            dff["balance_dollar"] = (dff["balance_prct"] * total_investment / 100)
-            outstanding = numerize.numerize(100 - dff["balance_prct"].sum(), 2)
-            return dff.to_dict("records"), dff["balance_prct"].sum(), outstanding
-
-    if ctx.triggered_id == "money-to-invest":
-        # Your existing logic for updating based on total investment
+
+
+def update_balance(cell_change, total_investment, column_defs, total, triggered_id):
+    if triggered_id == "money-to-invest":
         if total_investment is None:
             return no_update, no_update, no_update
         else:
-            dff = pd.DataFrame(data)
-            dff["balance_prct"] = pd.to_numeric(dff["balance_prct"], errors="coerce")
-            dff["balance_dollar"] = (dff["balance_prct"] * total_investment / 100)
-            return dff.to_dict("records"), no_update, no_update
+            return balance_columns(column_defs, total_investment), no_update, no_update
+
+    # the grid only has the rows in view, so the total moves by the edit
+    if isinstance(cell_change, dict) and cell_change.get("colId") == "balance_prct":
+        old, new = to_number(cell_change.get("oldValue")), to_number(cell_change.get("newValue"))
+        total = (to_number(total) or 0) - (old or 0) + (new or 0)
+        outstanding = numerize.numerize(100 - total, 2)
+        return no_update, total, outstanding
 
     return no_update, no_update, no_update
 
 
-# build the Pie Chart
+# build the Pie Chart. Edits and total changes arrive here as deltas and are applied to the
+# stored holdings; the chart is drawn from the pre-aggregated group sums, so switching the
+# column only reads those
 @callback(
     Output("pie-breakdown", "children"),
     Input("col-name", "value"),
     Input("portfolio-table", "cellValueChanged"),
-    State("money-to-invest", "value"),
-    State("portfolio-table", "rowData"),
+    Input("money-to-invest", "value"),
+    State("session-id", "data"),
 )
-def update_portfolio_stats(col_selected, cell_change, total_investment, data):
-    dff = pd.DataFrame(data)
-    dff["balance_prct"] = pd.to_numeric(dff["balance_prct"], errors="coerce")
+@instrument
+def update_portfolio_stats(col_selected, cell_change, total_investment, session_id):
+    if ctx.triggered_id == "portfolio-table" and isinstance(cell_change, dict):
+        state = change_state(session_id, lambda state: apply_cell_change(state, cell_change))
+    elif ctx.triggered_id == "money-to-invest":
+        state = change_state(session_id, lambda state: apply_total(state, total_investment))
+    else:
+        state = get_holdings_store().get_parts(session_id, "groups") or load_state(session_id)
+    if total_investment is None:
+        total_investment = load_state(session_id)["total"]
+
+    names, values = aggregates.slices(state["groups"], col_selected)
 
-    if dff["balance_prct"].sum() == 100:
+    # sums are updated incrementally, so allow for float rounding left over from earlier edits
+    if math.isclose(aggregates.total(state["groups"]), 100, abs_tol=1e-9):
         return [
             html.Div(
                 f"Portfolio Total: ${total_investment:,.0f}",
                 style={"textAlign": "center"},
             ),
             dcc.Graph(
-                figure=px.pie(
-                    dff,
-                    values="balance_prct",
-                    names=col_selected,
-                    hole=0.3,
-                    height=400,
-                    template="plotly_dark",
-                    color_discrete_sequence=px.colors.sequential.Jet,
-                ).update_layout(margin=dict(l=20, r=20, t=20, b=20))
+                figure=figures.pie_figure(names, values, col_selected, "balance_prct")
             ),
         ]
     else:
         return dbc.Alert(
             "Balance total does not equal 100%. Please update Balance %", color="danger"
-        )
\ No newline at end of file
+        )
+
+
+# the trades that bring the holdings to their Balance % of the total, worked out again once each
+# edit has been stored (the pie is redrawn after that) and whenever the holdings are replaced.
+# They come from this worker's copy of the holdings' current version and the last closes already
+# at hand: nothing is fetched while editing, and the tickers without a close wait for Revalue
+@callback(
+    Output("rebalance-trades", "children"),
+    Input("pie-breakdown", "children"),
+    Input("portfolio-grid", "children"),
+    Input("lot-size", "value"),
+    Input("rebalance-tolerance", "value"),
+    Input("by-account", "value"),
+    State("money-to-invest", "value"),
+    State("session-id", "data"),
+)
+@instrument
+def update_rebalance(pie, grid_children, lot, tolerance, by_account, total_investment, session_id):
+    if total_investment is None:
+        return no_update
+    holdings = holdings_index(session_id).holdings
+    tickers = holdings.tickers()
+    snapshot = get_valuer().cached(tickers)
+    try:
+        plan = rebalance(holdings, snapshot.prices, total_investment, lot, tolerance or 0, by_account)
+    except ValueError as error:
+        return html.Small(str(error))
+    return rebalance_view(plan, int(snapshot.prices.reindex(tickers).isna().sum()))
+
+
+def format_shares(shares):
+    return f"{shares:,.3f}".rstrip("0").rstrip(".")
+
+
+def rebalance_view(plan, unpriced=0):
+    if plan.trades.empty:
+        status = "No trades needed"
+    else:
+        status = f"{len(plan.trades):,} trades, ${plan.turnover:,.0f} bought and sold"
+    status += f"; holdings that can trade end within {plan.drift:.2f} points of their Balance %"
+    if not math.isclose(plan.scaled_from, 100, abs_tol=1e-9):
+        status += f" (Balance % scaled from {plan.scaled_from:.2f}% to 100%)"
+    cash = ", ".join(f"{account} ${amount:,.0f}" for account, amount in plan.cash.items() if amount >= 0.5)
+    notes = [f"Cash left: {cash}" if cash else "No cash left over"]
+    if plan.untraded:
+        notes.append(f"{plan.untraded:,} holdings without a ticker, quantity or price stay as they are")
+    if unpriced:
+        notes.append(f"Revalue to price {unpriced:,} tickers")
+
+    shown = plan.trades.head(TRADES_SHOWN)
+    table = dbc.Table(
+        [
+            html.Thead(html.Tr([html.Th(name) for name in ["Side", "Ticker", "Shares", "Price", "Amount", "Account"]])),
+            html.Tbody(
+                [
+                    html.Tr(
+                        [
+                            html.Td(trade.side),
+                            html.Td(trade.ticker),
+                            html.Td(format_shares(trade.shares)),
+                            html.Td(f"${trade.price:,.2f}"),
+                            html.Td(f"${trade.amount:,.0f}"),
+                            html.Td(trade.account),
+                        ]
+                    )
+                    for trade in shown.itertuples()
+                ]
+            ),
+        ],
+        size="sm",
+        color="dark",
+        className="mt-2",
+    )
+    if len(plan.trades) > TRADES_SHOWN:
+        notes.append(f"the largest {TRADES_SHOWN} trades are listed")
+    return [html.Div(status), html.Small("; ".join(notes)), table if len(shown) else None]
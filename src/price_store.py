@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd  # version 1.5.3
+import yfinance as yf  # version 0.2.12
+
+from fetch_executor import get_executor
+from instrumentation import count_cache, upstream
+from singleflight import interprocess_lock
+
+# local price history, keyed by (ticker, interval), so that switching between periods on the
+# explore page slices bars we already have instead of downloading the whole period again
+STORE_PATH = os.environ.get(
+    "PRICE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "prices.sqlite"),
+)
+
+FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+INTRADAY_INTERVALS = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+# seconds before stored bars are considered stale and the tail is topped up from yahoo
+INTRADAY_TTL = 60
+DAILY_TTL = 60 * 60
+
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+MAX_START = pd.Timestamp("1900-01-01")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, adj_close REAL, volume REAL,
+    PRIMARY KEY (ticker, interval, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    covered_from INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    tz TEXT,
+    PRIMARY KEY (ticker, interval)
+);
+"""
+
+
+def empty_frame():
+    return pd.DataFrame(columns=FIELDS, index=pd.DatetimeIndex([], name="Date"), dtype=float)
+
+
+def ttl_for(interval):
+    return INTRADAY_TTL if interval in INTRADAY_INTERVALS else DAILY_TTL
+
+
+def trading_days(period):
+    # yahoo treats "5d" as the last five trading days, not calendar days
+    if period.endswith("d") and period[:-1].isdigit():
+        return int(period[:-1])
+    return None
+
+
+def period_start(period, now):
+    now = (now if isinstance(now, pd.Timestamp) else pd.Timestamp(now, unit="s")).floor("s")
+    days = trading_days(period)
+    if days is not None:
+        return now - pd.Timedelta(days=days)
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1)
+    if period == "max":
+        return MAX_START
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period: {period}")
+    return now - PERIOD_OFFSETS[period]
+
+
+def to_seconds(index):
+    return (pd.DatetimeIndex(index).asi8 // 10**9).astype(np.int64)
+
+
+# bars in exchange wall time, like yfinance's ignore_tz; the exchange's time zone is kept in
+# attrs["tz"] (when the download had one) so times from elsewhere can be put in the same terms
+def normalize_frame(frame):
+    if frame is None or frame.empty:
+        return empty_frame()
+    frame = frame.reindex(columns=FIELDS).astype(float)
+    index = pd.DatetimeIndex(frame.index)
+    tz = None if index.tz is None else str(index.tz)
+    if tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.rename("Date")
+    frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+    frame.attrs["tz"] = tz
+    return frame
+
+
+# function to get ticker data from yahoo's API, one symbol at a time
+def yahoo_download(ticker, interval, period=None, start=None):
+    kwargs = {"start": start} if start is not None else {"period": period}
+    frame = yf.download(
+        tickers=ticker, interval=interval, progress=False, threads=False, ignore_tz=False, **kwargs
+    )
+    return normalize_frame(frame)
+
+
+class FakeDownloader:
+    """Offline stand-in for `yahoo_download` that synthesises bars and records every call.
+
+    `delays` maps a ticker to seconds slept per call and `failures` to how many calls raise
+    ConnectionError before it answers, to exercise timeouts and retries. With `tz` the bars come
+    in that time zone, as yahoo's do in their exchange's.
+    """
+
+    FREQUENCIES = {"1d": "B", "5d": "5B", "1wk": "W-FRI", "1mo": "BM", "1h": "H", "60m": "H", "90m": "90min"}
+
+    def __init__(self, clock=time.time, delisted=(), delays=None, failures=None, tz=None):
+        self.clock = clock
+        self.tz = tz
+        self.delisted = set(delisted)
+        self.delays = dict(delays or {})
+        self.failures = dict(failures or {})
+        self.calls = []
+
+    def frequency(self, interval):
+        if interval in self.FREQUENCIES:
+            return self.FREQUENCIES[interval]
+        return interval.replace("m", "min")
+
+    def __call__(self, ticker, interval, period=None, start=None):
+        self.calls.append((ticker, interval, period, start))
+        if self.delays.get(ticker):
+            time.sleep(self.delays[ticker])
+        if self.failures.get(ticker):
+            self.failures[ticker] -= 1
+            raise ConnectionError(f"injected failure for {ticker}")
+        if ticker in self.delisted:
+            return empty_frame()
+
+        now = pd.Timestamp(self.clock(), unit="s")
+        first = pd.Timestamp(start) if start is not None else period_start(period, now)
+        index = pd.date_range(max(first, pd.Timestamp("2000-01-03")), now, freq=self.frequency(interval))
+        if interval not in INTRADAY_INTERVALS:
+            index = index.normalize()
+
+        # prices are a pure function of (ticker, timestamp) so overlapping downloads agree
+        base = 20 + zlib.crc32(ticker.encode()) % 300
+        days = to_seconds(index) / 86400.0
+        close = base * np.exp(days / 3650.0 - 3.0) * (1 + 0.1 * np.sin(days / 30.0))
+        frame = pd.DataFrame(
+            {
+                "Open": close * 0.995,
+                "High": close * 1.01,
+                "Low": close * 0.99,
+                "Close": close,
+                "Adj Close": close,
+                "Volume": np.full(len(index), 1e6),
+            },
+            index=index if self.tz is None else index.tz_localize(self.tz),
+        )
+        return normalize_frame(frame)
+
+
+class PriceStore:
+    """SQLite-backed bar store that answers any period from cache and only fetches the missing tail."""
+
+    def __init__(self, path=STORE_PATH, downloader=None, clock=time.time, executor=None):
+        self.path = path
+        self.downloader = downloader or yahoo_download
+        self.clock = clock
+        self.executor = executor
+        self.stats = {"hits": 0, "misses": 0, "topups": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = None
+        else:
+            # a private in-memory database has to outlive every call, so share one connection
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = self._conn or sqlite3.connect(self.path, timeout=30)
+        try:
+            with self._lock, conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            if conn is not self._conn:
+                conn.close()
+
+    def _meta(self, conn, ticker, interval):
+        return conn.execute(
+            "SELECT covered_from, fetched_at, (SELECT MAX(ts) FROM bars WHERE ticker = ? AND interval = ?), tz"
+            " FROM series WHERE ticker = ? AND interval = ?",
+            (ticker, interval, ticker, interval),
+        ).fetchone()
+
+    def _write(self, conn, ticker, interval, frame, covered_from, fetched_at, tz):
+        if not frame.empty:
+            rows = np.column_stack([to_seconds(frame.index), frame[FIELDS].to_numpy()])
+            conn.executemany(
+                "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(ticker, interval, int(row[0]), *map(float, row[1:])) for row in rows],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?)",
+            (ticker, interval, int(covered_from), fetched_at, tz),
+        )
+
+    def _read(self, conn, ticker, interval, period, start):
+        days = trading_days(period)
+        if days is not None:
+            # over-read by a couple of weeks and keep the last N trading days
+            start = start - pd.Timedelta(days=days + 14)
+        rows = conn.execute(
+            "SELECT ts, open, high, low, close, adj_close, volume FROM bars"
+            " WHERE ticker = ? AND interval = ? AND ts >= ? ORDER BY ts",
+            (ticker, interval, int(to_seconds([start])[0])),
+        ).fetchall()
+        if not rows:
+            return empty_frame()
+        # built straight from the rows: read_sql_query's type inference costs more than the query
+        values = np.array(rows, dtype=float).reshape(len(rows), len(FIELDS) + 1)
+        seconds = values[:, 0].astype("int64")
+        if days is not None:
+            dates = seconds // 86400
+            first = np.unique(dates)[-days:][0]
+            values, seconds = values[dates >= first], seconds[dates >= first]
+        index = pd.DatetimeIndex(seconds.astype("datetime64[s]").astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame(values[:, 1:], index=index, columns=FIELDS)
+
+    def _plan(self, meta, now, start_seconds, interval, period):
+        # returns the downloader kwargs needed to bring the series up to date, or None on a hit
+        stale = meta is not None and now - meta[1] > ttl_for(interval)
+        if meta is None or meta[0] > start_seconds or stale and meta[2] is None:
+            # nothing stored for the requested window yet: fetch the whole period once
+            return {"period": period}
+        if stale:
+            # re-download from the last stored bar, which also refreshes a still-forming bar
+            return {"start": pd.Timestamp(meta[2], unit="s")}
+        return None
+
+    def _lock_path(self, ticker, interval):
+        if self._conn is not None:
+            return None
+        return os.path.join(os.path.dirname(self.path), "locks", f"{ticker}-{interval}.lock")
+
+    def get(self, ticker, period, interval="1d"):
+        now = self.clock()
+        start = period_start(period, now)
+        start_seconds = int(to_seconds([start])[0])
+        with self._connect() as conn:
+            meta = self._meta(conn, ticker, interval)
+
+        plan = self._plan(meta, now, start_seconds, interval, period)
+        if plan is None:
+            self.stats["hits"] += 1
+            count_cache("price_store", "hit")
+        else:
+            # the download happens outside the database lock so one slow symbol doesn't block the
+            # rest, but only one worker process downloads a given series at a time
+            with interprocess_lock(self._lock_path(ticker, interval)):
+                with self._connect() as conn:
+                    meta = self._meta(conn, ticker, interval)
+                plan = self._plan(meta, now, start_seconds, interval, period)
+                if plan is None:
+                    self.stats["coalesced"] += 1  # another worker fetched it while we waited
+                    count_cache("price_store", "coalesced")
+                else:
+                    with upstream("prices"):
+                        frame = self.downloader(ticker, interval, **plan)
+                    covered_from = meta[0] if meta is not None else start_seconds
+                    if "period" in plan:
+                        covered_from = min(covered_from, start_seconds)
+                        self.stats["misses"] += 1
+                        count_cache("price_store", "miss")
+                    else:
+                        self.stats["topups"] += 1
+                        count_cache("price_store", "topup")
+                    tz = frame.attrs.get("tz") or (meta[3] if meta is not None else None)
+                    with self._connect() as conn:
+                        self._write(conn, ticker, interval, frame, covered_from, now, tz)
+
+        return self.read(ticker, period, interval)
+
+    # the bars of the period that are stored, however old, without downloading anything
+    def read(self, ticker, period, interval="1d"):
+        start = period_start(period, self.clock())
+        with self._connect() as conn:
+            meta = self._meta(conn, ticker, interval)
+            frame = self._read(conn, ticker, interval, period, start)
+        frame.attrs["tz"] = meta[3] if meta is not None else None
+        return frame
+
+    # ({ticker: bars}, {ticker: reason}) for several symbols, fetched concurrently on the shared
+    # pool; symbols that keep failing or are too slow are left out instead of holding up the rest
+    def get_many(self, tickers, period, interval="1d", budget=None):
+        executor = self.executor or get_executor()
+        return executor.fetch_many(tickers, lambda ticker: self.get(ticker, period, interval), budget=budget)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM bars")
+            conn.execute("DELETE FROM series")
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return PriceStore()
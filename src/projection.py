@@ -0,0 +1,42 @@
+import numpy as np
+
+
+# closed form for yearly compounding with contributions paid at the start of each year
+def comound_interest(t, initial, annual, interest_rate):
+    if interest_rate == 0:
+        return initial + annual * t
+    return (
+        initial * (1 + interest_rate) ** t
+        + annual * (1 + interest_rate) * ((1 + interest_rate) ** t - 1) / interest_rate
+    )
+
+
+def project_grid(rates, years, initial, annual, periods_per_year=1, contribution_growth=0.0, inflation=0.0):
+    """Balance at the end of years 0..`years` for every rate in `rates`, shape (len(rates), years + 1).
+
+    Contributions are split evenly over the compounding periods and paid at the start of each one,
+    growing by `contribution_growth` once a year. With `inflation` the balances are in today's money.
+    """
+    rates = np.atleast_1d(np.asarray(rates, dtype=float))[:, None]
+    periods = int(years) * periods_per_year
+
+    # balance_n = growth_n * (initial + sum of each earlier deposit discounted back to period 0),
+    # which is one cumulative sum instead of a loop and has no division by the rate
+    growth = (1 + rates / periods_per_year) ** np.arange(periods + 1)
+    contributions = annual / periods_per_year
+    if contribution_growth:
+        contributions = contributions * (1 + contribution_growth) ** (np.arange(periods) // periods_per_year)
+    deposited = np.zeros_like(growth)
+    np.cumsum(contributions / growth[:, :-1], axis=1, out=deposited[:, 1:])
+    balance = growth * (initial + deposited)
+
+    yearly = balance[:, ::periods_per_year]
+    if inflation:
+        yearly = yearly / (1 + inflation) ** np.arange(int(years) + 1)
+    return yearly
+
+
+def project(years, initial, annual, interest_rate, periods_per_year=1, contribution_growth=0.0, inflation=0.0):
+    return project_grid(
+        [interest_rate], years, initial, annual, periods_per_year, contribution_growth, inflation
+    )[0]
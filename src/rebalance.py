@@ -0,0 +1,143 @@
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+
+# the trades that bring a portfolio to its Balance % targets out of the Total Balance. Holdings
+# with a ticker, quantity and price trade in whole lots; the rest can't be traded and stay as
+# they are. Money doesn't move between accounts (a 401k can't pay for an IRA's purchases): new
+# money goes to the accounts furthest under their targets first, a withdrawal comes out of those
+# furthest over, and each account is rebalanced within itself.
+#
+# Exact lots make this an integer program, but one holding's lots don't change what another's
+# cost, so a greedy pass ends within a lot of one per holding: sells are rounded up and buys down,
+# which can only leave cash over, and that cash then goes to the holdings furthest under target,
+# a lot each, while it lasts. Each holding then ends less than a lot from where it should go, so
+# the plan is off target by at most the exact plan's distance plus a lot of each holding (the
+# exact plan's share counts can be several lots away; see tests/test_rebalance.py). Every step
+# is a whole-array operation
+LOT_SIZES = {"Fractional": 0.001, "Whole shares": 1, "Round lots": 100}  # shares per lot
+EPSILON = 1e-9  # lots of float noise ignored when rounding
+FILL_ROUNDS = 8  # passes spending the cash rounding leaves over
+
+
+class RebalancePlan:
+    """Trades by holding and the cash each account has left once they are done."""
+
+    def __init__(self, trades, cash, drift, turnover, untraded, scaled_from):
+        self.trades = trades  # DataFrame of the holdings that trade, largest amount first
+        self.cash = cash  # Series by account
+        self.drift = drift  # furthest a tradeable holding ends from its target, in percentage points
+        self.turnover = turnover  # dollars bought and sold
+        self.untraded = untraded  # holdings without a ticker, quantity or price
+        self.scaled_from = scaled_from  # what Balance % added up to before the targets were scaled to 100
+
+
+def group_sums(codes, values, count):
+    return np.bincount(codes, weights=values, minlength=count)
+
+
+# amounts adding up to `amount` that bring the largest `gaps` down to a common level, the way
+# water fills the deepest part of a basin first
+def fill(gaps, amount):
+    if amount <= 0:
+        return np.zeros(len(gaps))
+    levels = np.sort(gaps)[::-1]
+    cut = (np.cumsum(levels) - amount) / np.arange(1, len(levels) + 1)
+    level = cut[np.flatnonzero(levels > cut)[-1]]
+    return np.maximum(gaps - level, 0)
+
+
+def rebalance(holdings, prices, total, lot=1, tolerance=0.0, by_account=True):
+    """The plan that brings `holdings` closest to their Balance % of `total` at `prices`.
+
+    `prices` is a Series by ticker and `lot` the shares per lot. Holdings less than `tolerance`
+    percent away from where they would go are left alone; without `by_account` the whole
+    portfolio is treated as one account.
+    """
+    if not total or total <= 0:
+        raise ValueError("Rebalancing needs a positive Total Balance")
+    frame = holdings.frame
+    quantity = holdings.column("quantity")
+    price = prices.reindex(holdings.column("ticker")).to_numpy(dtype=float)
+    tradeable = (holdings.column("ticker") != "") & (quantity >= 0) & (price > 0)
+    current = np.where(tradeable, quantity * price, np.nan_to_num(holdings.column("balance_dollar")))
+
+    prct = np.nan_to_num(holdings.column("balance_prct")).clip(min=0)
+    if not prct.sum():
+        raise ValueError("Give at least one holding a Balance % to rebalance to")
+    target = prct / prct.sum() * total
+
+    if by_account:
+        codes, accounts = pd.factorize(frame["account"].astype(str))
+    else:
+        codes, accounts = np.zeros(len(frame), dtype=int), pd.Index(["All accounts"])
+    count = len(accounts)
+
+    # what each account holds afterwards, shared by the holdings that move in proportion to their
+    # targets once the ones that stay put are taken out
+    before = group_sums(codes, current, count)
+    gaps = group_sums(codes, target, count) - before
+    added = total - current.sum()
+    value = before + (fill(gaps, added) if added >= 0 else -fill(-gaps, -added))
+
+    def spread(moving):
+        fixed = group_sums(codes, np.where(moving, 0, current), count)
+        pool = (value - fixed).clip(min=0)  # a withdrawal can't take more than an account can sell
+        share = group_sums(codes, np.where(moving, target, 0), count)
+        scale = np.divide(pool, share, out=np.zeros(count), where=share > 0)
+        return pool + fixed, np.where(moving, target * scale[codes], current)
+
+    held, desired = spread(tradeable)
+    if tolerance:
+        near = np.abs(desired - current) < tolerance / 100 * desired
+        held, desired = spread(tradeable & ~near)
+
+    delta = desired - current
+    # each holding ends on the whole lot at or below where it should go, or the one above; the
+    # lower one (never selling more than is held) costs least, so every account can afford it
+    price = np.nan_to_num(price)
+    held_shares = np.nan_to_num(quantity)
+    lots = np.floor(np.divide(delta, price * lot, out=np.zeros(len(delta)), where=tradeable) + EPSILON)
+    shares = np.maximum(lots * lot, -held_shares)
+    step = np.maximum((lots + 1) * lot, -held_shares) - shares
+    cash = held - group_sums(codes, current + shares * price, count)
+
+    # the account's cash then moves those furthest under to the lot above while it lasts, where
+    # that is nearer; a step too dear for what is left is passed over on the next round
+    short = desired - current - shares * price
+    cost = step * price
+    wanted = tradeable & (delta != 0) & (short > cost / 2)
+    order = np.lexsort((-short, codes))
+    for _ in range(FILL_ROUNDS):
+        order = order[wanted[order] & (cost[order] <= cash[codes[order]] + EPSILON)]
+        if not len(order):
+            break
+        spent = np.cumsum(cost[order])
+        before = np.concatenate([[0], spent])[np.searchsorted(codes[order], np.arange(count))]
+        bought = order[spent - before[codes[order]] <= cash[codes[order]] + EPSILON]
+        shares[bought] += step[bought]
+        wanted[bought] = False
+        cash -= group_sums(codes[bought], cost[bought], count)
+
+    amount = shares * price
+    traded = np.flatnonzero(shares != 0)
+    traded = traded[np.argsort(-np.abs(amount[traded]), kind="stable")]
+    trades = pd.DataFrame(
+        {
+            "id": frame["id"].to_numpy()[traded],
+            "ticker": holdings.column("ticker")[traded],
+            "account": frame["account"].astype(str).to_numpy()[traded],
+            "side": np.where(shares[traded] > 0, "Buy", "Sell"),
+            "shares": np.abs(shares[traded]),
+            "price": price[traded],
+            "amount": np.abs(amount[traded]),
+        }
+    )
+    drift = np.abs(current + amount - target)[tradeable].max(initial=0) / total * 100
+    return RebalancePlan(
+        trades,
+        pd.Series(cash, index=accounts),
+        float(drift),
+        float(np.abs(amount).sum()),
+        int((~tradeable).sum()),
+        float(prct.sum()),
+    )
@@ -0,0 +1,102 @@
+import bisect
+import re
+from functools import lru_cache
+
+from datasources import get_tickers
+
+SEARCH_LIMIT = 20  # options sent back to a dropdown per keystroke
+
+
+def name_words(name):
+    return {word for word in re.split(r"[^0-9A-Z]+", name.upper()) if word}
+
+
+class TickerIndex:
+    """Prefix search over ticker symbols and company-name words, with a substring fallback."""
+
+    def __init__(self, symbols, names):
+        self.symbols = [str(symbol).upper() for symbol in symbols]
+        self.names = ["" if name != name else str(name) for name in names]  # NaN names become ""
+
+        # sorted keys with the row each key came from, so a prefix lookup is two bisects
+        symbol_keys = sorted((symbol, row) for row, symbol in enumerate(self.symbols))
+        self._symbol_keys = [key for key, _ in symbol_keys]
+        self._symbol_rows = [row for _, row in symbol_keys]
+        word_keys = sorted(
+            (word, row) for row, name in enumerate(self.names) for word in name_words(name)
+        )
+        self._word_keys = [key for key, _ in word_keys]
+        self._word_rows = [row for _, row in word_keys]
+        self._rows_by_symbol = {symbol: row for row, symbol in enumerate(self.symbols)}
+
+        # one newline-separated haystack lets the fallback scan run in C via str.find
+        lines = [f"{symbol} {name.upper()}" for symbol, name in zip(self.symbols, self.names)]
+        self._haystack = "\n".join(lines)
+        self._line_starts = [0]
+        for line in lines:
+            self._line_starts.append(self._line_starts[-1] + len(line) + 1)
+
+    @staticmethod
+    def _prefix_rows(keys, rows, prefix, limit):
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff", lo=start)
+        return rows[start:min(end, start + limit)]
+
+    def _substring_rows(self, query, limit):
+        found, position = [], self._haystack.find(query)
+        while position != -1 and len(found) < limit:
+            row = bisect.bisect_right(self._line_starts, position) - 1
+            found.append(row)
+            position = self._haystack.find(query, self._line_starts[row + 1])  # skip to the next line
+        return found
+
+    def search(self, query, limit=SEARCH_LIMIT, exclude=()):
+        query = query.strip().upper()
+        if not query:
+            return []
+        exclude = {str(symbol).upper() for symbol in exclude}
+
+        # exact symbol first, then symbol prefixes (shortest first), then name words, then substrings
+        symbol_matches = sorted(
+            self._prefix_rows(self._symbol_keys, self._symbol_rows, query, limit * 4),
+            key=lambda row: (len(self.symbols[row]), self.symbols[row]),
+        )
+        candidates = [
+            symbol_matches,
+            self._prefix_rows(self._word_keys, self._word_rows, query, limit * 4),
+            self._substring_rows(query, limit * 4),
+        ]
+
+        results, seen = [], set()
+        for rows in candidates:
+            for row in rows:
+                if row in seen or self.symbols[row] in exclude:
+                    continue
+                seen.add(row)
+                results.append(row)
+                if len(results) == limit:
+                    return results
+        return results
+
+    def option(self, row):
+        symbol, name = self.symbols[row], self.names[row]
+        label = f"{symbol} - {name}" if name else symbol
+        return {"label": label, "value": symbol, "search": f"{symbol} {name}"}
+
+    def options(self, query, limit=SEARCH_LIMIT, exclude=()):
+        return [self.option(row) for row in self.search(query, limit, exclude)]
+
+    def options_for(self, symbols):
+        # options for values that are already selected, so the dropdown can display them
+        return [
+            self.option(self._rows_by_symbol[symbol])
+            if symbol in self._rows_by_symbol
+            else {"label": symbol, "value": symbol}
+            for symbol in symbols
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    df_tickers = get_tickers()
+    return TickerIndex(df_tickers["Ticker"], df_tickers["Name"])
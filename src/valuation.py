@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np  # version 1.24.2
+import pandas as pd  # version 1.5.3
+
+from instrumentation import count_cache
+from market_data import get_stock_data, stored_stock_data
+from price_store import DAILY_TTL
+
+PRICE_FIELD = "Close"
+PRICE_PERIOD = "5d"  # enough daily bars to find every ticker's last close over a long weekend
+SNAPSHOT_TTL = DAILY_TTL  # the store doesn't look for a newer daily bar any sooner
+RETRY_TTL = 60  # seconds a snapshot that some tickers failed in (a timeout, say) is kept
+MAX_SNAPSHOTS = 64
+
+
+class PriceSnapshot:
+    """The last close of a set of tickers as of the newest bar among them."""
+
+    def __init__(self, prices, as_of, failed, taken_at):
+        self.prices = prices  # Series by ticker, NaN for tickers without a price
+        self.as_of = as_of
+        self.failed = failed
+        self.taken_at = taken_at
+
+
+# Balance $ of every holding: quantity x last close where both are known, the amount it already
+# had otherwise; Balance % follows from the new total
+def mark_to_market(holdings, prices):
+    price = prices.reindex(holdings.column("ticker")).to_numpy(dtype=float)
+    value = holdings.column("quantity") * price
+    marked = ~np.isnan(value)
+    dollar = np.where(marked, value, holdings.column("balance_dollar"))
+    total = float(np.nansum(dollar))
+    prct = dollar / total * 100 if total else np.full(len(holdings), np.nan)
+    return dollar, prct, total, marked
+
+
+class Valuer:
+    """Prices holdings with one batched lookup per set of tickers.
+
+    A snapshot of their last closes is kept until the price store could have a newer bar, so
+    revaluing again, or another session holding the same tickers, doesn't look anything up. One
+    with failed tickers is only kept for retry_ttl, so their prices aren't missing for the hour.
+    cached() prices from what is kept or stored already, for callbacks that mustn't wait on a fetch.
+    """
+
+    def __init__(
+        self, fetch=get_stock_data, read=stored_stock_data, ttl=SNAPSHOT_TTL, retry_ttl=RETRY_TTL,
+        max_snapshots=MAX_SNAPSHOTS, clock=time.time,
+    ):
+        self.fetch = fetch
+        self.read = read
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self.max_snapshots = max_snapshots
+        self.clock = clock
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "reused": 0}
+
+    # the kept snapshot of these tickers while it can be reused, counted as reused
+    def fresh(self, key):
+        with self._lock:
+            cached = self._snapshots.get(key)
+            if cached is None or self.clock() - cached.taken_at >= (self.retry_ttl if cached.failed else self.ttl):
+                return None
+            self._snapshots.move_to_end(key)
+            self.stats["reused"] += 1
+        count_cache("valuation", "reused")
+        return cached
+
+    def snapshot(self, tickers):
+        key = tuple(sorted(set(tickers)))
+        cached = self.fresh(key)
+        if cached is not None:
+            return cached
+
+        snapshot = self.lookup(key)
+        count_cache("valuation", "lookup")
+        with self._lock:
+            self.stats["lookups"] += 1
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    # the kept snapshot while it is fresh, or else one from the closes the price store already has;
+    # nothing is looked up upstream, so tickers never fetched are NaN. Such a snapshot isn't kept
+    def cached(self, tickers):
+        key = tuple(sorted(set(tickers)))
+        cached = self.fresh(key)
+        if cached is not None:
+            return cached
+        count_cache("valuation", "stored")
+        return self.lookup(key, self.read)
+
+    def lookup(self, tickers, fetch=None):
+        taken_at = self.clock()
+        if not tickers:
+            return PriceSnapshot(pd.Series(dtype=float), None, {}, taken_at)
+        data = (fetch or self.fetch)(list(tickers), PRICE_PERIOD, "1d", "column")
+        priced = data[PRICE_FIELD].reindex(columns=list(tickers)).dropna(how="all")
+        if priced.empty:  # nothing could be priced
+            return PriceSnapshot(pd.Series(np.nan, index=list(tickers)), None, data.attrs.get("failed", {}), taken_at)
+        return PriceSnapshot(priced.ffill().iloc[-1], priced.index[-1], data.attrs.get("failed", {}), taken_at)
+
+    def value(self, holdings):
+        snapshot = self.snapshot(holdings.tickers())
+        return snapshot, mark_to_market(holdings, snapshot.prices)
+
+
+@lru_cache(maxsize=None)
+def get_valuer():
+    return Valuer()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the app's modules live in src/ and import each other by name, as they do under gunicorn --chdir src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+os.environ.setdefault("INVESTING_APP_OFFLINE", "1")
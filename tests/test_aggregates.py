@@ -0,0 +1,24 @@
+import aggregates
+
+
+def share(row):
+    return row.get("balance_prct")
+
+
+def test_rows_move_between_groups():
+    groups = aggregates.build([{"owner": "A", "balance_prct": 60}, {"owner": "B", "balance_prct": 40}], share, ["owner"])
+
+    aggregates.replace(groups, {"owner": "B", "balance_prct": 40}, {"owner": "A", "balance_prct": 40}, share)
+
+    assert groups == {"owner": {"A": [100.0, 2]}}
+    assert aggregates.total(groups) == 100
+
+
+def test_removing_from_a_missing_group_changes_nothing():
+    groups = aggregates.build([{"owner": "A", "balance_prct": 100}], share, ["owner"])
+
+    aggregates.remove(groups, {"owner": "C", "balance_prct": 25}, share)
+
+    assert groups == {"owner": {"A": [100.0, 1]}}
+    aggregates.add(groups, {"owner": "C", "balance_prct": 25}, share)
+    assert groups["owner"]["C"] == [25.0, 1]
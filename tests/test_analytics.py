@@ -0,0 +1,131 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from analytics import Analytics, Derived, max_drawdown
+
+PRICE = [10.0, 12.0, 9.0, 15.0, 12.0]
+NAN = float("nan")
+
+
+@pytest.fixture(autouse=True)
+def short_windows(monkeypatch):
+    for name, value in {"SMA_WINDOW": 3, "EMA_SPAN": 3, "RETURN_WINDOW": 2, "VOLATILITY_WINDOW": 2, "LOOKBACK": 3}.items():
+        monkeypatch.setattr(analytics, name, value)
+
+
+def prices(values, start="2023-01-02"):
+    return pd.Series(values, index=pd.date_range(start, periods=len(values), freq="B"), dtype=float)
+
+
+def test_rolling_columns_against_hand_worked_values():
+    columns = analytics.rolling_columns(PRICE, "1d")
+    annualize = np.sqrt(252) * 100
+
+    assert columns["sma"] == pytest.approx([NAN, NAN, 31 / 3, 12, 12], nan_ok=True)
+    assert columns["return"] == pytest.approx([NAN, NAN, -10, 25, 100 / 3], nan_ok=True)
+    # two log returns a window: their sample deviation is half their difference times sqrt(2)
+    assert columns["volatility"] == pytest.approx(
+        [NAN, NAN, np.log(1.6) / np.sqrt(2) * annualize, np.log(20 / 9) / np.sqrt(2) * annualize,
+         np.log(25 / 12) / np.sqrt(2) * annualize],
+        nan_ok=True,
+    )
+
+
+def test_volatility_is_annualized_for_the_interval():
+    daily = analytics.rolling_columns(PRICE, "1d")["volatility"]
+    monthly = analytics.rolling_columns(PRICE, "1mo")["volatility"]
+
+    assert monthly[2:] == pytest.approx(daily[2:] * np.sqrt(12 / 252))
+
+
+def test_series_shorter_than_a_window_are_all_nan():
+    columns = analytics.rolling_columns([10.0, 11.0], "1d")
+
+    assert np.isnan(columns["sma"]).all() and np.isnan(columns["volatility"]).all()
+    assert np.isnan(columns["return"]).all()
+
+
+def test_ema_against_hand_worked_values():
+    # a span of 3 moves half way to each new price
+    assert analytics.ema(PRICE) == pytest.approx([10, 11, 10, 12.5, 12.25])
+    assert analytics.ema([15.0, 12.0], previous=10.0) == pytest.approx([12.5, 12.25])
+
+
+@pytest.mark.parametrize("price, expected", [
+    (PRICE, {"peak": 1, "trough": 2, "percent": -25.0}),
+    ([10.0, 5.0, 20.0, 8.0], {"peak": 2, "trough": 3, "percent": -60.0}),  # the deeper fall from a later high
+    ([10.0, 5.0, 20.0, 15.0], {"peak": 0, "trough": 1, "percent": -50.0}),
+    ([1.0, 2.0, 3.0], {"peak": 0, "trough": 0, "percent": 0.0}),
+])
+def test_max_drawdown(price, expected):
+    assert max_drawdown(np.array(price)) == expected
+
+
+def test_max_drawdown_of_nothing():
+    assert max_drawdown(np.array([])) is None
+
+
+def test_window_is_the_bars_between_its_dates_with_their_own_drawdown():
+    series = prices(PRICE)
+    derived = Derived.compute(series, "1d")
+
+    window = derived.window(series.index[1], series.index[3])
+    assert list(window["times"]) == list(series.index[1:4])
+    assert window["price"].tolist() == [12, 9, 15]
+    assert window["sma"] == pytest.approx([NAN, 31 / 3, 12], nan_ok=True)
+    assert window["ema"] == pytest.approx([11, 10, 12.5])
+    assert window["drawdown"] == {"peak": 0, "trough": 1, "percent": -25.0}
+
+
+def test_cached_series_are_reused_extended_or_recomputed():
+    memo = Analytics()
+    series = prices(PRICE + [14.0, 13.0, 16.0])
+
+    first = memo.get("T", "1d", series[:5])
+    assert memo.get("T", "1d", series[:4]) is first  # covered already
+    extended = memo.get("T", "1d", series)
+    revised = memo.get("T", "1d", series.where(series.index != series.index[-1], 17.0))
+    assert memo.stats == {"hits": 1, "appends": 1, "computes": 2}
+
+    scratch = Derived.compute(series, "1d")
+    for name, values in scratch.columns.items():
+        assert extended.columns[name] == pytest.approx(values, nan_ok=True), name
+    assert revised.price[-1] == 17.0
+
+
+def test_missing_prices_are_dropped_and_the_oldest_series_evicted():
+    memo = Analytics(max_series=1)
+    series = prices([10.0, NAN, 12.0])
+
+    assert memo.get("A", "1d", series).price.tolist() == [10, 12]
+    assert memo.get("B", "1d", series[1:2]) is None
+    memo.get("B", "1d", series)
+    memo.get("A", "1d", series)
+    assert memo.stats["computes"] == 3
+
+
+def test_explore_overlays_mark_the_drawdown_from_its_high_to_its_low(monkeypatch):
+    import app  # noqa: F401  registers the pages
+
+    explore = sys.modules["pages.explore"]
+    monkeypatch.setattr(explore, "get_analytics", Analytics)
+    series = prices(PRICE)
+
+    traces = {trace["meta"]: trace for trace in explore.overlay_traces("T", series, series.index, None, 100, ["sma"])}
+    assert list(traces) == list(analytics.OVERLAYS)
+
+    drawdown = traces["drawdown"]
+    assert drawdown["name"] == "T Max drawdown -25.0%"
+    assert drawdown["x"].tolist() == ["2023-01-03", "2023-01-04"]
+    assert drawdown["y"] == pytest.approx([20, -10])  # % from the first price, like the line
+    assert (drawdown["visible"], traces["sma"]["visible"]) == (False, True)
+
+    # the averages rebased on the first price, return and volatility on the right axis as they are
+    assert traces["sma"]["y"] == pytest.approx([NAN, NAN, 10 / 3, 20, 20], nan_ok=True)
+    assert traces["ema"]["y"] == pytest.approx([0, 10, 0, 25, 22.5])
+    assert traces["return"]["y"] == pytest.approx([NAN, NAN, -10, 25, 100 / 3], nan_ok=True)
+    assert traces["return"]["yaxis"] == "y2" and traces["sma"]["yaxis"] == "y"
@@ -0,0 +1,109 @@
+import sys
+
+import numpy as np
+import pytest
+
+from backtest import backtest, normalized, run_variants, summary
+from holdings import Holdings
+from holdings_store import HoldingsStore, MemoryBackend
+
+# two tickers over five bars, half in each; 10 paid in every 2 bars
+PRICES = np.array([[10.0, 10.0], [20.0, 10.0], [20.0, 5.0], [10.0, 5.0], [10.0, 10.0]])
+SCHEDULE = dict(initial=100.0, contribution=10.0, contribute_every=2)
+
+
+def test_never_rebalanced_contributions_buy_at_the_target_weights():
+    values, deposited, flows = backtest(PRICES, [1, 1], **SCHEDULE)
+
+    # 5 + 5 units; bar 2 buys 0.25 A and 1 B for 5 each, bar 4 0.5 and 0.5
+    assert values[0] == pytest.approx([100, 150, 135, 82.5, 122.5])
+    assert deposited.tolist() == [100, 100, 110, 110, 120]
+    assert flows.tolist() == [0, 0, 10, 0, 10]
+
+
+def test_rebalancing_sells_back_to_the_weights_on_schedule():
+    values, _, _ = backtest(PRICES, [1, 1], rebalance_every=2, **SCHEDULE)
+
+    # bar 2: 125 held + 10 paid in, split back to 67.5 each (3.375 A, 13.5 B)
+    assert values[0] == pytest.approx([100, 150, 135, 101.25, 178.75])
+
+
+def test_every_allocation_in_one_pass():
+    weights = [[1, 0], [0, 1], [1, 1]]
+    values, _, _ = backtest(PRICES, weights, 100.0, rebalance_every=2)
+
+    assert values[0] == pytest.approx(100 * PRICES[:, 0] / 10)
+    assert values[1] == pytest.approx(100 * PRICES[:, 1] / 10)
+    for row, weight in enumerate(normalized(weights)):
+        alone, _, _ = backtest(PRICES, weight, 100.0, rebalance_every=2)
+        assert values[row] == pytest.approx(alone[0])
+
+
+def test_summary_counts_contributions_out_of_the_returns():
+    values, _, flows = backtest(PRICES, [1, 1], rebalance_every=2, **SCHEDULE)
+    stats = summary(values, flows, bars_per_year=4)
+
+    # time-weighted growth 1, 1.5, 1.25, 0.9375, 1.5625 over one year of four bars
+    assert stats["cagr"][0] == pytest.approx(56.25)
+    assert stats["drawdown"][0] == pytest.approx(-37.5)
+    assert stats["final"][0] == pytest.approx(178.75)
+    returns = np.array([0.5, -1 / 6, -0.25, 2 / 3])
+    assert stats["volatility"][0] == pytest.approx(returns.std(ddof=1) * 2 * 100)
+
+
+def test_weights_need_a_positive_sum():
+    with pytest.raises(ValueError):
+        backtest(PRICES, [0, 0], 100.0)
+
+
+def test_variants_in_one_process_match_backtest():
+    weights = np.random.default_rng(0).uniform(0, 1, (10, 2))
+    stats = run_variants(PRICES, weights, 100.0, 10.0, 2, 2, workers=1)
+
+    values, _, flows = backtest(PRICES, weights, 100.0, 10.0, 2, 2)
+    assert stats["final"] == pytest.approx(values[:, -1])
+    assert stats["cagr"] == pytest.approx(summary(values, flows)["cagr"])
+
+
+@pytest.fixture
+def goal(monkeypatch):
+    import app  # noqa: F401  registers the pages
+
+    goal = sys.modules["pages.goal"]
+    store = HoldingsStore(MemoryBackend())
+    monkeypatch.setattr(goal, "get_holdings_store", lambda: store)
+    return goal, store
+
+
+def stored(store, session_id, prct):
+    holdings = Holdings.from_records([
+        {"id": "a", "ticker": "AAA", "balance_prct": prct},
+        {"id": "b", "ticker": "BBB", "balance_prct": 100 - prct},
+    ])
+    store.put(session_id, {"holdings": holdings, "total": 1000.0})
+
+
+# a finished backtest job is reused for the same arguments, so they have to change with the holdings
+def test_backtest_job_is_keyed_on_the_allocation(goal, tmp_path):
+    diskcache = pytest.importorskip("diskcache")
+    from jobs import JobManager
+
+    goal, store = goal
+    manager = JobManager(diskcache.Cache(str(tmp_path)), cache_by=[lambda: 0])
+    request = {"invest": 1000.0, "contribute": 0.0, "compounding": 1, "period": "1y", "rebalance": "never"}
+
+    stored(store, "s", 60)
+    before = goal.backtest_allocation(request, "s")
+    again = goal.backtest_allocation(request, "s")
+    stored(store, "s", 40)
+    after = goal.backtest_allocation(request, "s")
+
+    assert before == {**request, "allocation": {"AAA": 60.0, "BBB": 40.0}}
+    assert after["allocation"] == {"AAA": 40.0, "BBB": 60.0}
+
+    def key(job):
+        return manager.build_cache_key(goal.update_backtest, [job], [])
+
+    assert key(before) == key(again)
+    assert key(before) != key(after)
+    assert goal.backtest_allocation(request, "missing")["allocation"] == {}
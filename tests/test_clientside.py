@@ -0,0 +1,158 @@
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+# the clientside callbacks in src/assets/clientside.js against their Python references, run under
+# node on generated inputs: pages/portfolio.py update_balance, pages/goal.py update_goal and
+# numerize.numerize
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "assets", "clientside.js")
+CASES = 300  # generated per kind
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+
+NODE_RUNNER = """
+const fs = require("fs");
+globalThis.window = globalThis;
+window.dash_clientside = {no_update: {no_update: true}, callback_context: {triggered: []}};
+require(process.argv[1]);
+const dc = window.dash_clientside;
+const cases = JSON.parse(fs.readFileSync(0, "utf8"));
+const results = cases.map(function (c) {
+    if (c.kind === "numerize") return dc.internals.numerize(c.value, 2);
+    if (c.kind === "balance") return dc.internals.updateBalance(...c.args);
+    return dc.goal.update_goal(...c.args, null);
+});
+process.stdout.write(JSON.stringify(results, (key, value) => (value === dc.no_update ? "no_update" : value)));
+"""
+
+def python_result(case):
+    from numerize import numerize
+    from pages import goal, portfolio
+
+
+    if case["kind"] == "numerize":
+        return numerize.numerize(case["value"], 2)
+    if case["kind"] == "balance":
+        return list(portfolio.update_balance(*case["args"]))
+    return list(goal.update_goal(*case["args"]))
+
+
+def normalize(value):
+    from dash import no_update
+
+    if value is no_update:
+        return "no_update"
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    return value
+
+
+# both sides build the same figures.projection_figure dict; the template is passed through as is
+def without_template(figure):
+    if not isinstance(figure, dict):
+        return figure
+    return {"data": figure["data"], "layout": {k: v for k, v in figure["layout"].items() if k != "template"}}
+
+
+def same(expected, actual, path="result"):
+    if isinstance(expected, float) or isinstance(actual, float):
+        if expected is None or actual is None:
+            return expected == actual or f"{path}: {expected!r} != {actual!r}"
+        # powers may differ in the last bit between numpy and V8; rounded text must match exactly
+        return math.isclose(expected, actual, rel_tol=1e-12, abs_tol=1e-9) or f"{path}: {expected!r} != {actual!r}"
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            outcome = same(a, b, f"{path}[{i}]")
+            if outcome is not True:
+                return outcome
+        return True
+    if isinstance(expected, dict) and isinstance(actual, dict) and expected.keys() == actual.keys():
+        for key in expected:
+            outcome = same(expected[key], actual[key], f"{path}.{key}")
+            if outcome is not True:
+                return outcome
+        return True
+    return expected == actual or f"{path}: {expected!r} != {actual!r}"
+
+
+def generate(count, seed):
+    from pages import portfolio
+
+    rng = random.Random(seed)
+    cases = []
+
+    ties = [0.125, 1.245, 1245000.0, 1235000.0, 999.995, 1000.0, 1e6, 2.5e9, 0.001, -8.5, -0.004, 0.0]
+    values = ties + [rng.choice([-1, 1]) * 10 ** rng.uniform(-3, 14) for _ in range(count)]
+    values += [round(value, rng.randrange(4)) for value in values[len(ties):]]
+    cases += [{"kind": "numerize", "value": value} for value in values]
+
+    seed_rows = portfolio.get_seed_portfolio()
+    rows = seed_rows.assign(id=seed_rows.index.astype(str)).to_dict("records")
+    entries = ["", "abc", None, "12", " 7.5 ", 0, 33.3, "1e2", -4]
+    for _ in range(count):
+        row = rng.choice(rows)
+        old, new = rng.choice(entries + [row["balance_prct"]] * 4), rng.choice(entries)
+        edited = dict(row, balance_prct=new)
+        change = {
+            "rowIndex": 0, "rowId": edited["id"], "data": edited, "oldValue": old, "newValue": new,
+            "colId": rng.choice(["balance_prct", "owner"]),
+        }
+        total_investment = rng.choice([None, 0, 262000, 1234567.5, rng.randrange(10**7)])
+        total = rng.choice([None, 100, 99.5, rng.uniform(0, 200)])
+        trigger = rng.choice(["money-to-invest", "portfolio-table"])
+        cases.append({"kind": "balance", "args": [change, total_investment, portfolio.columnDefs, total, trigger]})
+
+    digits = ["0", "1", "9", "25", "100000", "5000", "abc", "", "7.5", None]
+    for _ in range(count):
+        args = [
+            rng.choice(["0", "1", "10", "25", "40", "abc"]),
+            rng.choice(["0", "100000", "2500000"] + digits[-3:]),
+            rng.choice(["0", "5000", "12000"]),
+            rng.choice(["0", "3", "9", "15"]),
+            rng.choice(["0", "3"]),
+            rng.choice(["0", "2"]),
+            rng.choice([1, 12]),
+            rng.choice(["projection"] * 4 + ["simulation", "backtest"]),
+            rng.choice(["15", "x"]),
+            rng.choice(["1000000"]),
+            rng.choice(["10000", "0", "00"]),
+            rng.choice(["1y", "10y"]),
+            rng.choice(["never", "quarterly"]),
+        ]
+        cases.append({"kind": "goal", "args": args})
+    return cases
+
+
+@pytest.fixture(scope="module")
+def results():
+    import app  # noqa: F401  registers the pages
+
+    cases = generate(CASES, 0)
+    completed = subprocess.run(
+        ["node", "-e", NODE_RUNNER, SCRIPT], input=json.dumps(cases), capture_output=True, text=True, check=True
+    )
+    return list(zip(cases, json.loads(completed.stdout)))
+
+
+@pytest.mark.parametrize("kind", ["numerize", "balance", "goal"])
+def test_clientside_matches_python(results, kind):
+    checked = 0
+    for case, actual in results:
+        if case["kind"] != kind:
+            continue
+        expected = normalize(python_result(case))
+        if kind == "goal":
+            expected, actual = [without_template(expected[0]), *expected[1:]], [without_template(actual[0]), *actual[1:]]
+        outcome = same(expected, actual)
+        assert outcome is True, (case, outcome)
+        checked += 1
+    assert checked >= CASES
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from downsample import MAX_POINTS, MIN_POINTS, lttb, points_for
+
+
+def edge(i, n, n_out):
+    return int(i * (n - 2) / (n_out - 2)) + 1
+
+
+# Largest-Triangle-Three-Buckets as usually written, one point at a time for one series
+def reference(x, y, n_out):
+    n, a, picked = len(x), 0, [0]
+    for i in range(n_out - 2):
+        lo, hi = edge(i, n, n_out), edge(i + 1, n, n_out)
+        avg_lo, avg_hi = hi, min(edge(i + 2, n, n_out), n)
+        avg_x, avg_y = x[avg_lo:avg_hi].mean(), y[avg_lo:avg_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        picked.append(a)
+    return picked + [n - 1]
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    x = np.arange(5000, dtype=float)
+    return x, np.cumsum(rng.normal(size=(5000, 3)), axis=0)
+
+
+@pytest.mark.parametrize("n_out", [3, 4, 100, 777, 4999])
+def test_keeps_first_and_last_and_exactly_the_count(series, n_out):
+    x, y = series
+    rows = lttb(x, y, n_out)
+
+    assert rows.shape == (n_out, 3)
+    assert (rows[0] == 0).all() and (rows[-1] == len(x) - 1).all()
+    assert (np.diff(rows, axis=0) > 0).all()
+
+
+@pytest.mark.parametrize("n_out", [3, 50, 640])
+def test_each_series_matches_the_one_point_at_a_time_algorithm(series, n_out):
+    x, y = series
+    rows = lttb(x, y, n_out)
+
+    for column in range(y.shape[1]):
+        assert rows[:, column].tolist() == reference(x, y[:, column], n_out)
+
+
+@pytest.mark.parametrize("n_out", [5000, 6000])
+def test_at_or_under_the_threshold_everything_passes_through(series, n_out):
+    x, y = series
+    rows = lttb(x, y, n_out)
+
+    assert rows.shape == (5000, 3)
+    assert (rows == np.arange(5000)[:, None]).all()
+
+
+def test_a_single_series_can_be_one_dimensional():
+    x = np.arange(10, dtype=float)
+    assert lttb(x, x**2, 20)[:, 0].tolist() == list(range(10))
+    assert lttb(x, x**2, 4).shape == (4, 1)
+
+
+def test_a_spike_is_kept():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[537] = 100
+
+    assert 537 in lttb(x, y, 20)
+
+
+def test_nan_is_never_picked_over_a_value():
+    x = np.arange(1000, dtype=float)
+    y = np.column_stack([np.sin(x / 50), np.where(x < 600, np.nan, np.cos(x / 50))])
+    rows = lttb(x, y, 50)
+
+    assert not np.isnan(y[rows[:, 0], 0]).any()
+    picked = rows[1:-1, 1]
+    assert not np.isnan(y[picked[picked >= 600], 1]).any()
+
+
+@pytest.mark.parametrize("width, points", [(None, 1200), (0, 1200), (50, MIN_POINTS), (800.7, 800), (10**6, MAX_POINTS)])
+def test_points_for_the_chart_width(width, points):
+    assert points_for(width) == points
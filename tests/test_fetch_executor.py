@@ -0,0 +1,125 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from fetch_executor import FetchExecutor
+from price_store import FakeDownloader, PriceStore
+
+TICKERS = ["AAA", "BBB", "CCC", "DDD"]
+TIMEOUT = 0.1
+BUDGET = 0.6
+
+
+@pytest.fixture
+def executor():
+    executor = FetchExecutor(workers=8, timeout=TIMEOUT, retries=2, backoff=0.01, budget=BUDGET)
+    yield executor
+    executor.pool.shutdown(wait=False)
+
+
+class FirstCallSlow(FakeDownloader):
+    # only the first call for a delayed symbol sleeps, like a connection that hangs once
+    def __call__(self, ticker, *args, **kwargs):
+        time.sleep(self.delays.pop(ticker, 0))
+        return super().__call__(ticker, *args, **kwargs)
+
+
+def fetch(executor, downloader):
+    store = PriceStore(":memory:", downloader=downloader, executor=executor)
+    started = time.perf_counter()
+    frames, failed = store.get_many(TICKERS, "1y")
+    return frames, failed, time.perf_counter() - started
+
+
+def test_all_healthy(executor):
+    frames, failed, _ = fetch(executor, FakeDownloader())
+
+    assert sorted(frames) == TICKERS and not failed
+    assert executor.stats["calls"] == 4 and executor.stats["retries"] == 0
+
+
+def test_flaky_symbol_recovers_on_retry(executor):
+    frames, failed, _ = fetch(executor, FakeDownloader(failures={"BBB": 2}))
+
+    assert sorted(frames) == TICKERS and not failed
+    assert executor.stats["errors"] == 2 and executor.stats["retries"] == 2
+
+
+def test_symbol_that_keeps_failing_is_left_out_with_its_error(executor):
+    frames, failed, _ = fetch(executor, FakeDownloader(failures={"BBB": 100}))
+
+    assert sorted(frames) == ["AAA", "CCC", "DDD"]
+    assert failed == {"BBB": "ConnectionError: injected failure for BBB"}
+    assert executor.stats["retries"] == 2 and executor.stats["failed"] == 1
+
+
+def test_symbol_slower_than_the_timeout_is_given_up(executor):
+    frames, failed, elapsed = fetch(executor, FakeDownloader(delays={"CCC": BUDGET * 2}))
+
+    assert sorted(frames) == ["AAA", "BBB", "DDD"]
+    assert failed == {"CCC": f"timed out after {TIMEOUT:g}s"}
+    assert executor.stats["timeouts"] == 3
+    assert elapsed <= BUDGET + TIMEOUT
+
+
+def test_slow_start_is_fast_once_retried(executor):
+    frames, failed, elapsed = fetch(executor, FirstCallSlow(delays={"DDD": TIMEOUT * 3}))
+
+    assert sorted(frames) == TICKERS and not failed
+    assert executor.stats["timeouts"] == 1 and executor.stats["retries"] == 1
+    assert elapsed < TIMEOUT * 3
+
+
+def test_delisted_symbol_is_a_result_not_a_failure(executor):
+    frames, failed, _ = fetch(executor, FakeDownloader(delisted={"AAA"}))
+
+    assert sorted(frames) == TICKERS and not failed
+    assert frames["AAA"].empty
+
+
+# past the deadline fetch_many stops waiting: what is done is returned, and the rest are reported
+def test_budget_cuts_the_fetch_short():
+    executor = FetchExecutor(workers=4, timeout=5, retries=0, budget=0.2)
+    release = threading.Event()
+
+    def fn(key):
+        if key == "stuck":
+            release.wait(5)
+        return key.lower()
+
+    started = time.perf_counter()
+    results, failed = executor.fetch_many(["A", "stuck", "B"], fn)
+    elapsed = time.perf_counter() - started
+    release.set()
+    executor.pool.shutdown(wait=True)
+
+    assert results == {"A": "a", "B": "b"}
+    assert failed == {"stuck": "over the fetch budget"}
+    assert 0.2 <= elapsed < 1
+
+
+def test_budget_can_be_given_per_call(executor):
+    results, failed = executor.fetch_many(["A"], lambda key: time.sleep(0.3) or key, budget=0.05)
+
+    assert not results and failed == {"A": "over the fetch budget"}
+
+
+def test_repeated_keys_are_fetched_once(executor):
+    calls = []
+    results, failed = executor.fetch_many(["A", "A", "B"], lambda key: calls.append(key) or key)
+
+    assert results == {"A": "A", "B": "B"} and not failed
+    assert sorted(calls) == ["A", "B"]
+
+
+def test_work_runs_in_the_callers_context(executor):
+    current = contextvars.ContextVar("current", default="none")
+    token = current.set("create_graph")
+    try:
+        results, _ = executor.fetch_many(["A", "B"], lambda key: current.get())
+    finally:
+        current.reset(token)
+
+    assert results == {"A": "create_graph", "B": "create_graph"}
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+import figures
+
+
+def test_daily_bars_are_sent_as_dates():
+    days = pd.date_range("2023-04-20", periods=3, freq="D")
+
+    assert figures.dates_for_json(days).tolist() == ["2023-04-20", "2023-04-21", "2023-04-22"]
+    assert figures.dates_for_json(days.values.astype("datetime64[ms]")).tolist() == ["2023-04-20", "2023-04-21", "2023-04-22"]
+
+
+def test_intraday_bars_keep_their_time():
+    times = pd.to_datetime(["2023-04-21 09:30", "2023-04-21 09:35:15"])
+
+    assert figures.dates_for_json(times).tolist() == ["2023-04-21T09:30:00", "2023-04-21T09:35:15"]
+
+
+def test_one_intraday_bar_gives_every_bar_its_time():
+    times = pd.to_datetime(["2023-04-20", "2023-04-21", "2023-04-21 16:00"])
+
+    assert figures.dates_for_json(times).tolist() == ["2023-04-20T00:00:00", "2023-04-21T00:00:00", "2023-04-21T16:00:00"]
+
+
+def test_line_figure_has_a_line_per_series():
+    days = pd.date_range("2023-01-02", periods=2).values
+    fig = figures.line_figure([days, days], [[0, 1], [0, -1]], ["A", "B"])
+
+    assert [trace["name"] for trace in fig["data"]] == ["A", "B"]
+    assert fig["data"][0]["x"].tolist() == ["2023-01-02", "2023-01-03"]
+    assert fig["data"][1]["y"] == [0, -1]
+    assert fig["data"][0]["line"]["color"] != fig["data"][1]["line"]["color"]
+    assert fig["layout"]["yaxis"]["ticksuffix"] == "%"
+
+
+def test_line_figure_without_a_legend_leaves_numbers_alone():
+    fig = figures.line_figure([np.arange(3)], [[1, 2, 3]], ["A"], legend=False, x_title="Years", y_suffix="")
+
+    trace, = fig["data"]
+    assert trace["x"].tolist() == [0, 1, 2]
+    assert (trace["name"], trace["showlegend"]) == ("", False)
+    assert trace["hovertemplate"] == "Years=%{x}<br>value=%{y}<extra></extra>"
+
+
+def test_overlays_are_dotted_and_on_their_axis():
+    days = pd.date_range("2023-01-02", periods=2).values
+    trace = figures.overlay_trace(days, [1.0, 2.0], "SMA", "sma", False, "red", "y2")
+
+    assert trace["x"].tolist() == ["2023-01-02", "2023-01-03"]
+    assert (trace["meta"], trace["visible"], trace["yaxis"], trace["line"]["dash"]) == ("sma", False, "y2", "dot")
+
+    drawdown = figures.drawdown_trace(days, [0.0, -10.0], "Max drawdown -10.0%", "drawdown", True, "red")
+    assert (drawdown["mode"], drawdown["visible"], drawdown["yaxis"]) == ("lines+markers", True, "y")
+    assert "dash" not in drawdown["line"]
+
+
+def test_backtest_figure_ends_with_the_money_paid_in():
+    days = pd.date_range("2023-01-02", periods=2).values
+    fig = figures.backtest_figure(days, [[100, 110], [100, 90]], [100, 100], ["60/40", "100/0"], "Backtest")
+
+    assert [trace["name"] for trace in fig["data"]] == ["60/40", "100/0", "Paid in"]
+    assert fig["data"][-1]["line"]["dash"] == "dash"
+    assert all(trace["x"].tolist() == ["2023-01-02", "2023-01-03"] for trace in fig["data"])
+    assert fig["layout"]["title"]["text"] == "Backtest"
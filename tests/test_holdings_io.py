@@ -0,0 +1,117 @@
+import base64
+import sys
+
+import numpy as np
+import pytest
+
+import holdings_io
+from holdings import Holdings
+from holdings_store import HoldingsStore, MemoryBackend
+
+HEADERS = {"Region": "region", "Balance $": "balance_dollar", "Balance %": "balance_prct", "Ticker": "ticker"}
+
+
+def data_url(data, mimetype="text/csv"):
+    if isinstance(data, str):
+        data = data.encode()
+    return f"data:{mimetype};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def sample():
+    return Holdings.from_records([
+        {"id": "a", "region": "US", "ticker": "aaa", "balance_dollar": 600.0, "balance_prct": 60.0, "quantity": 3},
+        {"id": "b", "region": "Intl", "ticker": "BBB", "balance_dollar": 400.0, "balance_prct": 40.0},
+        {"id": "c", "region": "US", "market": "Bonds", "balance_dollar": None, "account": "IRA"},
+    ])
+
+
+def assert_same(holdings, expected):
+    assert holdings.frame["id"].tolist() == expected.frame["id"].tolist()
+    assert holdings.to_records() == expected.to_records()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "arrow"])
+def test_export_reads_back_as_the_same_holdings(fmt, monkeypatch):
+    if fmt != "csv":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(holdings_io, "CHUNK_ROWS", 2)  # more than one chunk each way
+    holdings = sample()
+
+    data = b"".join(part.encode() if isinstance(part, str) else part for part in holdings_io.export(holdings, fmt))
+    read = holdings_io.read_upload(data_url(data, holdings_io.MIMETYPES[fmt]), f"portfolio.{fmt}", HEADERS)
+
+    assert_same(read, holdings)
+
+
+def test_csv_headers_are_read_as_their_fields():
+    text = "﻿Region, Ticker,Balance $,Balance %,Broker\nUS,vti,\"1,000\",100,x\n"
+    read = holdings_io.read_upload(data_url(text), "export.CSV", HEADERS)
+
+    record, = read.to_records()
+    assert (record["region"], record["ticker"], record["balance_dollar"], record["balance_prct"]) == ("US", "VTI", 1000, 100)
+    assert record["id"]  # a new id for a row without one
+
+
+def test_csv_read_a_chunk_at_a_time_keeps_every_row(monkeypatch):
+    monkeypatch.setattr(holdings_io, "CHUNK_ROWS", 3)
+    monkeypatch.setattr(holdings_io, "READ_BYTES", 16)
+    rows = "".join(f"r{i},T{i},{i}\n" for i in range(10))
+    read = holdings_io.read_upload(data_url("id,ticker,balance_dollar\n" + rows), "a.csv", HEADERS)
+
+    assert read.frame["id"].tolist() == [f"r{i}" for i in range(10)]
+    assert read.column("balance_dollar") == pytest.approx(np.arange(10))
+
+
+@pytest.mark.parametrize("contents, filename, message", [
+    (data_url("Region\nUS\n"), "portfolio.xlsx", "isn't a CSV, Parquet or Arrow file"),
+    (data_url("Region\nUS\n"), None, "isn't a CSV, Parquet or Arrow file"),
+    ("Region\nUS\n", "a.csv", "not uploaded as a data URL"),
+    ("data:text/csv;base64,@@@@", "a.csv", "couldn't be read as CSV"),
+    (data_url(""), "a.csv", "couldn't be read as CSV"),
+    (data_url(b"\xff\xfe\x00bad"), "a.csv", "couldn't be read as CSV"),
+    (data_url("Name,Colour\nx,y\n"), "a.csv", "No portfolio columns found"),
+    (data_url("Region,Ticker\n"), "a.csv", "has no holdings"),
+    (data_url("id,Ticker\nx,A\nx,B\n"), "a.csv", "'x' is repeated"),
+])
+def test_malformed_uploads_are_rejected(contents, filename, message):
+    with pytest.raises(ValueError, match=message):
+        holdings_io.read_upload(contents, filename, HEADERS)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_a_corrupt_parquet_or_arrow_file_is_rejected(fmt):
+    pytest.importorskip("pyarrow")
+    with pytest.raises(ValueError, match=f"couldn't be read as {fmt.upper()}"):
+        holdings_io.read_upload(data_url(b"not a columnar file"), f"a.{fmt}", HEADERS)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+
+    portfolio = sys.modules["pages.portfolio"]
+    store = HoldingsStore(MemoryBackend())
+    monkeypatch.setattr(portfolio, "get_holdings_store", lambda: store)
+    store.put("s", {"holdings": sample(), "total": 1000.0})
+    return app.server.test_client(), store
+
+
+def test_export_downloads_the_sessions_holdings(client):
+    client, _ = client
+    response = client.get("/portfolio/export.csv?session=s")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert "filename=portfolio.csv" in response.headers["Content-Disposition"]
+    assert_same(holdings_io.read_upload(data_url(response.data), "portfolio.csv", HEADERS), sample())
+
+
+@pytest.mark.parametrize("url", [
+    "/portfolio/export.csv?session=missing",
+    "/portfolio/export.csv",
+    "/portfolio/export.xlsx?session=s",
+])
+def test_export_of_an_unknown_session_or_format_is_not_found(client, url):
+    client, store = client
+    assert client.get(url).status_code == 404
+    assert store.get("missing") is None  # reading a session never creates one
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from holdings import CATEGORIES, NUMBERS, Holdings
+from holdings_query import HoldingsIndex
+
+OWNERS = ["zoe", "Adam", "mia", "", "bob"]
+ACCOUNTS = ["Roth IRA", "brokerage", "401k", "ira", ""]
+
+
+def random_rows(seed, count):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "id": f"{seed}-{i}",
+            "region": rng.choice(["US", "Europe", "Asia", ""]),
+            "market": rng.choice(["Stocks", "Bonds", "Cash"]),
+            "balance_dollar": None if rng.random() < 0.2 else float(rng.integers(0, 5) * 100),
+            "balance_prct": None if rng.random() < 0.2 else float(rng.integers(0, 4) * 5),
+            "ticker": rng.choice(["VTI", "BND", "AAPL", ""]),
+            "quantity": None,
+            "investment": rng.choice(["core", "Satellite", ""]),
+            "account": rng.choice(ACCOUNTS),
+            "platform": rng.choice(["Vanguard", "fidelity"]),
+            "owner": rng.choice(OWNERS),
+        })
+    return rows
+
+
+@pytest.fixture
+def holdings():
+    # parts whose labels come in reverse order leave the categories unsorted
+    parts = [Holdings.from_records(random_rows(seed, 40)) for seed in range(3)]
+    parts.append(Holdings.from_records([dict(random_rows(9, 1)[0], owner="aaron", account="zz")]))
+    holdings = Holdings.concat(reversed(parts))
+    assert list(holdings.frame["owner"].cat.categories) != sorted(holdings.frame["owner"].cat.categories)
+    return holdings
+
+
+# what the grid should show, worked out on a plain frame
+def reference(holdings, sort_model, filter_model):
+    frame = holdings.frame.copy()
+    for name in CATEGORIES:
+        frame[name] = frame[name].astype(object)
+    mask = pd.Series(True, index=frame.index)
+    for name, condition in filter_model.items():
+        if name in NUMBERS:
+            number = float(condition.get("filter", "nan"))
+            tests = {"greaterThan": frame[name] > number, "equals": frame[name] == number, "blank": frame[name].isna()}
+        else:
+            labels, text = frame[name].str.lower(), condition.get("filter", "").lower()
+            tests = {"contains": labels.str.contains(text, regex=False), "startsWith": labels.str.startswith(text), "blank": labels == ""}
+        mask &= tests[condition["type"]]
+    frame = frame[mask]
+    if sort_model:
+        # empty numbers sort first going up, and so last going down
+        keys = pd.DataFrame({
+            column["colId"]: frame[column["colId"]].fillna(-np.inf) if column["colId"] in NUMBERS else frame[column["colId"]]
+            for column in sort_model
+        })
+        keys = keys.sort_values(
+            [column["colId"] for column in sort_model],
+            ascending=[column["sort"] == "asc" for column in sort_model],
+            kind="stable",
+        )
+        frame = frame.loc[keys.index]
+    return frame["id"].tolist()
+
+
+@pytest.mark.parametrize("sort_model", [
+    [],
+    [{"colId": "owner", "sort": "asc"}],
+    [{"colId": "owner", "sort": "desc"}],
+    [{"colId": "ticker", "sort": "asc"}],
+    [{"colId": "balance_prct", "sort": "desc"}],
+    [{"colId": "balance_dollar", "sort": "asc"}],
+    [{"colId": "account", "sort": "asc"}, {"colId": "balance_dollar", "sort": "desc"}],
+    [{"colId": "owner", "sort": "desc"}, {"colId": "region", "sort": "asc"}, {"colId": "id", "sort": "asc"}],
+])
+@pytest.mark.parametrize("filter_model", [
+    {},
+    {"account": {"filterType": "text", "type": "contains", "filter": "IRA"}},
+    {"owner": {"filterType": "text", "type": "startsWith", "filter": "a"}},
+    {"owner": {"filterType": "text", "type": "blank"}, "balance_prct": {"filterType": "number", "type": "greaterThan", "filter": 0}},
+    {"balance_dollar": {"filterType": "number", "type": "blank"}},
+    {"market": {"filterType": "text", "type": "contains", "filter": "nothing like it"}},
+])
+def test_page_matches_pandas(holdings, sort_model, filter_model):
+    index = HoldingsIndex(holdings)
+    expected = reference(holdings, sort_model, filter_model)
+
+    rows, count = index.page(0, len(holdings), sort_model, filter_model)
+
+    assert count == len(expected)
+    assert [row["id"] for row in rows] == expected
+
+
+def test_page_slices_the_ordered_holdings(holdings):
+    index = HoldingsIndex(holdings)
+    sort_model = [{"colId": "owner", "sort": "asc"}]
+    expected = reference(holdings, sort_model, {})
+
+    pages = [index.page(start, start + 25, sort_model)[0] for start in range(0, len(holdings), 25)]
+
+    assert [row["id"] for page in pages for row in page] == expected
+    assert pages[0][0]["owner"] == ""
+    assert [row["owner"] for row in pages[0]] == sorted(row["owner"] for row in pages[0])
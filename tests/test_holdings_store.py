@@ -0,0 +1,134 @@
+import os
+import threading
+
+import pytest
+
+from holdings_store import HoldingsStore, MemoryBackend, RedisBackend, SQLiteBackend
+
+THREADS = 8
+UPDATES = 25
+
+
+# every backend, each store standing in for one gunicorn worker; redis only when TEST_REDIS_URL is set
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def stores(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryBackend()
+        return lambda: HoldingsStore(backend)  # one process's backend is shared by its threads
+    if request.param == "sqlite":
+        path = str(tmp_path / "holdings.sqlite")
+        return lambda: HoldingsStore(SQLiteBackend(path))
+    url = os.environ.get("TEST_REDIS_URL")
+    if not url:
+        pytest.skip("TEST_REDIS_URL is not set")
+    pytest.importorskip("redis")
+    prefix = f"test-holdings-{os.getpid()}:"
+    return lambda: HoldingsStore(RedisBackend(url, prefix=prefix))
+
+
+def test_update_starts_a_new_session_from_the_default(stores):
+    store = stores()
+
+    state = store.update("s1", lambda state: {**state, "total": state["total"] + 1}, default=lambda: {"total": 1})
+
+    assert state == {"total": 2}
+    assert store.get("s1") == {"total": 2}
+    assert stores().get("s1") == {"total": 2}
+
+
+def test_update_keeps_parts_under_their_own_keys(stores):
+    store = stores()
+
+    store.update("s1", lambda state: {"holdings": [1, 2], "groups": {"owner": {"Joint": [10.0, 2]}}, "version": "a"})
+
+    assert store.get_parts("s1", "groups", "version") == {"groups": {"owner": {"Joint": [10.0, 2]}}, "version": "a"}
+    assert store.get("s1")["holdings"] == [1, 2]
+    store.delete("s1")
+    assert store.get("s1") is None
+    assert store.get_parts("s1", "version") is None
+
+
+def test_failed_update_saves_nothing(stores):
+    store = stores()
+    store.put("s1", {"total": 1})
+
+    def fail(state):
+        state["total"] = 99
+        raise ValueError("bad edit")
+
+    with pytest.raises(ValueError):
+        store.update("s1", fail)
+    assert store.get("s1") == {"total": 1}
+    assert store.update("s1", lambda state: {"total": state["total"] + 1}) == {"total": 2}
+
+
+def test_nested_update_on_one_thread(stores):
+    store = stores()
+
+    def outer(state):
+        store.update("s1", lambda inner: {"total": 5})
+        return {"total": store.get("s1")["total"] + 1}
+
+    store.update("s1", outer)
+
+    assert store.get("s1") == {"total": 6}
+
+
+def test_concurrent_updates_are_not_lost(stores):
+    # read-modify-write from many threads and workers at once: every increment has to survive
+    workers = [stores() for _ in range(2)]
+    errors = []
+
+    def increment(store):
+        try:
+            for _ in range(UPDATES):
+                store.update("s1", lambda state: {"count": state.get("count", 0) + 1, "version": str(state.get("count", 0))})
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=increment, args=(workers[i % 2],)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+
+    assert errors == []
+    assert workers[0].get("s1") == {"count": THREADS * UPDATES, "version": str(THREADS * UPDATES - 1)}
+
+
+def ticking():
+    ticks = iter(range(1, 10**6))
+    return lambda: float(next(ticks))
+
+
+@pytest.mark.parametrize(
+    "make", [lambda path: MemoryBackend(max_sessions=2), lambda path: SQLiteBackend(path, max_sessions=2, clock=ticking())]
+)
+def test_parts_are_evicted_with_their_session(make, tmp_path):
+    store = HoldingsStore(make(str(tmp_path / "holdings.sqlite")))
+    for session in ["s1", "s2", "s3"]:
+        store.put(session, {"holdings": [], "groups": {"owner": {}}, "version": session})
+        store.get_parts("s1", "groups")  # only ever reading s1's parts still keeps all of s1
+
+    assert store.get("s2") is None
+    assert store.get_parts("s2", "groups") is None
+    assert store.get("s1")["version"] == "s1"
+    assert store.get_parts("s3", "version") == {"version": "s3"}
+
+
+def test_sqlite_sessions_expire_with_their_parts(tmp_path):
+    now = [1000.0]
+    backend = SQLiteBackend(str(tmp_path / "holdings.sqlite"), ttl=60, clock=lambda: now[0])
+    store = HoldingsStore(backend)
+    store.put("s1", {"holdings": [], "groups": {}, "version": "a"})
+    now[0] += 50
+    assert store.get_parts("s1", "version") == {"version": "a"}
+
+    now[0] += 50  # 100s after it was saved, but only 50s after its version was read
+    assert store.get("s1") == {"holdings": [], "groups": {}, "version": "a"}
+
+    now[0] += 61
+    store.put("s2", {"holdings": []})
+    assert store.get_parts("s1", "groups") is None
+    with backend._connect() as db:
+        assert db.execute("SELECT COUNT(*) FROM session_parts WHERE key = 's1'").fetchone()[0] == 0
@@ -0,0 +1,28 @@
+from instrumentation import BUCKETS, Metrics
+
+
+def test_every_series_is_labelled_with_the_worker():
+    metrics = Metrics()
+    metrics.inc("dash_callback_calls_total", {"callback": "create_graph"})
+    metrics.observe("dash_callback_seconds", {"callback": "create_graph"}, 0.2)
+
+    lines = [line for line in metrics.render(worker=123).splitlines() if not line.startswith("#")]
+
+    assert lines
+    assert all('worker="123"' in line for line in lines)
+    assert 'dash_callback_calls_total{callback="create_graph",worker="123"} 1' in lines
+    assert 'dash_callback_seconds_bucket{callback="create_graph",worker="123",le="0.25"} 1' in lines
+
+
+def test_a_merged_job_snapshot_adds_to_the_worker_that_collected_it():
+    worker, job = Metrics(), Metrics()
+    worker.inc("dash_callback_calls_total", {"callback": "fetch_prices"})
+    job.inc("dash_callback_calls_total", {"callback": "fetch_prices"}, 2)
+    job.observe("dash_callback_seconds", {"callback": "fetch_prices"}, 3.0)
+
+    worker.merge(job.snapshot())
+
+    snapshot = worker.snapshot()
+    assert snapshot["counters"][("dash_callback_calls_total", (("callback", "fetch_prices"),))] == 3
+    histogram = snapshot["histograms"][("dash_callback_seconds", (("callback", "fetch_prices"),))]
+    assert histogram[BUCKETS.index(5.0)] == 1 and histogram[-2:] == [3.0, 1]
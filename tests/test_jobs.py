@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# the app with background callbacks on, whatever this process was started with; every job is
+# pickled the way multiprocess sends it to the fork server, its callback by value, so whatever
+# that callback's module holds at the top level has to pickle too
+PICKLE_JOBS = """
+import app
+import jobs
+from multiprocess.reduction import ForkingPickler
+
+background = [key for key, entry in app.app.callback_map.items() if entry.get("long")]
+registry = jobs.get_manager().func_registry
+assert background and len(registry) >= len(background), (background, list(registry))
+for key, job_fn in registry.items():
+    ForkingPickler.loads(ForkingPickler.dumps(job_fn))
+print(len(registry))
+"""
+
+
+def test_every_background_job_pickles(tmp_path):
+    pytest.importorskip("diskcache")
+    pytest.importorskip("multiprocess")
+    env = dict(
+        os.environ,
+        PYTHONPATH=SRC,
+        INVESTING_APP_OFFLINE="1",
+        BACKGROUND_CALLBACKS="1",
+        HOLDINGS_STORE="memory",
+        JOB_CACHE_DIR=str(tmp_path / "jobs"),
+        DATA_SNAPSHOT_DIR=str(tmp_path / "snapshots"),
+    )
+    done = subprocess.run([sys.executable, "-c", PICKLE_JOBS], cwd=SRC, env=env, capture_output=True, text=True)
+
+    assert done.returncode == 0, done.stderr[-2000:]
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import montecarlo
+from montecarlo import LocalResults, simulate
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# one background job of update_simulation, run the way the fork server runs it: in a process of
+# its own, which leaves its figure in the job cache
+JOB = """
+import json
+import sys
+
+import app
+import montecarlo
+from dash.long_callback.managers import BaseLongCallbackManager
+from jobs import get_manager
+
+manager = get_manager()
+job_fn = manager.func_registry[BaseLongCallbackManager.hash_function(sys.modules["pages.goal"].update_simulation)]
+job_fn("result", "progress", (json.loads(sys.argv[1]),), {})
+figure = manager.handle.get("result")
+print(json.dumps({"stats": montecarlo.stats, "title": figure["layout"]["title"]["text"]}))
+"""
+REQUEST = {
+    "years": 20, "invest": 10000, "contribute": 1200, "interest": 7, "growth": 0, "inflation": 2, "volatility": 15,
+    "target": 100000, "paths": 2000,
+}
+
+
+def run_job(tmp_path, request):
+    env = dict(
+        os.environ,
+        PYTHONPATH=SRC,
+        INVESTING_APP_OFFLINE="1",
+        BACKGROUND_CALLBACKS="1",
+        HOLDINGS_STORE="memory",
+        JOB_CACHE_DIR=str(tmp_path / "jobs"),
+        SIMULATION_CACHE_DIR=str(tmp_path / "simulations"),
+        PRICE_STORE_PATH=str(tmp_path / "prices.sqlite"),
+        DATA_SNAPSHOT_DIR=str(tmp_path / "snapshots"),
+    )
+    done = subprocess.run(
+        [sys.executable, "-c", JOB, json.dumps(request)], cwd=SRC, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(done.stdout.splitlines()[-1])
+
+
+def test_repeated_simulation_job_is_served_from_the_memo(tmp_path):
+    pytest.importorskip("diskcache")
+    pytest.importorskip("multiprocess")
+
+    first = run_job(tmp_path, REQUEST)
+    again = run_job(tmp_path, REQUEST)
+    other = run_job(tmp_path, dict(REQUEST, paths=3000))
+
+    assert first["stats"] == {"hits": 0, "runs": 1}
+    assert again["stats"] == {"hits": 1, "runs": 0}
+    assert again["title"] == first["title"]
+    assert other["stats"] == {"hits": 0, "runs": 1}
+
+
+def test_a_run_cut_short_is_not_memoized(monkeypatch):
+    monkeypatch.setattr(montecarlo, "get_results", lambda results=LocalResults(): results)
+    monkeypatch.setattr(montecarlo, "CHUNK", 100)
+
+    short = simulate(10, 1000, 100, 0.05, 0.1, 5000, n_paths=1000, time_budget=0)
+    full = simulate(10, 1000, 100, 0.05, 0.1, 5000, n_paths=1000)
+
+    assert short["paths"] == 100
+    assert full["paths"] == 1000
+    assert simulate(10, 1000, 100, 0.05, 0.1, 5000, n_paths=1000, time_budget=0) is full
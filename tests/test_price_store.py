@@ -0,0 +1,166 @@
+import pandas as pd
+import pytest
+
+from price_store import DAILY_TTL, FakeDownloader, PriceStore, period_start, to_seconds
+
+NOW = pd.Timestamp("2023-04-21 20:00").timestamp()
+
+
+class Clock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def fake(clock):
+    return FakeDownloader(clock=clock, delisted={"DEAD"})
+
+
+@pytest.fixture
+def store(fake, clock):
+    return PriceStore(":memory:", downloader=fake, clock=clock)
+
+
+def covered_from(store, ticker, interval="1d"):
+    with store._connect() as conn:
+        return conn.execute("SELECT covered_from FROM series WHERE ticker = ? AND interval = ?", (ticker, interval)).fetchone()[0]
+
+
+def test_first_request_downloads_the_period(store, fake):
+    bars = store.get("AAPL", "1y")
+
+    assert fake.calls == [("AAPL", "1d", "1y", None)]
+    assert store.stats["misses"] == 1
+    assert not bars.empty
+    assert bars.index[0] >= period_start("1y", NOW)
+    assert bars.index.is_monotonic_increasing
+
+
+def test_shorter_period_is_sliced_from_stored_bars(store, fake):
+    year = store.get("AAPL", "1y")
+    month = store.get("AAPL", "1mo")
+
+    assert len(fake.calls) == 1
+    assert store.stats["hits"] == 1
+    pd.testing.assert_frame_equal(month, year[year.index >= period_start("1mo", NOW)])
+
+
+def test_five_days_means_five_trading_days(store):
+    store.get("AAPL", "1mo")
+
+    bars = store.get("AAPL", "5d")
+
+    assert len(bars) == 5
+    assert bars.index.dayofweek.max() < 5
+
+
+def test_longer_period_downloads_again_and_widens_coverage(store, fake):
+    store.get("AAPL", "1mo")
+    assert covered_from(store, "AAPL") == to_seconds([period_start("1mo", NOW)])[0]
+
+    store.get("AAPL", "2y")
+
+    assert fake.calls[-1] == ("AAPL", "1d", "2y", None)
+    assert store.stats["misses"] == 2
+    assert covered_from(store, "AAPL") == to_seconds([period_start("2y", NOW)])[0]
+    store.get("AAPL", "1y")
+    assert len(fake.calls) == 2
+
+
+def test_read_serves_stored_bars_without_downloading(store, fake, clock):
+    assert store.read("AAPL", "1y").empty
+    year = store.get("AAPL", "1y")
+    clock.now += 10 * DAILY_TTL
+
+    pd.testing.assert_frame_equal(store.read("AAPL", "1y"), year[year.index >= period_start("1y", clock.now)])
+    assert len(fake.calls) == 1
+
+
+def test_stale_series_is_topped_up_from_its_last_bar(store, fake, clock):
+    bars = store.get("AAPL", "1y")
+    clock.now += DAILY_TTL + 3 * 86400
+
+    topped = store.get("AAPL", "1y")
+
+    assert store.stats["topups"] == 1
+    ticker, interval, period, start = fake.calls[-1]
+    assert (ticker, interval, period) == ("AAPL", "1d", None)
+    assert start == bars.index[-1]
+    assert topped.index[-1] > bars.index[-1]
+    # a top-up doesn't move where the stored bars start
+    assert covered_from(store, "AAPL") == to_seconds([period_start("1y", NOW)])[0]
+
+
+def test_fresh_series_is_not_topped_up_before_the_ttl(store, fake, clock):
+    store.get("AAPL", "1y")
+    clock.now += DAILY_TTL - 1
+
+    store.get("AAPL", "1y")
+
+    assert len(fake.calls) == 1
+    assert store.stats["hits"] == 1
+
+
+def test_intraday_bars_expire_sooner(store, fake, clock):
+    store.get("AAPL", "1mo", "1h")
+    clock.now += 120
+
+    store.get("AAPL", "1mo", "1h")
+
+    assert store.stats["topups"] == 1
+    assert fake.calls[-1][1] == "1h"
+
+
+def test_delisted_symbol_is_remembered_as_empty_until_stale(store, fake, clock):
+    assert store.get("DEAD", "1y").empty
+    assert store.get("DEAD", "1y").empty
+    assert len(fake.calls) == 1
+
+    clock.now += DAILY_TTL + 1
+    store.get("DEAD", "1y")
+
+    # with no bar to top up from, the whole period is asked for again
+    assert fake.calls[-1] == ("DEAD", "1d", "1y", None)
+
+
+def test_failed_download_stores_nothing(store, fake):
+    fake.failures["AAPL"] = 1
+
+    with pytest.raises(ConnectionError):
+        store.get("AAPL", "1y")
+    assert not store.get("AAPL", "1y").empty
+    assert store.stats["misses"] == 1
+
+
+def test_store_on_disk_is_shared_between_instances(tmp_path, fake, clock):
+    path = str(tmp_path / "prices.sqlite")
+    PriceStore(path, downloader=fake, clock=clock).get("AAPL", "1y")
+
+    other = PriceStore(path, downloader=fake, clock=clock)
+    bars = other.get("AAPL", "6mo")
+
+    assert len(fake.calls) == 1
+    assert other.stats["hits"] == 1
+    assert not bars.empty
+
+
+def test_exchange_time_zone_is_kept_with_the_bars(clock):
+    fake = FakeDownloader(clock=clock, tz="America/New_York")
+    store = PriceStore(":memory:", downloader=fake, clock=clock)
+
+    bars = store.get("AAPL", "1y")
+    assert bars.index.tz is None
+    assert bars.attrs["tz"] == "America/New_York"
+    assert store.get("AAPL", "1mo").attrs["tz"] == "America/New_York"
+
+    fake.tz = None  # a top-up that comes without one keeps what was stored
+    clock.now += DAILY_TTL + 1
+    assert store.get("AAPL", "1y").attrs["tz"] == "America/New_York"
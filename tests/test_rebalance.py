@@ -0,0 +1,76 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rebalance
+from holdings import Holdings
+
+CASES = 60  # small portfolios per lot size
+REACH = 3  # lots either side of the greedy plan searched for the exact one
+
+
+# a portfolio of 2-4 holdings in one account, all tradeable, some money added or withdrawn
+def small_case(rng, lot):
+    count = int(rng.integers(2, 5))
+    price = rng.uniform(5, 300, count).round(2)
+    quantity = rng.integers(0, 40, count) * lot
+    prct = rng.uniform(0, 1, count)
+    prct = prct / prct.sum() * 100
+    current = float((quantity * price).sum())
+    total = max(current * rng.uniform(0.7, 1.4), float(price.max() * lot))
+    tickers = [f"T{i}" for i in range(count)]
+    holdings = Holdings.from_frame(
+        pd.DataFrame({"id": tickers, "balance_prct": prct, "ticker": tickers, "quantity": quantity, "account": "IRA"})
+    )
+    return holdings, pd.Series(price, index=tickers), total
+
+
+def signed_shares(plan, holdings):
+    shares = pd.Series(0.0, index=holdings.frame["id"])
+    shares[plan.trades["id"]] = np.where(plan.trades["side"] == "Buy", 1, -1) * plan.trades["shares"].to_numpy()
+    return shares.to_numpy()
+
+
+# against every whole-lot plan near the greedy one that sells no more than is held and is affordable
+@pytest.mark.parametrize("lot", rebalance.LOT_SIZES.values(), ids=rebalance.LOT_SIZES.keys())
+def test_greedy_is_off_target_by_at_most_a_lot_per_holding_more_than_exact(lot):
+    rng = np.random.default_rng(int(lot * 1000))
+    for _ in range(CASES):
+        holdings, prices, total = small_case(rng, lot)
+        quantity, price = holdings.column("quantity"), prices.to_numpy()
+        target = holdings.column("balance_prct") / 100 * total
+        greedy = signed_shares(rebalance.rebalance(holdings, prices, total, lot), holdings)
+
+        choices = [
+            np.unique(np.maximum((np.round(shares / lot) + np.arange(-REACH, REACH + 1)) * lot, -held))
+            for shares, held in zip(greedy, quantity)
+        ]
+        plans = np.array(list(itertools.product(*choices)))
+        affordable = (quantity * price).sum() + plans @ price <= total + rebalance.EPSILON
+        exact = np.abs(quantity * price + plans * price - target).sum(axis=1)[affordable].min()
+        error = np.abs(quantity * price + greedy * price - target).sum()
+
+        assert (quantity * price).sum() + greedy @ price <= total + 1e-6
+        assert greedy.min(initial=0) >= -quantity.max(initial=0)
+        assert error <= exact + (price * lot).sum() + 1e-6
+
+
+# 300 in all, 100 of it in a holding that can't trade: the other 200 is shared by the two targets
+def test_untraded_holdings_stay_and_the_rest_share_what_is_left():
+    holdings = Holdings.from_records([
+        {"id": "a", "ticker": "AAA", "quantity": 10, "balance_prct": 50, "account": "IRA"},
+        {"id": "b", "ticker": "BBB", "quantity": 0, "balance_prct": 50, "account": "IRA"},
+        {"id": "c", "ticker": "", "balance_dollar": 100, "balance_prct": 0, "account": "IRA"},
+    ])
+    prices = pd.Series({"AAA": 10.0, "BBB": 20.0})
+
+    plan = rebalance.rebalance(holdings, prices, 300, lot=1)
+
+    assert plan.trades[["id", "side", "shares", "amount"]].to_dict("records") == [
+        {"id": "b", "side": "Buy", "shares": 5.0, "amount": 100.0}
+    ]
+    assert plan.cash.to_dict() == {"IRA": 0.0}
+    assert plan.untraded == 1
+    assert plan.turnover == 100.0
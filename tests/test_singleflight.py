@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from price_store import FakeDownloader, PriceStore
+from singleflight import SingleFlight, interprocess_lock
+
+WAIT = 5  # seconds a test waits for a thread before it fails
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_threads(count, target):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as error:
+            results[i] = error
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_callers_share_one_call():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def fetch():
+        calls.append(1)
+        release.wait(WAIT)
+        return object()
+
+    threads, results = run_threads(8, lambda: flight.do("AAPL", fetch))
+    wait_until(lambda: flight.stats["coalesced"] == 7)
+    release.set()
+    for thread in threads:
+        thread.join(WAIT)
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats == {"calls": 8, "executed": 1, "coalesced": 7}
+
+
+def test_an_error_reaches_every_waiter():
+    flight, release = SingleFlight(), threading.Event()
+
+    def fetch():
+        release.wait(WAIT)
+        raise ConnectionError("down")
+
+    threads, results = run_threads(4, lambda: flight.do("AAPL", fetch))
+    wait_until(lambda: flight.stats["coalesced"] == 3)
+    release.set()
+    for thread in threads:
+        thread.join(WAIT)
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert flight.stats["executed"] == 1
+
+
+def test_a_finished_call_is_not_reused():
+    flight = SingleFlight()
+
+    assert flight.do("AAPL", lambda: 1) == 1
+    with pytest.raises(ValueError):
+        flight.do("AAPL", lambda: int("x"))
+    assert flight.do("AAPL", lambda: 3) == 3
+    assert flight.stats["executed"] == 3
+
+
+def test_different_keys_run_at_the_same_time():
+    flight, both = SingleFlight(), threading.Barrier(2, timeout=WAIT)
+
+    threads, results = run_threads(2, lambda: flight.do(threading.current_thread().name, both.wait))
+    for thread in threads:
+        thread.join(WAIT)
+
+    assert sorted(results) == [0, 1]
+    assert flight.stats["coalesced"] == 0
+
+
+def test_interprocess_lock_excludes_other_holders(tmp_path):
+    # flock locks belong to an open file, so two opens in one process exclude each other just as
+    # two gunicorn workers do
+    path = str(tmp_path / "locks" / "AAPL-1d.lock")
+    held, release, acquired = threading.Event(), threading.Event(), threading.Event()
+
+    def hold():
+        with interprocess_lock(path):
+            held.set()
+            release.wait(WAIT)
+
+    def take():
+        with interprocess_lock(path):
+            acquired.set()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(WAIT)
+    taker = threading.Thread(target=take)
+    taker.start()
+
+    assert not acquired.wait(0.2)
+    release.set()
+    assert acquired.wait(WAIT)
+    holder.join(WAIT)
+    taker.join(WAIT)
+
+
+def test_interprocess_lock_without_a_path_does_nothing():
+    with interprocess_lock(None):
+        with interprocess_lock(None):
+            pass
+
+
+def test_price_store_plans_again_once_it_has_the_lock(tmp_path):
+    # two workers miss the same series; the second waits on the first one's download and then
+    # finds the bars stored instead of downloading them again
+    clock = lambda: pd.Timestamp("2023-04-21 20:00").timestamp()  # noqa: E731
+    path = str(tmp_path / "prices.sqlite")
+    downloading, release = threading.Event(), threading.Event()
+    synthetic = FakeDownloader(clock=clock)
+
+    def slow(*args, **kwargs):
+        downloading.set()
+        release.wait(WAIT)
+        return synthetic(*args, **kwargs)
+
+    first = PriceStore(path, downloader=slow, clock=clock)
+    second_downloads = FakeDownloader(clock=clock)
+    second = PriceStore(path, downloader=second_downloads, clock=clock)
+    planned = threading.Event()
+    read_meta = second._meta
+
+    def meta(*args):
+        found = read_meta(*args)
+        planned.set()
+        return found
+
+    second._meta = meta
+
+    threads, results = run_threads(1, lambda: first.get("AAPL", "1y"))
+    downloading.wait(WAIT)
+    waiting, waited = run_threads(1, lambda: second.get("AAPL", "1y"))
+    planned.wait(WAIT)  # it saw nothing stored and is now queued on the lock
+    release.set()
+    for thread in threads + waiting:
+        thread.join(WAIT)
+
+    assert second_downloads.calls == []
+    assert second.stats == {"hits": 0, "misses": 0, "topups": 0, "coalesced": 1}
+    pd.testing.assert_frame_equal(waited[0], results[0])
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ticker_search import TickerIndex
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def index():
+    return TickerIndex(
+        ["AAPL", "AA", "AAL", "MSFT", "APLE", "GOOG", "brk-b"],
+        ["Apple Inc.", "Alcoa Corp", "American Airlines", "Microsoft Corporation", "Apple Hospitality REIT", np.nan, "Berkshire Hathaway"],
+    )
+
+
+def symbols(index, query, **kwargs):
+    return [index.symbols[row] for row in index.search(query, **kwargs)]
+
+
+def test_exact_symbol_then_shortest_prefixes(index):
+    assert symbols(index, "AA") == ["AA", "AAL", "AAPL"]
+
+
+def test_name_words_come_after_symbols(index):
+    assert symbols(index, "apple") == ["AAPL", "APLE"]
+    assert symbols(index, "hosp") == ["APLE"]
+
+
+def test_substrings_come_last(index):
+    assert symbols(index, "A")[:4] == ["AA", "AAL", "AAPL", "APLE"]
+    assert symbols(index, "SOFT") == ["MSFT"]
+    assert symbols(index, "K-B") == ["BRK-B"]
+
+
+def test_query_is_trimmed_and_case_insensitive(index):
+    assert symbols(index, "  msft ") == ["MSFT"]
+    assert symbols(index, "") == []
+    assert symbols(index, "   ") == []
+
+
+def test_limit_and_exclude(index):
+    assert symbols(index, "AA", limit=2) == ["AA", "AAL"]
+    assert symbols(index, "AA", exclude=["aa", "AAPL"]) == ["AAL"]
+
+
+def test_missing_names_still_match_on_symbol(index):
+    assert symbols(index, "GOO") == ["GOOG"]
+    assert index.options("GOOG") == [{"label": "GOOG", "value": "GOOG", "search": "GOOG "}]
+
+
+def test_options_for_selected_values(index):
+    assert index.options_for(["AAPL", "NEW"]) == [
+        {"label": "AAPL - Apple Inc.", "value": "AAPL", "search": "AAPL Apple Inc."},
+        {"label": "NEW", "value": "NEW"},
+    ]
+
+
+@pytest.mark.parametrize("query", ["A", "AAP", "ZZ", "BANK", "ENERGY", "INC", "CORP", "X", "1", "-", "GOLD", "TRUST"])
+def test_matches_a_scan_of_the_bundled_tickers(query):
+    # every symbol prefix and name-word prefix is also a substring of "SYMBOL NAME", so whatever
+    # the index returns must match a plain scan, and all of it when that finds fewer than the limit
+    tickers = pd.read_csv(os.path.join(HERE, os.pardir, "src", "tickers_yahoo.csv"))
+    index = TickerIndex(tickers["Ticker"], tickers["Name"])
+    lines = [f"{symbol} {name.upper()}" for symbol, name in zip(index.symbols, index.names)]
+    expected = {row for row, line in enumerate(lines) if query in line}
+
+    found = index.search(query, limit=50)
+
+    assert len(found) == len(set(found)) == min(50, len(expected))
+    assert set(found) <= expected
+    exact = [row for row in found if index.symbols[row] == query]
+    assert found[:len(exact)] == exact
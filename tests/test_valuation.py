@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from market_data import combine
+from price_store import FakeDownloader
+from valuation import Valuer
+
+
+@pytest.fixture
+def bars():
+    downloader = FakeDownloader()
+    return {ticker: downloader(ticker, "1d", period="5d") for ticker in ("AAPL", "MSFT")}
+
+
+def test_cached_prices_from_stored_bars_without_fetching(bars):
+    fetched, read = [], []
+
+    def fetch(*args):
+        fetched.append(args)
+        raise AssertionError("cached() must not fetch")
+
+    def stored(tickers, *args):
+        read.append(tickers)
+        return combine({ticker: bars[ticker] for ticker in tickers if ticker in bars}, {}, tickers, "column")
+
+    valuer = Valuer(fetch=fetch, read=stored)
+    snapshot = valuer.cached(["MSFT", "AAPL", "NEW"])
+
+    assert not fetched and read == [["AAPL", "MSFT", "NEW"]]
+    assert snapshot.prices["AAPL"] == bars["AAPL"]["Close"].iloc[-1]
+    assert pd.isna(snapshot.prices["NEW"])
+    assert valuer.stats == {"lookups": 0, "reused": 0}  # a stored-only snapshot isn't kept
+
+
+def test_cached_reuses_a_fresh_snapshot(bars):
+    def fetch(tickers, *args):
+        return combine({ticker: bars[ticker] for ticker in tickers}, {}, tickers, "column")
+
+    valuer = Valuer(fetch=fetch, read=None)
+    taken = valuer.snapshot(["AAPL", "MSFT"])
+
+    assert valuer.cached(["MSFT", "AAPL"]) is taken
+    assert valuer.stats == {"lookups": 1, "reused": 1}